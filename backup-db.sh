@@ -6,7 +6,9 @@ PATH=/bin:/usr/bin:/usr/local/sbin:/usr/sbin:/sbin:/opt/aws/bin:$HOME/.local/bin
 sudo bash -c 'sync; echo 3 > /proc/sys/vm/drop_caches'
 [ ! -f docker-compose.yml ] && cd $HOME
 docker-compose exec -T db psql -U postgres -c "VACUUM FULL ANALYZE;"
-docker-compose exec -T db psql -U postgres -c "VACUUM FULL ANALYZE;" -d orcidhub
+# NB! ORCID API call log partitions are append-only and get dropped on expiry,
+# a plain VACUUM avoids rewriting them every time:
+docker-compose exec -T db psql -U postgres -c "VACUUM ANALYZE;" -d orcidhub
 docker-compose exec -T db psql -U postgres -c "SELECT pg_start_backup('$TS_LABEL', false);"
 # tar cjf ./backup/$TS_LABEL.tar.bz2 ./pgdata ; mv ./backup/$TS_LABEL.tar.bz2 ./archive/
 XZ_OPT="-9 --memory=100000000" tar cJf ./backup/$TS_LABEL.tar.xz ./pgdata ; mv ./backup/$TS_LABEL.tar.xz ./archive/
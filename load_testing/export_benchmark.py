@@ -0,0 +1,74 @@
+"""Benchmark of the per-record and the bulk export serialisation of the composite records.
+
+Run it with the application environment set up against an empty (eg, in-memory) database:
+
+    DATABASE_URL=sqlite:///:memory: python load_testing/export_benchmark.py -n 1000
+"""
+import argparse
+import time
+
+from orcid_hub.models import (
+    ExternalId,
+    FundingContributor,
+    FundingInvitee,
+    FundingRecord,
+    Organisation,
+    Task,
+    TaskType,
+    create_tables,
+    db,
+)
+
+
+def populate(count):
+    """Create a funding task with the given number of records, each with its related rows."""
+    org = Organisation.create(name="THE ORGANISATION", city="Wellington", country="NZ")
+    task = Task.create(org=org, filename="fundings.csv", task_type=TaskType.FUNDING)
+    FundingRecord.insert_many(
+        dict(task=task, title=f"TITLE #{i}", type="CONTRACT", org_name="ORG", country="NZ")
+        for i in range(count)
+    ).execute()
+    ids = [r.id for r in task.records]
+    FundingInvitee.insert_many(
+        dict(record=i, email=f"researcher{i}@test.edu", visibility="PUBLIC") for i in ids
+    ).execute()
+    FundingContributor.insert_many(dict(record=i, name=f"Contributor #{i}", role="lead") for i in ids).execute()
+    ExternalId.insert_many(
+        dict(record=i, type="grant_number", value=f"GNS{i}", relationship="SELF") for i in ids
+    ).execute()
+
+
+def run(name, export):
+    """Run the export and report the number of the executed queries and the elapsed time."""
+    execute_sql, count = db.execute_sql, 0
+
+    def counting_execute_sql(*args, **kwargs):
+        nonlocal count
+        count += 1
+        return execute_sql(*args, **kwargs)
+
+    db.execute_sql = counting_execute_sql
+    try:
+        started_at = time.perf_counter()
+        records = export(FundingRecord.select().order_by(FundingRecord.id))
+        elapsed = time.perf_counter() - started_at
+    finally:
+        db.execute_sql = execute_sql
+    print(f"{name:30}: {len(records):6} records, {count:6} queries, {elapsed * 1000:10.2f} ms")
+    return records
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=1000, help="Number of the records.")
+    args = parser.parse_args()
+    create_tables()
+    populate(args.n)
+    expected = run("per record (to_export_dict)", lambda query: [r.to_export_dict() for r in query])
+    records = run("bulk (to_export_dicts)", FundingRecord.to_export_dicts)
+    assert records == expected, "The outputs of the serialisations differ."
+
+
+if __name__ == "__main__":
+    main()
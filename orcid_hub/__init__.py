@@ -275,12 +275,14 @@ def apply_x_frame(response):
 @click.option("-d", "--drop", is_flag=True, help="Drop tables before creating...")
 @click.option("-f", "--force", is_flag=True, help="Enforce table creation.")
 @click.option("-A", "--audit", is_flag=True, help="Create adit trail tables.")
+@click.option(
+    "-P", "--partition", is_flag=True, help="Partition ORCID API call log table by month.")
 @click.option(
     "-V",
     "--verbose",
     is_flag=True,
     help="Shows SQL statements that get sent to the server or DB.")
-def initdb(create=False, drop=False, force=False, audit=True, verbose=False):
+def initdb(create=False, drop=False, force=False, audit=True, partition=False, verbose=False):
     """Initialize the database."""
     if verbose:
         logger = logging.getLogger("peewee")
@@ -300,6 +302,10 @@ def initdb(create=False, drop=False, force=False, audit=True, verbose=False):
         app.logger.info("Creating audit tables...")
         models.create_audit_tables()
 
+    if partition:
+        app.logger.info("Partitioning ORCID API call log table...")
+        models.partition_tables()
+
 
 @app.cli.command("cradmin")
 @click.option("-f", "--force", is_flag=True, help="Enforce creation of the super-user.")
@@ -364,10 +370,12 @@ def org_info(input):
 
 
 @app.cli.command()
-@click.option("-n", default=20, help="Max number of rows to process.")
-def process(n):
+@click.option("-n", default=20, help="Max number of rows to process (page size in the drain mode).")
+@click.option("-d", "--drain", is_flag=True, help="Drain the whole backlog resuming from the last checkpoint.")
+@click.option("-t", "--time-budget", type=float, help="Time budget (in seconds) for the drain mode.")
+def process(n, drain=False, time_budget=None):
     """Process uploaded records."""
-    process_records(n)
+    process_records(n, drain=drain, time_budget=time_budget)
 
 
 if os.environ.get("ENV") == "dev0":
@@ -1,8 +1,11 @@
 """HUB API."""
 
 import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import gzip
+from hashlib import md5
+from http.cookiejar import DefaultCookiePolicy
 from urllib.parse import unquote, urlencode
 from uuid import uuid4, UUID
 
@@ -18,6 +21,8 @@ from flask.views import MethodView
 from flask_login import current_user
 from flask_restful import Resource, reqparse
 from flask_swagger import swagger
+from itsdangerous import BadData, URLSafeSerializer
+from peewee import chunked, fn
 from rq import get_current_job
 
 from . import api, app, models, oauth, rq, schemas, utils
@@ -25,12 +30,22 @@ from .login_provider import roles_required
 from .models import (ORCID_ID_REGEX, AffiliationRecord, AsyncOrcidResponse, Client, FundingRecord,
                      OrcidApiCall, OrcidToken, PeerReviewRecord, PropertyRecord, ResourceRecord, Role, Task,
                      TaskType, User, UserOrg, WorkRecord, validate_orcid_id)
+from .orcid_client import ORCID_IN_PATH_REGEX, api_call_log, concurrency
+from .queuing import proxy_cache, rate_limiter, token_cache
 from .utils import (activate_all_records, dump_yaml, enqueue_task_records, is_valid_url,
                     register_orcid_webhook, reset_all_records)
 
 ORCID_API_VERSION_REGEX = re.compile(r"^v[2-3].\d+(_rc\d+)?$")
 SCOPE_REGEX = re.compile(r"^(/[a-z\-]+)+(\,(/[a-z\-]+)+)*$")
 
+# The process-wide ORCID API session (and connection pool) of the proxy. NB! the cookies
+# don't get persisted as the session is shared by all the requests of all the users.
+orcid_api_session = requests.Session()
+orcid_api_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+orcid_api_session.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_maxsize=app.config.get("ORCID_API_POOL_MAXSIZE") or 10))
+
 
 def prefers_yaml():
     """Test if the client prefers YAML."""
@@ -87,6 +102,30 @@ class AppResource(Resource):
             return resp
         return resp
 
+    def etag(self, *parts):
+        """Create a strong entity tag of the requested representation out of the change token."""
+        return md5(":".join(str(p) for p in (request.full_path, *parts)).encode()).hexdigest()
+
+    def not_modified(self, etag, last_modified=None):
+        """Return the response "304 Not Modified" if the requested resource wasn't modified.
+
+        The preconditions "If-None-Match" or "If-Modified-Since" of the conditional GET/HEAD
+        requests get checked. NB! it should be done before the resource gets serialized.
+        """
+        if request.method not in ["GET", "HEAD"]:
+            return
+        if request.if_none_match:
+            if not request.if_none_match.contains_weak(etag):
+                return
+        elif not (last_modified and request.if_modified_since
+                  and last_modified.replace(microsecond=0) <= request.if_modified_since):
+            return
+        resp = make_response('', 304)
+        resp.set_etag(etag)
+        if last_modified:
+            resp.headers["Last-Modified"] = self.httpdate(last_modified)
+        return resp
+
     def httpdate(self, dt):
         """Return a string representation of a date according to RFC 1123 (HTTP/1.1).
 
@@ -104,6 +143,11 @@ class AppResource(Resource):
         """Test if the request body content type is YAML."""
         return request.content_type in ["text/yaml", "application/x-yaml"]
 
+    @property
+    def is_async_request(self):
+        """Test if the client prefers the asynchronous processing of the request."""
+        return "respond-async" in request.headers.get("Prefer", "")
+
     def handle_user(self, identifier=None):
         """Create, update or delete user account entry."""
         if request.method != "DELETE":
@@ -211,12 +255,9 @@ class AppResource(Resource):
 
 def changed_path(name, value):
     """Create query string with a new parameter value."""
-    link = request.path
-    if request.args:
-        link += '&' + urlencode(
-            {k: v if k != name else value
-                for k, v in request.args.items()})
-    return link
+    args = request.args.to_dict()
+    args[name] = value
+    return request.path + '?' + urlencode(args)
 
 
 class AppResourceList(AppResource):
@@ -238,6 +279,23 @@ class AppResourceList(AppResource):
         except:
             return 20
 
+    @models.lazy_property
+    def cursor_serializer(self):
+        """Get the serializer of the opaque keyset pagination cursors."""
+        return URLSafeSerializer(app.secret_key, salt="pagination-cursor")
+
+    @models.lazy_property
+    def cursor(self):
+        """Get the ID of the last row of the previous page (0 for the first page).
+
+        Returns None if the keyset pagination wasn't requested (the query parameter "cursor"
+        is missing), and raises *BadData* if the cursor is invalid.
+        """
+        cursor = request.args.get("cursor")
+        if cursor is None:
+            return
+        return int(self.cursor_serializer.loads(cursor)) if cursor else 0
+
     @models.lazy_property
     def next_link(self):
         """Get the next page link of the requested resource."""
@@ -255,20 +313,68 @@ class AppResourceList(AppResource):
         """Get the first page link of the requested resource."""
         return changed_path("page", 1)
 
+    def change_stamp(self, query):
+        """Get the time-stamp of the latest change and the entity tag of the listed rows.
+
+        Both get derived from the row count and the latest creation and update time-stamps
+        of the rows matching the query, which are read with a single aggregate query.
+        Returns (None, None) if the model doesn't keep track of the updates.
+        """
+        model = query.model
+        if "updated_at" not in model._meta.fields:
+            return None, None
+        count, updated_at, created_at = query.select(
+            fn.COUNT(model.id), fn.MAX(model.updated_at), fn.MAX(model.created_at)).tuples().get()
+        if isinstance(updated_at, str):
+            updated_at = model.updated_at.python_value(updated_at)
+        if isinstance(created_at, str):
+            created_at = model.created_at.python_value(created_at)
+        last_modified = max((dt for dt in [updated_at, created_at] if dt), default=None)
+        return last_modified, self.etag(count, updated_at, created_at, prefers_yaml())
+
     def api_response(self, query, exclude=None, only=None, recurse=False):
-        """Create and return API response with pagination links."""
-        query = query.paginate(self.page, self.page_size)
+        """Create and return API response with pagination links.
+
+        If the query parameter "cursor" is present (empty for the first page), the rows get
+        paginated with the keyset pagination ordered by the row ID and the "next" link carries
+        the opaque cursor of the next page, otherwise the page number pagination is used.
+        """
+        try:
+            cursor = self.cursor
+        except (BadData, ValueError) as ex:
+            return jsonify({"error": "Invalid pagination cursor", "message": str(ex)}), 400
+        last_modified, etag = self.change_stamp(query)
+        if etag:
+            resp = self.not_modified(etag, last_modified)
+            if resp:
+                return resp
+        if cursor is None:
+            rows = list(query.paginate(self.page, self.page_size))
+        else:
+            model = query.model
+            rows = list(query.where(model.id > cursor).order_by(model.id).limit(self.page_size))
         records = [
             r.to_dict(recurse=recurse,
                       to_dashes=True,
                       exclude=exclude,
-                      only=only) for r in query
+                      only=only) for r in rows
         ]
         resp = yamlfy(records) if prefers_yaml() else jsonify(records)
-        resp.headers["Pagination-Page"] = self.page
+        if etag:
+            resp.set_etag(etag)
+        if last_modified:
+            resp.headers["Last-Modified"] = self.httpdate(last_modified)
         resp.headers["Pagination-Page-Size"] = self.page_size
         resp.headers["Pagination-Count"] = len(records)
         resp.headers["Link"] = f'<{request.full_path}>;rel="self"'
+        if cursor is not None:
+            if cursor:
+                resp.headers["Link"] += f', <{changed_path("cursor", "")}>;rel="first"'
+            if len(records) == self.page_size:
+                next_cursor = self.cursor_serializer.dumps(rows[-1].id)
+                resp.headers["Link"] += f', <{changed_path("cursor", next_cursor)}>;rel="next"'
+            return resp
+        resp.headers["Pagination-Page"] = self.page
         if self.page != 1:
             resp.headers["Link"] += f', <{self.first_link}>;rel="first"'
         if self.previous_link:
@@ -308,8 +414,46 @@ class TaskResource(AppResource):
             self.task_type = None
         return super().dispatch_request(*args, **kwargs)
 
+    def load_csv_async(self, record_model, task_type):
+        """Store the CSV/TSV request body and load the task records with a background job.
+
+        The task gets returned with the status 202 while it is being loaded. The state and
+        the progress of the loading can be polled with GET /api/v1/tasks/<task_id>.
+        """
+        try:
+            task = utils.load_upload(
+                request.data,
+                filename=self.filename or datetime.utcnow().isoformat(timespec="seconds"),
+                loader=f"{record_model.__name__}.load_from_csv",
+                task_type=task_type,
+                mimetype=request.content_type,
+                org=self.org)
+        except models.ModelExceptionError as ex:
+            return jsonify({"error": "Data or model error occurred.", "message": str(ex)}), 422
+        resp = self.jsonify_task(task)
+        if task.loading_state == "LOADING":
+            resp.status_code = 202
+            resp.headers["Location"] = url_for("taskapi", task_id=task.id)
+        return resp
+
+    @property
+    def export_type(self):
+        """Get the requested representation of the task: "json", "yaml", or "ndjson".
+
+        It can be chosen with the query parameter "format" or with the "Accept" header.
+        """
+        export_type = request.args.get("format")
+        if export_type in ["json", "yaml", "ndjson"]:
+            return export_type
+        return {
+            "text/yaml": "yaml",
+            "application/x-yaml": "yaml",
+            "application/x-ndjson": "ndjson",
+        }.get(request.accept_mimetypes.best_match(
+            ["application/json", "text/yaml", "application/x-yaml", "application/x-ndjson"]), "json")
+
     def jsonify_task(self, task, include_records=True):
-        """Create JSON response with the task payload."""
+        """Create the response with the task payload streaming the task records."""
         if isinstance(task, int):
             try:
                 task = Task.get(id=task)
@@ -317,17 +461,35 @@ class TaskResource(AppResource):
                 return jsonify({"error": "The task doesn't exist."}), 404
             if task.org != current_user.organisation:
                 return jsonify({"error": "Access denied."}), 403
+        last_modified, token = task.get_change_stamp()
+        # the loading progress changes without any changes of the task:
+        etag = None if task.loading_state == "LOADING" else self.etag(
+            token, include_records, self.export_type)
+        if etag:
+            resp = self.not_modified(etag, last_modified)
+            if resp:
+                return resp
         if request.method != "HEAD":
             if task.task_type in [
                     TaskType.AFFILIATION, TaskType.FUNDING, TaskType.PEER_REVIEW,
                     TaskType.PROPERTY, TaskType.WORK, TaskType.OTHER_ID, TaskType.RESOURCE
             ]:
-                resp = jsonify(task.to_export_dict(include_records=include_records))
+                task_dict = task.to_export_dict(include_records=False)
+                if task.loading_state:
+                    task_dict.update(
+                        (k.replace("_", "-"), v) for k, v in utils.get_loading_status(task).items())
+                if include_records:
+                    resp = utils.stream_task_response(
+                        task_dict, task.iter_record_dicts(), self.export_type)
+                else:
+                    resp = jsonify(task_dict)
             else:
                 raise Exception(f"Suppor for {task} has not yet been implemented.")
         else:
             resp = make_response('')
-        resp.headers["Last-Modified"] = self.httpdate(task.updated_at or task.created_at)
+        if etag:
+            resp.set_etag(etag)
+        resp.headers["Last-Modified"] = self.httpdate(last_modified)
         return resp
 
     def delete_task(self, task_id):
@@ -541,6 +703,12 @@ class TaskList(TaskResource, AppResourceList):
             type: integer
             minimum: 0
             default: 20
+          - in: query
+            name: cursor
+            description: >
+                The opaque cursor of the page from the "next" link of the previous page
+                (empty for the first page) that switches to the keyset pagination
+            type: string
         responses:
           200:
             description: "successful operation"
@@ -815,8 +983,117 @@ class TaskAPI(TaskList):
         return self.delete_task(task_id)
 
 
+class TaskRecordsAPI(TaskResource):
+    """Bulk task record services."""
+
+    # the record processing state fields that cannot be set directly:
+    protected_fields = ["id", "task", "processed_at", "status", "claimed_by", "claimed_until", "retry_count"]
+
+    def patch(self, task_id):
+        """Update the selected task records in bulk.
+
+        ---
+        tags:
+          - "tasks"
+        summary: "Update the task records in bulk."
+        description: >
+            Update the task records selected by the record IDs and/or the filter (the record field
+            values the records have to match) with a single set-based update, e.g.,
+            {"filter": {"is-active": false}, "set": {"is-active": true}}.
+            The activated or reset records get enqueued for processing.
+        consumes:
+          - application/json
+          - text/yaml
+        parameters:
+          - name: "task_id"
+            in: "path"
+            description: "Task ID."
+            required: true
+            type: "integer"
+          - in: body
+            name: body
+            description: "The record selection and the new field values."
+            schema:
+              type: object
+              properties:
+                ids:
+                  type: array
+                  description: "The IDs of the records (default: all records of the task)."
+                  items:
+                    type: integer
+                filter:
+                  type: object
+                  description: "The record field values the records have to match."
+                set:
+                  type: object
+                  description: "The new record field values."
+                reset:
+                  type: boolean
+                  description: "Reset the processing of the records."
+        produces:
+          - "application/json"
+        responses:
+          200:
+            description: "successful operation"
+          400:
+            $ref: "#/responses/BadRequest"
+          401:
+            $ref: "#/responses/Unauthorized"
+          403:
+            $ref: "#/responses/AccessDenied"
+          404:
+            $ref: "#/responses/NotFound"
+          422:
+            $ref: "#/responses/UnprocessableEntity"
+        """
+        try:
+            task = Task.get(id=task_id)
+        except Task.DoesNotExist:
+            return jsonify({"error": "The task doesn't exist."}), 404
+        if task.created_by_id != current_user.id:
+            return jsonify({"error": "Access denied."}), 403
+        if task.records is None:
+            return jsonify({"error": f"The task {task_id} doesn't have records."}), 400
+
+        try:
+            data = yaml.safe_load(request.data) if self.is_yaml_request else request.get_json()
+        except Exception as ex:
+            return jsonify({"error": "Invalid request format.", "message": str(ex)}), 415
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid request format. Only JSON or YAML are acceptable."}), 415
+
+        model = task.record_model
+        ids, where, values = data.get("ids"), {}, {}
+        if ids is not None and (
+                not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return jsonify({"error": "Invalid record IDs.", "message": "Expected a list of integers."}), 422
+        for name, fields in [("filter", where), ("set", values)]:
+            for k, v in (data.get(name) or {}).items():
+                field = model._meta.fields.get(k.replace("-", "_"))
+                if not field or field.name == "task" or (
+                        name == "set" and field.name in self.protected_fields):
+                    return jsonify({
+                        "error": f"Invalid field in \"{name}\": {k}",
+                        "message": f"{model.__name__} doesn't have the field {k} or it cannot be used.",
+                    }), 422
+                if isinstance(field, models.PartialDateField) and v is not None:
+                    v = models.PartialDate.create(v)
+                fields[field.name] = v
+        if not values and not data.get("reset"):
+            return jsonify({"error": "Missing \"set\" or \"reset\"."}), 422
+
+        try:
+            count = utils.update_task_records(
+                task, values, record_ids=ids, where=where, reset=bool(data.get("reset")))
+        except Exception as ex:
+            app.logger.exception(f"Failed to update the records of the task {task_id}.")
+            return jsonify({"error": "Failed to update the records.", "message": str(ex)}), 400
+        return jsonify({"count": count})
+
+
 api.add_resource(TaskList, "/api/v1/tasks")
 api.add_resource(TaskAPI, "/api/v1/tasks/<int:task_id>")
+api.add_resource(TaskRecordsAPI, "/api/v1/tasks/<int:task_id>/records")
 
 
 class AffiliationListAPI(TaskResource):
@@ -961,6 +1238,8 @@ class AffiliationListAPI(TaskResource):
                 description: "User ORCID ID"
         """
         if request.content_type in ["text/csv", "text/tsv"]:
+            if self.is_async_request:
+                return self.load_csv_async(AffiliationRecord, TaskType.AFFILIATION)
             task = AffiliationRecord.load_from_csv(request.data.decode("utf-8"), filename=self.filename, org=self.org)
             return self.jsonify_task(task)
         return self.handle_affiliation_task()
@@ -1240,6 +1519,8 @@ class FundListAPI(TaskResource):
             type: object
         """
         if request.content_type in ["text/csv", "text/tsv"]:
+            if self.is_async_request:
+                return self.load_csv_async(FundingRecord, TaskType.FUNDING)
             task = FundingRecord.load_from_csv(request.data.decode("utf-8"), filename=self.filename)
             return self.jsonify_task(task)
         return self.handle_task()
@@ -1434,6 +1715,8 @@ class WorkListAPI(TaskResource):
             type: object
         """
         if request.content_type in ["text/csv", "text/tsv"]:
+            if self.is_async_request:
+                return self.load_csv_async(WorkRecord, TaskType.WORK)
             task = WorkRecord.load_from_csv(request.data.decode("utf-8"), filename=self.filename)
             return self.jsonify_task(task)
         return self.handle_task()
@@ -1632,6 +1915,8 @@ class PeerReviewListAPI(TaskResource):
             type: object
         """
         if request.content_type in ["text/csv", "text/tsv"]:
+            if self.is_async_request:
+                return self.load_csv_async(PeerReviewRecord, TaskType.PEER_REVIEW)
             task = PeerReviewRecord.load_from_csv(request.data.decode("utf-8"), filename=self.filename)
             return self.jsonify_task(task)
         return self.handle_task()
@@ -1882,6 +2167,8 @@ class PropertyListAPI(TaskResource):
                 description: "User ORCID ID"
         """
         if request.content_type in ["text/csv", "text/tsv"]:
+            if self.is_async_request:
+                return self.load_csv_async(PropertyRecord, TaskType.PROPERTY)
             task = PropertyRecord.load_from_csv(request.data.decode("utf-8"), filename=self.filename)
             enqueue_task_records(task)
             return self.jsonify_task(task)
@@ -2144,6 +2431,12 @@ class UserListAPI(AppResourceList):
             minimum: 0
             default: 20
             description: The size of the data page
+          - in: query
+            name: cursor
+            type: string
+            description: >
+                The opaque cursor of the page from the "next" link of the previous page
+                (empty for the first page) that switches to the keyset pagination
         responses:
           200:
             description: "successful operation"
@@ -2818,6 +3111,8 @@ class ResourceListAPI(TaskResource):
                 description: "User ORCID ID"
         """
         if request.content_type in ["text/csv", "text/tsv"]:
+            if self.is_async_request:
+                return self.load_csv_async(ResourceRecord, TaskType.RESOURCE)
             task = ResourceRecord.load_from_csv(request.data.decode("utf-8"), filename=self.filename)
             enqueue_task_records(task)
             return self.jsonify_task(task)
@@ -3498,6 +3793,18 @@ def yamlfy(*args, **kwargs):
     return current_app.response_class((dump_yaml(data), '\n'), mimetype="text/yaml")
 
 
+def get_orcid_token(org_id, orcid):
+    """Get the ORCID access token of the user granted to the organisation (cached)."""
+
+    def fetch():
+        token = OrcidToken.select().join(User, on=OrcidToken.user).where(
+            User.orcid == orcid, OrcidToken.org_id == org_id).first()
+        return token and dict(token.__data__)
+
+    data = token_cache.get(("orcid", org_id, orcid), fetch)
+    return data and OrcidToken.from_data(data)
+
+
 @app.route("/orcid/api/<string:version>/<string:orcid>", methods=["GET", "POST", "PUT", "DELETE"])
 @app.route(
     "/orcid/api/<string:version>/<string:orcid>/<path:rest>",
@@ -3514,8 +3821,7 @@ def orcid_proxy(version, orcid, rest=None):
         validate_orcid_id(orcid)
     except Exception as ex:
         return jsonify({"error": str(ex), "message": "Missing or invalid ORCID iD."}), 415
-    token = OrcidToken.select().join(User, on=OrcidToken.user).where(
-        User.orcid == orcid, OrcidToken.org == current_user.organisation).first()
+    token = get_orcid_token(current_user.organisation_id, orcid)
     if not token:
         return jsonify({"message": "The user hasn't granted access to the user profile"}), 403
 
@@ -3543,6 +3849,7 @@ def orcid_proxy(version, orcid, rest=None):
                                             data=request.data,
                                             headers=headers,
                                             user_id=current_user.id,
+                                            org_id=current_user.organisation_id,
                                             job_id=str(job_id))
         resp_url = url_for("orcid_proxy_response", job_id=str(job.id))
         resp = jsonify({"job-id": str(job.id), "response-url": resp_url})
@@ -3550,47 +3857,116 @@ def orcid_proxy(version, orcid, rest=None):
         resp.headers["ORCIDHub-AsyncOperation-Response"] = resp_url
         return resp
 
+    # the cached GET responses vary by the organisation and the scopes of the access token:
+    variant = (version, rest, request.query_string, token.org_id, token.scopes,
+               headers.get("Accept"), headers.get("Accept-Encoding"))
+    cached = proxy_cache.get(orcid, *variant) if request.method == "GET" else None
+    if cached:
+        if proxy_cache.is_fresh(cached) and "no-cache" not in headers.get("Cache-Control", ''):
+            proxy_cache.count("hit")
+            return cached_proxy_response(cached, "HIT")
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
     proxy_req = requests.Request(
         request.method, url, data=request.stream, headers=headers).prepare()
-    session = requests.Session()
-    # TODO: add time-out
-    call = OrcidApiCall(method=request.method, url=url, query_params=headers)
-
-    resp = session.send(proxy_req, stream=True)
-
-    call.status = resp.status_code
-    call.user_id = current_user.id
-    call.set_response_time()
-    call.response = ""
-
-    def generate():
-        # for chunk in resp.raw.stream(decode_content=False, amt=CHUNK_SIZE):
-        gzip_magic_number = b'\x1f\x8b'
-        response = b''
-
-        for chunk in resp.raw.stream(decode_content=False):
-            response += chunk
-            yield chunk
-
-        if response:
-            if response.startswith(gzip_magic_number):
-                try:
-                    response = gzip.decompress(response)
-                except:
-                    pass
-            call.response = response.decode(errors="ignore")
-
-        call.save()
+    call = dict(
+        called_at=datetime.utcnow(),
+        user_id=current_user.id,
+        method=request.method,
+        url=url,
+        query_params=headers,
+    )
+
+    rate_limiter.acquire(current_user.organisation_id)
+    try:
+        resp = orcid_api_session.send(proxy_req, stream=True, timeout=proxy_timeout())
+    except requests.exceptions.RequestException as ex:
+        status = 504 if isinstance(ex, requests.exceptions.Timeout) else 502
+        call.update(status=status, response=str(ex))
+        api_call_log.add(**call)
+        return jsonify({"error": "ORCID API is not available", "message": str(ex)}), status
+
+    call["status"] = resp.status_code
+    call["response_time_ms"] = round(
+        (datetime.utcnow() - call["called_at"]).total_seconds() * 1000)
+
+    if request.method != "GET":
+        proxy_cache.invalidate(orcid)
+    elif cached and resp.status_code == 304:
+        resp.close()
+        api_call_log.add(**call)
+        proxy_cache.touch(orcid, *variant)
+        proxy_cache.count("revalidated")
+        return cached_proxy_response(cached, "REVALIDATED")
+    else:
+        proxy_cache.count("miss")
+    is_cacheable = request.method == "GET" and resp.status_code == 200 and proxy_cache.ttl
 
     # TODO: verify if flask can create chunked responses: Transfer-Encoding: chunked
     proxy_headers = [(h, v) for h, v in resp.raw.headers.items() if h not in [
         "Transfer-Encoding",
     ]]
+
+    def generate():
+        max_size = app.config.get("ORCID_PROXY_LOG_MAX_SIZE") or 0
+        captured, size = [], 0
+        # the whole response gets captured for the cache unless it's too large:
+        cache_size = proxy_cache.max_size if is_cacheable else 0
+        try:
+            for chunk in resp.raw.stream(decode_content=False):
+                if size < max(max_size, cache_size + 1):
+                    captured.append(chunk)
+                    size += len(chunk)
+                yield chunk
+        finally:
+            resp.close()
+            data = b"".join(captured)
+            call["response"] = decode_captured_response(data[:max_size], max_size)
+            api_call_log.add(**call)
+            if cache_size and size <= cache_size:
+                proxy_cache.set(
+                    orcid,
+                    *variant,
+                    status=resp.status_code,
+                    headers=proxy_headers,
+                    body=data,
+                    etag=resp.raw.headers.get("ETag"),
+                    last_modified=resp.raw.headers.get("Last-Modified"))
+
     proxy_resp = Response(
         stream_with_context(generate()), headers=proxy_headers, status=resp.status_code)
+    proxy_resp.headers["X-Cache"] = "MISS"
     return proxy_resp
 
 
+def cached_proxy_response(cached, cache_status):
+    """Create the proxy response from the cached one."""
+    resp = Response(cached["body"], headers=cached["headers"], status=cached["status"])
+    resp.headers["X-Cache"] = cache_status
+    return resp
+
+
+def proxy_timeout():
+    """Get ORCID API proxy (connect, read) time-outs."""
+    return (
+        app.config.get("ORCID_PROXY_CONNECT_TIMEOUT") or None,
+        app.config.get("ORCID_PROXY_READ_TIMEOUT") or None,
+    )
+
+
+def decode_captured_response(data, max_size):
+    """Decode the (truncated) captured response for the API call log (at most *max_size*)."""
+    if data.startswith(b"\x1f\x8b"):
+        try:
+            data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, max_size)
+        except zlib.error:
+            pass
+    return data.decode(errors="ignore")
+
+
 @app.route("/orcid/response/<uuid:job_id>")
 @oauth.require_oauth()
 def orcid_proxy_response(job_id):
@@ -3613,17 +3989,20 @@ def orcid_proxy_response(job_id):
 
 
 @rq.job(timeout=300)
-def exeute_orcid_call_async(method, url, data, headers, user_id):
+def exeute_orcid_call_async(method, url, data, headers, user_id, org_id=None):
     """Execute asynchrouniously ORCID API request."""
     job = get_current_job()
     ar = AsyncOrcidResponse.get(job_id=job.id)
     proxy_req = requests.Request(method, url, data=data, headers=headers).prepare()
     call = OrcidApiCall(method=method, url=url, query_params=headers)
 
-    session = requests.Session()
-    resp = session.send(proxy_req)
+    rate_limiter.acquire(org_id)
+    resp = orcid_api_session.send(proxy_req, timeout=proxy_timeout())
+    if method != "GET":
+        m = ORCID_IN_PATH_REGEX.search(url)
+        proxy_cache.invalidate(m and m.group(1))
 
-    call.response = resp.text
+    call.response = resp.text[:app.config.get("ORCID_PROXY_LOG_MAX_SIZE") or None]
     call.user_id = user_id
     call.status = resp.status_code
     call.set_response_time()
@@ -3636,6 +4015,195 @@ def exeute_orcid_call_async(method, url, data, headers, user_id):
     ar.save()
 
 
+@app.route("/orcid/batch", methods=["POST"])
+@oauth.require_oauth()
+def orcid_batch():
+    """Enqueue a batch of ORCID API calls executed asynchronously by a single job.
+
+    The request body is the list of the calls, eg:
+
+        [{"method": "GET", "path": "v3.0/0000-0002-1825-0097/works"},
+         {"method": "POST", "path": "v3.0/0000-0002-1825-0097/work", "body": {...}}]
+
+    The outcome of the calls can be retrieved with a single request to the
+    response URL (see :func:`orcid_batch_response`).
+    """
+    calls = request.get_json(silent=True)
+    if not isinstance(calls, list) or not calls:
+        return jsonify({
+            "error": "Invalid batch",
+            "message": "Expected a non-empty list of the calls."
+        }), 400
+    max_size = app.config.get("ORCID_PROXY_BATCH_MAX_SIZE") or 1000
+    if len(calls) > max_size:
+        return jsonify({
+            "error": "Too large batch",
+            "message": f"The batch size exceeds the maximum: {max_size}."
+        }), 413
+
+    parsed_calls = []
+    for seq, c in enumerate(calls):
+        if not isinstance(c, dict):
+            c = {}
+        method = str(c.get("method") or "GET").upper()
+        version, _, rest = str(c.get("path") or '').strip('/').partition('/')
+        orcid, _, rest = rest.partition('/')
+        if (method not in ["GET", "POST", "PUT", "DELETE"]
+                or not ORCID_API_VERSION_REGEX.match(version) or not ORCID_ID_REGEX.match(orcid)):
+            return jsonify({
+                "error": "Invalid call",
+                "message": f"Invalid call #{seq}: {c}."
+            }), 400
+        parsed_calls.append((seq, method, version, orcid, rest, c.get("body")))
+
+    granted_orcids = set(
+        u.orcid for u in User.select(User.orcid).join(OrcidToken, on=OrcidToken.user).where(
+            User.orcid.in_(list(set(c[3] for c in parsed_calls))),
+            OrcidToken.org == current_user.organisation).distinct())
+
+    batch_id, now = uuid4(), datetime.utcnow()
+    orcid_api_host_url = app.config["ORCID_API_HOST_URL"]
+    rows, queued_calls = [], []
+    for seq, method, version, orcid, rest, body in parsed_calls:
+        url = f"{orcid_api_host_url}{version}/{orcid}" + (f"/{rest}" if rest else '')
+        row = dict(job_id=uuid4(), batch_id=batch_id, seq=seq, method=method, url=url,
+                   enqueued_at=now, executed_at=None, status_code=None, body=None)
+        if orcid in granted_orcids:
+            queued_calls.append((seq, method, url, orcid, body))
+        else:
+            row.update(
+                executed_at=now,
+                status_code=403,
+                body=json.dumps({"message": "The user hasn't granted access to the user profile"}))
+        rows.append(row)
+
+    with AsyncOrcidResponse._meta.database.atomic():
+        for chunk in chunked(rows, 100):
+            AsyncOrcidResponse.insert_many(chunk).execute()
+    if queued_calls:
+        exeute_orcid_batch_async.queue(str(batch_id),
+                                       queued_calls,
+                                       user_id=current_user.id,
+                                       org_id=current_user.organisation_id,
+                                       job_id=str(batch_id))
+
+    resp_url = url_for("orcid_batch_response", batch_id=str(batch_id))
+    resp = jsonify({"batch-id": str(batch_id), "size": len(rows), "response-url": resp_url})
+    resp.status_code = 202
+    resp.headers["ORCIDHub-AsyncOperation-Response"] = resp_url
+    return resp
+
+
+@app.route("/orcid/batch/<uuid:batch_id>")
+@oauth.require_oauth()
+def orcid_batch_response(batch_id):
+    """Retrieve the outcome of the batch of ORCID API calls.
+
+    The outcome is returned either as NDJSON stream of all the calls (with the query
+    parameter "format=ndjson" or Accept: application/x-ndjson), or page by page
+    (the query parameters "page" and "page_size", default: 1 and 100).
+    """
+    query = AsyncOrcidResponse.select().where(
+        AsyncOrcidResponse.batch_id == batch_id).order_by(AsyncOrcidResponse.seq)
+    total, completed = AsyncOrcidResponse.select(
+        fn.COUNT(AsyncOrcidResponse.job_id), fn.COUNT(AsyncOrcidResponse.executed_at)).where(
+            AsyncOrcidResponse.batch_id == batch_id).scalar(as_tuple=True)
+    if not total:
+        return jsonify({"message": "The batch doesn't exist"}), 404
+
+    if (request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == "application/x-ndjson"):
+
+        def generate():
+            for r in query.iterator():
+                yield json.dumps(r.to_result()) + '\n'
+
+        resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    else:
+        try:
+            page = max(int(request.args.get("page", 1)), 1)
+            page_size = max(int(request.args.get("page_size", 100)), 1)
+        except ValueError:
+            page, page_size = 1, 100
+        resp = jsonify({
+            "batch-id": str(batch_id),
+            "total": total,
+            "completed": completed,
+            "results": [r.to_result() for r in query.paginate(page, page_size)],
+        })
+        if page * page_size < total:
+            resp.headers["Link"] = f'<{changed_path("page", page + 1)}>;rel="next"'
+    resp.headers["ORCIDHub-Batch-Total"] = total
+    resp.headers["ORCIDHub-Batch-Completed"] = completed
+    return resp
+
+
+@rq.job(timeout=3600)
+def exeute_orcid_batch_async(batch_id, calls, user_id, org_id=None):
+    """Execute asynchrouniously a batch of ORCID API requests.
+
+    The requests get sent by a pool of threads sharing the pooled ORCID API session,
+    and the outcomes get stored as soon as they are received (in the order of completion).
+    """
+    tokens = {
+        t.orcid: t.access_token
+        for t in OrcidToken.select(OrcidToken.access_token, User.orcid).join(
+            User, on=OrcidToken.user).where(
+                OrcidToken.org_id == org_id,
+                User.orcid.in_(list(set(c[3] for c in calls)))).objects()
+    }
+
+    def send(seq, method, url, orcid, body):
+        headers = {"Accept": "application/json", "Authorization": f"Bearer {tokens[orcid]}"}
+        data = None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            data = json.dumps(body)
+        proxy_req = requests.Request(method, url, data=data, headers=headers).prepare()
+        called_at = datetime.utcnow()
+        rate_limiter.acquire(org_id)
+        try:
+            resp = orcid_api_session.send(proxy_req, timeout=proxy_timeout())
+            return seq, method, url, called_at, resp.status_code, dict(resp.headers), resp.text
+        except requests.exceptions.RequestException as ex:
+            status = 504 if isinstance(ex, requests.exceptions.Timeout) else 502
+            body = json.dumps({"error": "ORCID API is not available", "message": str(ex)})
+            return seq, method, url, called_at, status, {}, body
+
+    def store(seq, status, headers, body):
+        AsyncOrcidResponse.update(
+            status_code=status,
+            headers=json.dumps(headers),
+            body=body,
+            executed_at=datetime.utcnow()).where(
+                AsyncOrcidResponse.batch_id == batch_id,
+                AsyncOrcidResponse.seq == seq).execute()
+
+    # the access to the profile might have been revoked since the calls were enqueued:
+    for seq, *_ in (c for c in calls if not tokens.get(c[3])):
+        store(seq, 403, {}, json.dumps(
+            {"message": "The user hasn't granted access to the user profile"}))
+
+    max_size = app.config.get("ORCID_PROXY_LOG_MAX_SIZE") or None
+    workers = concurrency.workers(app.config.get("BATCH_WORKERS") or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for f in as_completed(
+                [executor.submit(send, *c) for c in calls if tokens.get(c[3])]):
+            seq, method, url, called_at, status, headers, body = f.result()
+            api_call_log.add(
+                called_at=called_at,
+                user_id=user_id,
+                method=method,
+                url=url,
+                status=status,
+                response=body[:max_size],
+                response_time_ms=round((datetime.utcnow() - called_at).total_seconds() * 1000))
+            if method != "GET":
+                m = ORCID_IN_PATH_REGEX.search(url)
+                proxy_cache.invalidate(m and m.group(1))
+            store(seq, status, headers, body)
+
+
 @app.route("/api/v1/<string:orcid>/webhook/<path:callback_url>", methods=["PUT", "DELETE"])
 @app.route("/api/v1/<string:orcid>/webhook", methods=["PUT", "DELETE"])
 @app.route("/api/v1/webhook/<path:callback_url>", methods=["PUT", "DELETE"])
@@ -161,12 +161,74 @@ DKIM_KEY_PATH = path.join(getcwd(), ".keys", "dkim.key")
 
 # RQ:
 RQ_REDIS_URL = getenv("RQ_REDIS_URL")
-RQ_QUEUE_CLASS = "orcid_hub.queuing.ThrottledQueue"
 RQ_CONNECTION_CLASS = getenv("RQ_CONNECTION_CLASS", "redis.StrictRedis")
 RQ_ASYNC = getenv("RQ_ASYNC", True)
 if isinstance(RQ_ASYNC, str):
     RQ_ASYNC = RQ_ASYNC.lower() in ["true", "1", "yes", "on"]
 
+# Batch processing:
+# the number of the threads dispatching ORCID API calls within a single batch job
+# (NB! > 1 requires a client/server database, eg, PostgreSQL):
+BATCH_WORKERS = int(getenv("BATCH_WORKERS", 1))
+# The batch record claim lease time (sec) after which the records can be claimed by other workers:
+BATCH_CLAIM_LEASE = int(getenv("BATCH_CLAIM_LEASE", 600))
+# ORCID API call rate limit (calls/sec) and the burst size shared by all the processes:
+ORCID_API_RATE_LIMIT = float(getenv("ORCID_API_RATE_LIMIT", 24))
+ORCID_API_RATE_BURST = int(getenv("ORCID_API_RATE_BURST", 40))
+# ORCID API call rate limit (calls/sec) and the burst size per organisation (0 - not limited):
+ORCID_API_ORG_RATE_LIMIT = float(getenv("ORCID_API_ORG_RATE_LIMIT", 0))
+ORCID_API_ORG_RATE_BURST = int(getenv("ORCID_API_ORG_RATE_BURST", 0))
+# The maximum number of the retries of the ORCID API calls failed with 429, 502, 503 or 504,
+# the initial retry delay (sec) that doubles with each attempt, and the maximum retry delay (sec):
+ORCID_API_MAX_RETRIES = int(getenv("ORCID_API_MAX_RETRIES", 5))
+ORCID_API_RETRY_BACKOFF = int(getenv("ORCID_API_RETRY_BACKOFF", 60))
+ORCID_API_RETRY_MAX_DELAY = int(getenv("ORCID_API_RETRY_MAX_DELAY", 3600))
+# ORCID API call latency (sec) above which the batch processing concurrency gets reduced:
+ORCID_API_LATENCY_TARGET = float(getenv("ORCID_API_LATENCY_TARGET", 5))
+# The number of consecutive ORCID API call failures (502, 503, 504 or network failures)
+# opening the circuit breaker, and the time (sec) the calls get rejected before a probe call:
+ORCID_API_CIRCUIT_THRESHOLD = int(getenv("ORCID_API_CIRCUIT_THRESHOLD", 5))
+ORCID_API_CIRCUIT_RESET_TIMEOUT = int(getenv("ORCID_API_CIRCUIT_RESET_TIMEOUT", 60))
+# The maximum number of the kept alive connections to ORCID API host shared by all the threads
+# of a process (should be no less than BATCH_WORKERS):
+ORCID_API_POOL_MAXSIZE = int(getenv("ORCID_API_POOL_MAXSIZE", 10))
+# The time (sec) the processes wait for the outcome of an identical ORCID API GET call made
+# by another process (0 - the identical calls are coalesced only within a process):
+ORCID_API_COALESCING_TIMEOUT = float(getenv("ORCID_API_COALESCING_TIMEOUT", 0))
+# ORCID API call audit log buffer size (0 - write the entries right away), the time (sec)
+# between the buffer flushes, and what to do when it's full ("flush" or "drop" the entries):
+ORCID_API_CALL_LOG_BUFFER_SIZE = int(getenv("ORCID_API_CALL_LOG_BUFFER_SIZE", 1000))
+ORCID_API_CALL_LOG_FLUSH_INTERVAL = float(getenv("ORCID_API_CALL_LOG_FLUSH_INTERVAL", 5))
+ORCID_API_CALL_LOG_OVERFLOW = getenv("ORCID_API_CALL_LOG_OVERFLOW", "flush")
+# ORCID API proxy connect and read time-outs (sec), and the maximum size of the captured
+# (logged) response (0 - no logging of the response):
+ORCID_PROXY_CONNECT_TIMEOUT = float(getenv("ORCID_PROXY_CONNECT_TIMEOUT", 5))
+ORCID_PROXY_READ_TIMEOUT = float(getenv("ORCID_PROXY_READ_TIMEOUT", 60))
+ORCID_PROXY_LOG_MAX_SIZE = int(getenv("ORCID_PROXY_LOG_MAX_SIZE", 65536))
+# The maximum number of ORCID API calls in a single proxy batch:
+ORCID_PROXY_BATCH_MAX_SIZE = int(getenv("ORCID_PROXY_BATCH_MAX_SIZE", 1000))
+# The time (sec) ORCID API proxy GET responses are kept in the cache (0 - no caching),
+# the time (sec) they are served without revalidation, and the maximum cached response size:
+ORCID_PROXY_CACHE_TTL = int(getenv("ORCID_PROXY_CACHE_TTL", 86400))
+ORCID_PROXY_CACHE_MAX_AGE = int(getenv("ORCID_PROXY_CACHE_MAX_AGE", 60))
+ORCID_PROXY_CACHE_MAX_SIZE = int(getenv("ORCID_PROXY_CACHE_MAX_SIZE", 1048576))
+# The size (bytes) of the sample of an uploaded file used for the detection of its encoding:
+UPLOAD_ENCODING_SAMPLE_SIZE = int(getenv("UPLOAD_ENCODING_SAMPLE_SIZE", 65536))
+# The number of the task records inserted in a single batch when loading an upload:
+BULK_INSERT_CHUNK_SIZE = int(getenv("BULK_INSERT_CHUNK_SIZE", 500))
+# The time limit (sec) of the background job loading the task records from an upload:
+UPLOAD_JOB_TIMEOUT = int(getenv("UPLOAD_JOB_TIMEOUT", 3600))
+# The number of the task records read and serialized at a time when a task gets exported:
+EXPORT_PAGE_SIZE = int(getenv("EXPORT_PAGE_SIZE", 500))
+# The maximum number of the task records processed by a single enqueued processing job:
+PROCESS_CHUNK_SIZE = int(getenv("PROCESS_CHUNK_SIZE", 20))
+# The time (sec) the resolved Hub API and ORCID access tokens are cached in the memory
+# of a process (0 - no caching), and the maximum number of the cached tokens:
+TOKEN_CACHE_TTL = int(getenv("TOKEN_CACHE_TTL", 30))
+TOKEN_CACHE_MAX_SIZE = int(getenv("TOKEN_CACHE_MAX_SIZE", 10000))
+# The number of months ORCID API call log entries are kept (0 - keep all the entries):
+ORCID_API_CALL_RETENTION = int(getenv("ORCID_API_CALL_RETENTION", 0))
+
 # rq-dashboard config:
 RQ_POLL_INTERVAL = 5000  #: Web interface poll period for updates in ms
 WEB_BACKGROUND = "gray"
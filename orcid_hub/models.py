@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 """Application models."""
 
+import codecs
 import copy
 import csv
+import io
 import os
 import random
 import re
@@ -50,6 +52,7 @@ from playhouse.shortcuts import model_to_dict
 from pycountry import countries, currencies, languages
 from pykwalify.core import Core
 from pykwalify.errors import SchemaError
+from rq import get_current_job
 
 from . import app, cache, db, schemas
 
@@ -347,6 +350,24 @@ def normalize_email(value):
         return re.match(r"^(.*\<)?([^\>]*)\>?$", value).group(2) if "<" in value else value
 
 
+def normalize_code(value):
+    """Normalize an enumerated value (eg, visibility or relationship): 'PART_OF' -> 'part-of'."""
+    if value:
+        return value.replace("_", "-").lower()
+    return value
+
+
+def is_yes(value):
+    """Test if the uploaded value is an affirmative one, eg, 'Y', 'yes' or 'TRUE'."""
+    return bool(value) and value.lower() in ["y", "yes", "1", "true"]
+
+
+@lru_cache(maxsize=1024)
+def country_code(value):
+    """Get ISO 3166-1 alpha-2 code of the country given by its code or name (cached)."""
+    return countries.lookup(value).alpha_2
+
+
 class PartialDate(namedtuple("PartialDate", ["year", "month", "day"])):
     """Partial date (without month day or both month and month day."""
 
@@ -502,7 +523,7 @@ class UUIDField(Field):
 
     def python_value(self, value):
         """Return Python representation."""
-        return uuid.UUID(value)
+        return uuid.UUID(value) if value else value
 
 
 class TaskType(IntEnum):
@@ -639,12 +660,50 @@ class BaseModel(Model):
 
     def save(self, *args, **kwargs):
         """Consistency validation and saving."""
-        if self.is_dirty() and hasattr(self, "task") and self.task:
+        is_dirty = self.is_dirty()
+        if is_dirty and hasattr(self, "task") and self.task:
             self.task.updated_at = datetime.utcnow()
             self.task.save()
-        if self.is_dirty() and getattr(self, "email", False) and self.field_is_updated("email"):
+        if is_dirty and getattr(self, "email", False) and self.field_is_updated("email"):
             self.email = self.email.lower()
-        return super().save(*args, **kwargs)
+        res = super().save(*args, **kwargs)
+        if is_dirty and "task" not in self._meta.fields:
+            # the invitees, the external IDs and the contributors of the task records:
+            self.mark_task_updated()
+        return res
+
+    def delete_instance(self, *args, **kwargs):  # noqa: D102
+        self.mark_task_updated()
+        return super().delete_instance(*args, **kwargs)
+
+    @classmethod
+    def task_id_query(cls, *conditions):
+        """Get the query of the IDs of the tasks the entries matching the conditions belong to.
+
+        The entries are either the task records or their invitees, external IDs and contributors.
+        If the model isn't related to the tasks, None is returned.
+        """
+        fields = cls._meta.fields
+        if "task" in fields:
+            return cls.select(cls.task_id).where(*conditions)
+        if "record" in fields and "task" in fields["record"].rel_model._meta.fields:
+            rm = fields["record"].rel_model
+            return rm.select(rm.task_id).where(
+                rm.id.in_(cls.select(cls.record_id).where(*conditions))
+            )
+        if cls is Invitee:
+            through = MessageRecord.invitees.get_through_model()
+            return (
+                MessageRecord.select(MessageRecord.task_id)
+                .join(through, on=through.messagerecord)
+                .where(through.invitee.in_(cls.select(cls.id).where(*conditions)))
+            )
+
+    def mark_task_updated(self):
+        """Bump the update time-stamp (the change token) of the task the entry belongs to."""
+        query = self.task_id_query(self._pk_expr())
+        if query is not None:
+            Task.mark_updated(query)
 
     def add_status_line(self, line):
         """Add a text line to the status for logging processing progress."""
@@ -665,6 +724,13 @@ class BaseModel(Model):
         """Get last inserted entry."""
         return cls.select().order_by(cls.id.desc()).limit(1).first()
 
+    @classmethod
+    def from_data(cls, data):
+        """Create an instance from the field values (eg, cached ones) without querying DB."""
+        instance = cls(__no_default__=1, **data)
+        instance._dirty.clear()
+        return instance
+
     @classmethod
     def model_class_name(cls):
         """Get the class name of the model."""
@@ -900,6 +966,12 @@ class Organisation(AuditedModel):
 
             super().save(*args, **kwargs)
 
+    def delete_instance(self, *args, **kwargs):  # noqa: D102
+        # NB! the organisation tokens get deleted by the cascade:
+        res = super().delete_instance(*args, **kwargs)
+        purge_token_cache()
+        return res
+
     class Meta:  # noqa: D101,D106
         table_alias = "o"
 
@@ -1120,6 +1192,20 @@ class User(AuditedModel, UserMixin):
         """Generate UUID for the user based on the primary email."""
         return uuid.uuid5(uuid.NAMESPACE_URL, "mailto:" + (self.email or self.eppn))
 
+    def save(self, *args, **kwargs):  # noqa: D102
+        # the cached access tokens are resolved by the user ORCID iD:
+        is_orcid_updated = self.id is not None and self.field_is_updated("orcid")
+        res = super().save(*args, **kwargs)
+        if is_orcid_updated:
+            purge_token_cache()
+        return res
+
+    def delete_instance(self, *args, **kwargs):  # noqa: D102
+        # NB! the user tokens get deleted by the cascade:
+        res = super().delete_instance(*args, **kwargs)
+        purge_token_cache()
+        return res
+
     class Meta:  # noqa: D101,D106
         table_alias = "u"
 
@@ -1344,6 +1430,18 @@ class OrcidToken(AuditedModel):
     # created_by = ForeignKeyField(User, on_delete="SET NULL", null=True, backref='+')
     # updated_by = ForeignKeyField(User, on_delete="SET NULL", null=True, backref='+')
 
+    def save(self, *args, **kwargs):  # noqa: D102
+        is_new = self.id is None
+        res = super().save(*args, **kwargs)
+        if not is_new:
+            purge_token_cache()
+        return res
+
+    def delete_instance(self, *args, **kwargs):  # noqa: D102
+        res = super().delete_instance(*args, **kwargs)
+        purge_token_cache()
+        return res
+
     class Meta:  # noqa: D101,D106
         table_alias = "ot"
 
@@ -1378,7 +1476,7 @@ class UserOrgAffiliation(AuditedModel):
 class OrcidApiCall(BaseModel):
     """ORCID API call audit entry."""
 
-    called_at = DateTimeField(default=datetime.utcnow)
+    called_at = DateTimeField(default=datetime.utcnow, index=True)
     user = ForeignKeyField(User, null=True, on_delete="SET NULL", backref="orcid_api_calls")
     method = CharField(max_length=6)
     url = CharField()
@@ -1393,6 +1491,25 @@ class OrcidApiCall(BaseModel):
         """Calculate and set the response time assuming the call finished right now."""
         self.response_time_ms = round((datetime.utcnow() - self.called_at).microseconds / 1000)
 
+    @classmethod
+    def maintain(cls, retention=0):
+        """Remove the entries logged before the last *retention* months (0 - keep all).
+
+        If the table is partitioned (see :func:`partition_tables`), the upcoming monthly
+        partitions get created and the expired ones get dropped.
+        """
+        db = cls._meta.database
+        if isinstance(db, PostgresqlDatabase) and db.execute_sql(
+            "SELECT to_regproc('orcid_api_call_maintain') IS NOT NULL"
+        ).fetchone()[0]:
+            db.execute_sql("SELECT orcid_api_call_maintain(%s)", (retention,))
+        elif retention:
+            now = datetime.utcnow()
+            months = now.year * 12 + now.month - 1 - retention
+            cls.delete().where(
+                cls.called_at < datetime(months // 12, months % 12 + 1, 1)
+            ).execute()
+
     class Meta:  # noqa: D101,D106
         table_alias = "oac"
 
@@ -1429,6 +1546,21 @@ class Task(AuditedModel):
     expires_at = DateTimeField(null=True)
     expiry_email_sent_at = DateTimeField(null=True)
     status = CharField(null=True, max_length=10, choices=[(v, v) for v in ["ACTIVE", "RESET"]])
+    # ALTER TABLE task ADD COLUMN "file_id" INTEGER NULL REFERENCES file (id) ON DELETE SET NULL;
+    # ALTER TABLE task ADD COLUMN "loading_state" VARCHAR(10) NULL;
+    # ALTER TABLE task ADD COLUMN "rows_parsed" INTEGER NULL;
+    # ALTER TABLE task ADD COLUMN "rows_failed" INTEGER NULL;
+    # ALTER TABLE task ADD COLUMN "loading_error" TEXT NULL;
+    # (and the same on the audit table, e.g., audit.task)
+    file = ForeignKeyField(
+        File, null=True, on_delete="SET NULL", help_text="The upload waiting to be loaded."
+    )
+    loading_state = CharField(
+        null=True, max_length=10, choices=[(v, v) for v in ["LOADING", "LOADED", "FAILED"]]
+    )
+    rows_parsed = IntegerField(null=True, help_text="The number of the loaded rows.")
+    rows_failed = IntegerField(null=True, help_text="The number of the rejected rows.")
+    loading_error = TextField(null=True)
 
     def __str__(self):
         return (
@@ -1440,6 +1572,11 @@ class Task(AuditedModel):
             )
         )
 
+    @property
+    def loading_job_id(self):
+        """Get the ID of the job loading the task records from the upload."""
+        return f"load-task-{self.id}"
+
     @property
     def is_expiry_email_sent(self):
         """Test if the expiry email is sent ot not."""
@@ -1464,6 +1601,34 @@ class Task(AuditedModel):
             return MessageRecord.select().where(MessageRecord.task == self)
         return getattr(self, self.task_type.name.lower() + "_records")
 
+    @classmethod
+    def mark_updated(cls, task_ids):
+        """Bump the update time-stamp (the change token) of the tasks.
+
+        Args:
+            task_ids: the task IDs or the query selecting them (see :meth:`BaseModel.task_id_query`).
+
+        """
+        if isinstance(task_ids, (list, set, tuple)):
+            if not task_ids:
+                return
+            task_ids = list(task_ids)
+        cls.update(updated_at=datetime.utcnow()).where(cls.id.in_(task_ids)).execute()
+
+    def get_change_stamp(self):
+        """Get the time-stamp of the latest change and the change token of the task.
+
+        The task update time-stamp gets bumped whenever any of its records or their invitees,
+        external IDs and contributors gets saved or deleted, and by the bulk updates of the
+        records (see :meth:`mark_updated`), so it serves as the change token.
+
+        Returns:
+            tuple: the time-stamp of the latest change and the change token (str).
+
+        """
+        last_modified = self.updated_at or self.created_at
+        return last_modified, f"{self.id}:{last_modified.isoformat()}"
+
     @lazy_property
     def completed_count(self):
         """Get number of completed rows."""
@@ -1513,28 +1678,9 @@ class Task(AuditedModel):
             TaskType.FUNDING,
             TaskType.SYNC,
         ]:
-            if self.task_type == TaskType.AFFILIATION:
-                task_dict["records"] = [
-                    r.to_dict(
-                        external_id=[
-                            ae.to_export_dict()
-                            for ae in AffiliationExternalId.select().where(
-                                AffiliationExternalId.record_id == r.id
-                            )
-                        ],
-                        to_dashes=to_dashes,
-                        recurse=recurse,
-                        exclude=[self.record_model.task],
-                    )
-                    for r in self.records
-                ]
-            else:
-                task_dict["records"] = [
-                    r.to_dict(
-                        to_dashes=to_dashes, recurse=recurse, exclude=[self.record_model.task]
-                    )
-                    for r in self.records
-                ]
+            task_dict["records"] = list(
+                self.iter_record_dicts(export=False, to_dashes=to_dashes, recurse=recurse)
+            )
         return task_dict
 
     def to_export_dict(self, include_records=True):
@@ -1550,9 +1696,56 @@ class Task(AuditedModel):
             )
             task_dict["task-type"] = self.task_type.name
             if include_records:
-                task_dict["records"] = [r.to_export_dict() for r in self.records]
+                task_dict["records"] = list(self.iter_record_dicts())
         return task_dict
 
+    def iter_records(self, page_size=None):
+        """Iterate over the task records reading them page by page.
+
+        The pages are read with keyset pagination (ordered by the record ID) and the related
+        rows (invitees, contributors and external IDs) of each page get prefetched with
+        a single query per related model.
+        """
+        if self.records is None:
+            return
+        model = self.record_model
+        page_size = page_size or app.config.get("EXPORT_PAGE_SIZE") or 500
+        last_id = 0
+        while True:
+            query = self.records.where(model.id > last_id).order_by(model.id).limit(page_size)
+            page = list(query)
+            for r in page:
+                r.task = self
+            yield from model.prefetch_related(page)
+            if len(page) < page_size:
+                break
+            last_id = page[-1].id
+
+    def iter_record_dicts(self, export=True, to_dashes=True, recurse=None):
+        """Iterate over the dict representations of the task records.
+
+        Args:
+            export (bool): map the records for export (see *to_export_dict*), otherwise
+                the same way as *to_dict* does it.
+            to_dashes (bool): replace the underscores in the keys with dashes.
+            recurse (bool): include the referenced rows.
+
+        """
+        for r in self.iter_records():
+            if self.task_type == TaskType.AFFILIATION:
+                yield r.to_dict(
+                    external_id=[ae.to_export_dict() for ae in r.external_ids],
+                    to_dashes=to_dashes,
+                    recurse=True if export else recurse,
+                    exclude=[self.record_model.task],
+                )
+            elif export:
+                yield r.to_export_dict()
+            else:
+                yield r.to_dict(
+                    to_dashes=to_dashes, recurse=recurse, exclude=[self.record_model.task]
+                )
+
     class Meta:  # noqa: D101,D106
         table_alias = "t"
 
@@ -1648,6 +1841,162 @@ class UserInvitation(AuditedModel):
         table_alias = "ui"
 
 
+class ClaimableModel(BaseModel):
+    """Common model bits of the batch entries claimed by a processing worker.
+
+    A worker claims a batch of the entries by marking them with its claim token and
+    the claim (lease) expiry time. The entries of an expired claim (e.g., the worker
+    was killed) can be claimed again by any other worker.
+    """
+
+    # ALTER TABLE <table> ADD COLUMN "claimed_by" VARCHAR(100) NULL;
+    # ALTER TABLE <table> ADD COLUMN "claimed_until" TIMESTAMP NULL;
+    # ALTER TABLE <table> ADD COLUMN "retry_count" SMALLINT NULL DEFAULT 0;
+    # (and the same on the audit table, e.g., audit.affiliation_record)
+    claimed_by = CharField(max_length=100, null=True, help_text="The processing worker claim.")
+    claimed_until = DateTimeField(null=True, help_text="The processing worker claim expiry.")
+    retry_count = SmallIntegerField(
+        null=True, default=0, help_text="The number of the processing retries."
+    )
+
+    def defer(self, retry_at):
+        """Release the claim and defer the processing of the entry until the given time."""
+        self.retry_count = (self.retry_count or 0) + 1
+        self.claimed_by = None
+        self.claimed_until = retry_at
+
+    @property
+    def is_deferred(self):
+        """Test if the processing of the entry is deferred."""
+        return bool(
+            not self.claimed_by and self.claimed_until and self.claimed_until > datetime.utcnow()
+        )
+
+
+class HeaderMap:
+    """Compiled mapping of CSV/TSV upload columns to the record fields.
+
+    The column header patterns are compiled once per file schema and the mapping
+    of a file header gets cached, eg:
+
+        header_map = HeaderMap("first.*name", "last.*name", email="e-?mail")
+        val = header_map.reader(["First Name", "Last Name", "E-mail"])
+        first_name, email = val(row, 0), val(row, "email")
+    """
+
+    def __init__(self, *patterns, **named_patterns):
+        """Compile the column header patterns (positional and named ones)."""
+        self.names = {n: i for i, n in enumerate(named_patterns, len(patterns))}
+        self.rexs = tuple(
+            re.compile(ex, re.I) for ex in list(patterns) + list(named_patterns.values())
+        )
+        self.indexes = lru_cache(maxsize=128)(self._indexes)
+
+    def _indexes(self, header):
+        """Map the fields to the indexes of the first matching columns of the header."""
+        header = [column.strip() if column else None for column in header]
+        return tuple(
+            next((i for i, column in enumerate(header) if column and rex.match(column)), None)
+            for rex in self.rexs
+        )
+
+    def reader(self, header):
+        """Get the accessor of the row field values, *val(row, field, default=None)*."""
+        idxs = self.indexes(tuple(header))
+        if all(idx is None for idx in idxs):
+            raise ModelExceptionError(
+                f"Failed to map fields based on the header of the file: {header}"
+            )
+        names = self.names
+
+        def val(row, field, default=None):
+            if field.__class__ is str:
+                field = names[field]
+            idx = idxs[field] if field < len(idxs) else None
+            if idx is None or idx >= len(row):
+                return default
+            v = row[idx].strip()
+            return default if v == "" else v
+
+        return val
+
+
+class BulkInserter:
+    """Buffer new model instances and insert them in chunks with *insert_many*.
+
+    The related (child) instances get inserted after their parent, once the parent
+    has an ID, eg:
+
+        with BulkInserter() as inserter:
+            for row in rows:
+                inserter.add(FundingRecord(...), ExternalId(...), FundingInvitee(...))
+
+    The model *save* hooks are not invoked. The instances must be validated before
+    they are added.
+    """
+
+    def __init__(self, chunk_size=None):
+        """Set up the inserter.
+
+        Args:
+            chunk_size (int): the number of the (parent) instances inserted in a batch.
+
+        """
+        self.chunk_size = chunk_size or app.config.get("BULK_INSERT_CHUNK_SIZE") or 500
+        self.entries = []
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, instance, *children):
+        """Add a new instance with its related instances."""
+        self.entries.append((instance, children))
+        if len(self.entries) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Insert all the buffered instances."""
+        entries, self.entries = self.entries, []
+        if not entries:
+            return
+        self.insert([parent for parent, _ in entries])
+        related = []
+        for parent, children in entries:
+            for child in children:
+                for field, model in child._meta.refs.items():
+                    if isinstance(parent, model):
+                        setattr(child, field.name, parent.id)
+                related.append(child)
+        self.insert(related)
+        self.count += len(entries)
+        job = get_current_job()
+        if job:
+            # report the progress of the upload loading job:
+            job.meta["rows_parsed"] = self.count
+            job.save_meta()
+
+    @staticmethod
+    def insert(instances):
+        """Insert the instances and set their IDs."""
+        for (model, _), group in groupby(instances, key=lambda i: (type(i), tuple(i.__data__))):
+            group = list(group)
+            query = model.insert_many([i.__data__ for i in group])
+            if model._meta.database.returning_clause:
+                ids = [r[0] for r in query.returning(model._meta.primary_key).tuples().execute()]
+            else:
+                # SQLite assigns consecutive row IDs to the rows inserted with a single statement:
+                last_id = query.execute()
+                ids = range(last_id - len(group) + 1, last_id + 1)
+            for instance, id in zip(group, ids):
+                instance.id = id
+                instance._dirty.clear()
+
+
 class RecordModel(BaseModel):
     """Common model bits of the task records."""
 
@@ -1666,6 +2015,57 @@ class RecordModel(BaseModel):
         if hasattr(self, "invitees"):
             return self.invitees.model
 
+    @classmethod
+    def prefetch_related(cls, records):
+        """Load the related rows of the records in bulk.
+
+        The invitees, contributors and external IDs get read with a single query per related
+        model and replace the back-reference queries of the records. The tasks (and their
+        organisations) of the records that don't have them loaded yet get read with a single query.
+
+        Args:
+            records: the list (or a query) of the records.
+
+        Returns:
+            list: the records with the related rows attached.
+
+        """
+        records = list(records)
+        if not records:
+            return records
+        ids = [r.id for r in records]
+        for fk in cls._meta.backrefs:
+            if fk.backref not in ["invitees", "contributors", "external_ids"]:
+                continue
+            related = {r.id: [] for r in records}
+            for rr in fk.model.select().where(fk.in_(ids)).order_by(fk.model.id):
+                related[rr.__data__[fk.name]].append(rr)
+            for r in records:
+                for rr in related[r.id]:
+                    setattr(rr, fk.name, r)
+                setattr(r, fk.backref, related[r.id])
+        task_ids = hasattr(cls, "task") and {r.task_id for r in records if "task" not in r.__rel__}
+        if task_ids:
+            tasks = {
+                t.id: t
+                for t in Task.select(Task, Organisation)
+                .join(Organisation, on=Task.org)
+                .where(Task.id.in_(task_ids))
+            }
+            for r in records:
+                if "task" not in r.__rel__:
+                    r.task = tasks[r.task_id]
+        return records
+
+    @classmethod
+    def to_export_dicts(cls, records):
+        """Map the records to dicts for export into JSON/YAML in bulk.
+
+        The output is the same as of *to_export_dict* for each of the records, but the related
+        rows get loaded with a single query per related model (see *prefetch_related*).
+        """
+        return [r.to_export_dict() for r in cls.prefetch_related(records)]
+
     def to_export_dict(self):
         """Map the common record parts to dict for export into JSON/YAML."""
         org = self.task.org
@@ -1775,7 +2175,7 @@ class GroupIdRecord(RecordModel):
         table_alias = "gid"
 
 
-class AffiliationRecord(RecordModel):
+class AffiliationRecord(RecordModel, ClaimableModel):
     """Affiliation record loaded from CSV file for batch processing."""
 
     is_active = BooleanField(
@@ -1867,9 +2267,10 @@ class AffiliationRecord(RecordModel):
             jsonschema.validate(data, schemas.affiliation_task)
         if not task and task_id:
             task = Task.select().where(Task.id == task_id).first()
-        if not task and "id" in data:
+        # the task created for an upload gets replaced with the task the upload was exported from:
+        if (not task or task.loading_state == "LOADING") and "id" in data:
             task_id = int(data["id"])
-            task = Task.select().where(Task.id == task_id).first()
+            task = Task.select().where(Task.id == task_id).first() or task
         with db.atomic() as transaction:
             try:
                 if not task:
@@ -1931,8 +2332,37 @@ class AffiliationRecord(RecordModel):
                 raise
         return task
 
+    _csv_header_map = HeaderMap(
+        r"first\s*(name)?",
+        r"last\s*(name)?",
+        "email",
+        "organisation|^name",
+        "campus|department",
+        "city",
+        "state|region",
+        "course|title|role",
+        r"start\s*(date)?",
+        r"end\s*(date)?",
+        r"affiliation(s)?\s*(type)?|student|staff",
+        "country",
+        r"disambiguat.*id",
+        r"disambiguat.*source",
+        r"put|code",
+        "orcid.*",
+        "local.*|.*identifier",
+        "delete(.*record)?",
+        r"(is)?\s*visib(bility|le)?",
+        r"url",
+        r"(display)?.*index",
+        r"(external)?\s*id(entifier)?\s+type$",
+        r"(external)?\s*id(entifier)?\s*(value)?$",
+        r"(external)?\s*id(entifier)?\s*url",
+        r"(external)?\s*id(entifier)?\s*rel(ationship)?",
+        r"(is)?\s*active$",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None):
         """Load affiliation record data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source, newline="")
@@ -1958,67 +2388,17 @@ class AffiliationRecord(RecordModel):
                 f"Read header: {header}"
             )
 
-        header_rexs = [
-            re.compile(ex, re.I)
-            for ex in [
-                r"first\s*(name)?",
-                r"last\s*(name)?",
-                "email",
-                "organisation|^name",
-                "campus|department",
-                "city",
-                "state|region",
-                "course|title|role",
-                r"start\s*(date)?",
-                r"end\s*(date)?",
-                r"affiliation(s)?\s*(type)?|student|staff",
-                "country",
-                r"disambiguat.*id",
-                r"disambiguat.*source",
-                r"put|code",
-                "orcid.*",
-                "local.*|.*identifier",
-                "delete(.*record)?",
-                r"(is)?\s*visib(bility|le)?",
-                r"url",
-                r"(display)?.*index",
-                r"(external)?\s*id(entifier)?\s+type$",
-                r"(external)?\s*id(entifier)?\s*(value)?$",
-                r"(external)?\s*id(entifier)?\s*url",
-                r"(external)?\s*id(entifier)?\s*rel(ationship)?",
-                r"(is)?\s*active$",
-            ]
-        ]
-
-        def index(rex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if column and rex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        idxs = [index(rex) for rex in header_rexs]
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-                return default if v == "" else v
-
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.AFFILIATION)
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.AFFILIATION)
                 is_enqueue = False
+                inserter = BulkInserter()
                 for row_no, row in enumerate(reader):
                     # skip empty lines:
                     if len([item for item in row if item and item.strip()]) == 0:
@@ -2054,7 +2434,7 @@ class AffiliationRecord(RecordModel):
                     country = val(row, 11)
                     if country:
                         try:
-                            country = countries.lookup(country).alpha_2
+                            country = country_code(country)
                         except Exception:
                             raise ModelExceptionError(
                                 f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
@@ -2072,9 +2452,7 @@ class AffiliationRecord(RecordModel):
                             f"Invalid email address '{email}'  in the row #{row_no+2}: {row}"
                         )
 
-                    affiliation_type = val(row, 10)
-                    if affiliation_type:
-                        affiliation_type = affiliation_type.replace("_", "-").lower()
+                    affiliation_type = normalize_code(val(row, 10))
                     if not delete_record and (
                         not affiliation_type or affiliation_type.lower() not in AFFILIATION_TYPES
                     ):
@@ -2094,11 +2472,9 @@ class AffiliationRecord(RecordModel):
                     disambiguation_source = val(row, 13)
                     if disambiguation_source:
                         disambiguation_source = disambiguation_source.upper()
-                    visibility = val(row, 18)
-                    if visibility:
-                        visibility = visibility.replace("_", "-").lower()
+                    visibility = normalize_code(val(row, 18))
 
-                    is_active = val(row, 25, "").lower() in ["y", "yes", "1", "true"]
+                    is_active = is_yes(val(row, 25))
                     if is_active:
                         is_enqueue = is_active
 
@@ -2130,8 +2506,8 @@ class AffiliationRecord(RecordModel):
                     validator = ModelValidator(af)
                     if not validator.validate():
                         raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                    af.save()
 
+                    external_ids = []
                     external_id_type = val(row, 21, "").lower()
                     external_id_relationship = val(row, 24)
                     if external_id_relationship:
@@ -2151,9 +2527,13 @@ class AffiliationRecord(RecordModel):
                         )
 
                         validator = ModelValidator(ae)
-                        if not validator.validate():
+                        # the record gets linked when it's inserted:
+                        if not validator.validate(exclude=["record"]):
                             raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                        ae.save()
+                        external_ids.append(ae)
+
+                    inserter.add(af, *external_ids)
+                inserter.flush()
                 if is_enqueue:
                     from .utils import enqueue_task_records
 
@@ -2203,8 +2583,40 @@ class FundingRecord(RecordModel):
         d["amount"] = {"currency-code": self.currency, "value": self.amount}
         return d
 
+    _csv_header_map = HeaderMap(
+        "title$",
+        r"translated\s+(title)?",
+        r"translat(ed)?(ion)?\s+(title)?\s*lang(uage)?.*(code)?",
+        "type$",
+        r"org(ani[sz]ation)?\s*(defined)?\s*type",
+        r"(short\s*|description\s*)+$",
+        "amount",
+        "currency",
+        r"start\s*(date)?",
+        r"end\s*(date)?",
+        r"(org(gani[zs]ation)?)?\s*name$",
+        "city",
+        "region|state",
+        "country",
+        r"disambiguated\s*(org(ani[zs]ation)?)?\s*id(entifier)?",
+        r"disambiguation\s+source$",
+        r"(is)?\s*active$",
+        r"orcid\s*(id)?$",
+        "email",
+        r"(external)?\s*id(entifier)?\s+type$",
+        r"((external)?\s*id(entifier)?\s+value|funding.*id)$",
+        r"(external)?\s*id(entifier)?\s*url",
+        r"(external)?\s*id(entifier)?\s*rel(ationship)?",
+        "put.*code",
+        r"(is)?\s*visib(bility|le)?",
+        r"first\s*(name)?",
+        r"(last|sur)\s*(name)?",
+        "local.*|.*identifier",
+        r"url",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None):
         """Load data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source, newline="")
@@ -2221,158 +2633,103 @@ class FundingRecord(RecordModel):
         if len(header) < 2:
             raise ModelExceptionError("Expected CSV or TSV format file.")
 
-        header_rexs = [
-            re.compile(ex, re.I)
-            for ex in [
-                "title$",
-                r"translated\s+(title)?",
-                r"translat(ed)?(ion)?\s+(title)?\s*lang(uage)?.*(code)?",
-                "type$",
-                r"org(ani[sz]ation)?\s*(defined)?\s*type",
-                r"(short\s*|description\s*)+$",
-                "amount",
-                "currency",
-                r"start\s*(date)?",
-                r"end\s*(date)?",
-                r"(org(gani[zs]ation)?)?\s*name$",
-                "city",
-                "region|state",
-                "country",
-                r"disambiguated\s*(org(ani[zs]ation)?)?\s*id(entifier)?",
-                r"disambiguation\s+source$",
-                r"(is)?\s*active$",
-                r"orcid\s*(id)?$",
-                "email",
-                r"(external)?\s*id(entifier)?\s+type$",
-                r"((external)?\s*id(entifier)?\s+value|funding.*id)$",
-                r"(external)?\s*id(entifier)?\s*url",
-                r"(external)?\s*id(entifier)?\s*rel(ationship)?",
-                "put.*code",
-                r"(is)?\s*visib(bility|le)?",
-                r"first\s*(name)?",
-                r"(last|sur)\s*(name)?",
-                "local.*|.*identifier",
-                r"url",
-            ]
-        ]
-
-        def index(rex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if rex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        idxs = [index(rex) for rex in header_rexs]
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if len(idxs) <= i or idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-            return default if v == "" else v
-
-        rows = []
-        cached_row = []
         is_enqueue = False
-        for row_no, row in enumerate(reader):
-            # skip empty lines:
-            if len([item for item in row if item and item.strip()]) == 0:
-                continue
-            if len(row) == 1 and row[0].strip() == "":
-                continue
 
-            orcid, email = val(row, 17), normalize_email(val(row, 18, ""))
-            orcid = validate_orcid_id(orcid)
-            if email and not validators.email(email):
-                raise ValueError(f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
-
-            visibility = val(row, 24)
-            if visibility:
-                visibility = visibility.replace("_", "-").lower()
-
-            invitee = dict(
-                identifier=val(row, 27),
-                email=email,
-                first_name=val(row, 25),
-                last_name=val(row, 26),
-                orcid=orcid,
-                put_code=val(row, 23),
-                visibility=visibility,
-            )
+        def parse_rows():
+            """Parse and validate the rows and yield them one by one."""
+            nonlocal is_enqueue
+            cached_row = []
+            for row_no, row in enumerate(reader):
+                # skip empty lines:
+                if len([item for item in row if item and item.strip()]) == 0:
+                    continue
+                if len(row) == 1 and row[0].strip() == "":
+                    continue
+
+                orcid, email = val(row, 17), normalize_email(val(row, 18, ""))
+                orcid = validate_orcid_id(orcid)
+                if email and not validators.email(email):
+                    raise ValueError(f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
+
+                visibility = normalize_code(val(row, 24))
+
+                invitee = dict(
+                    identifier=val(row, 27),
+                    email=email,
+                    first_name=val(row, 25),
+                    last_name=val(row, 26),
+                    orcid=orcid,
+                    put_code=val(row, 23),
+                    visibility=visibility,
+                )
 
-            title = val(row, 0)
-            external_id_type = val(row, 19, "").lower()
-            external_id_value = val(row, 20)
-            external_id_relationship = val(row, 22, "").replace("_", "-").lower()
+                title = val(row, 0)
+                external_id_type = val(row, 19, "").lower()
+                external_id_value = val(row, 20)
+                external_id_relationship = normalize_code(val(row, 22, ""))
 
-            if external_id_type not in EXTERNAL_ID_TYPES:
-                raise ModelExceptionError(
-                    f"Invalid External Id Type: '{external_id_type}', Use 'doi', 'issn' "
-                    f"or one of the accepted types found here: https://pub.orcid.org/v3.0/identifiers"
-                )
+                if external_id_type not in EXTERNAL_ID_TYPES:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Type: '{external_id_type}', Use 'doi', 'issn' "
+                        f"or one of the accepted types found here: https://pub.orcid.org/v3.0/identifiers"
+                    )
 
-            if not external_id_value:
-                raise ModelExceptionError(
-                    f"Invalid External Id Value or Funding Id: {external_id_value}, #{row_no+2}: {row}."
-                )
+                if not external_id_value:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Value or Funding Id: {external_id_value}, #{row_no+2}: {row}."
+                    )
 
-            if not title:
-                raise ModelExceptionError(
-                    f"Title is mandatory, #{row_no+2}: {row}. Header: {header}"
-                )
+                if not title:
+                    raise ModelExceptionError(
+                        f"Title is mandatory, #{row_no+2}: {row}. Header: {header}"
+                    )
 
-            if external_id_relationship not in RELATIONSHIPS:
-                raise ModelExceptionError(
-                    f"Invalid External Id Relationship '{external_id_relationship}' as it is not one of the "
-                    f"{RELATIONSHIPS}, #{row_no+2}: {row}."
-                )
+                if external_id_relationship not in RELATIONSHIPS:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Relationship '{external_id_relationship}' as it is not one of the "
+                        f"{RELATIONSHIPS}, #{row_no+2}: {row}."
+                    )
 
-            if (
-                cached_row
-                and title.lower() == val(cached_row, 0).lower()
-                and external_id_type.lower() == val(cached_row, 19).lower()
-                and external_id_value.lower() == val(cached_row, 20).lower()
-                and external_id_relationship.lower() == val(cached_row, 22).lower()
-            ):
-                row = cached_row
-            else:
-                cached_row = row
+                if (
+                    cached_row
+                    and title.lower() == val(cached_row, 0).lower()
+                    and external_id_type.lower() == val(cached_row, 19).lower()
+                    and external_id_value.lower() == val(cached_row, 20).lower()
+                    and external_id_relationship.lower() == val(cached_row, 22).lower()
+                ):
+                    row = cached_row
+                else:
+                    cached_row = row
 
-            is_active = val(row, 16, "").lower() in ["y", "yes", "1", "true"]
-            if is_active:
-                is_enqueue = is_active
+                is_active = is_yes(val(row, 16))
+                if is_active:
+                    is_enqueue = is_active
 
-            funding_type = val(row, 3)
-            if not funding_type:
-                raise ModelExceptionError(
-                    f"Funding type is mandatory, #{row_no+2}: {row}. Header: {header}"
-                )
-            else:
-                funding_type = funding_type.replace("_", "-").lower()
-
-            # The uploaded country must be from ISO 3166-1 alpha-2
-            country = val(row, 13)
-            if country:
-                try:
-                    country = countries.lookup(country).alpha_2
-                except Exception:
+                funding_type = val(row, 3)
+                if not funding_type:
                     raise ModelExceptionError(
-                        f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
-                        f"#{row_no+2}: {row}. Header: {header}"
+                        f"Funding type is mandatory, #{row_no+2}: {row}. Header: {header}"
                     )
+                else:
+                    funding_type = funding_type.replace("_", "-").lower()
+
+                # The uploaded country must be from ISO 3166-1 alpha-2
+                country = val(row, 13)
+                if country:
+                    try:
+                        country = country_code(country)
+                    except Exception:
+                        raise ModelExceptionError(
+                            f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
+                            f"#{row_no+2}: {row}. Header: {header}"
+                        )
 
-            rows.append(
-                dict(
+                yield dict(
                     funding=dict(
                         title=title,
                         translated_title=val(row, 1),
@@ -2402,38 +2759,42 @@ class FundingRecord(RecordModel):
                         relationship=external_id_relationship,
                     ),
                 )
-            )
 
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.FUNDING)
-                for funding, records in groupby(rows, key=lambda row: row["funding"].items()):
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.FUNDING)
+                inserter = BulkInserter()
+                for funding, records in groupby(parse_rows(), key=lambda row: row["funding"].items()):
                     records = list(records)
 
                     fr = cls(task=task, **dict(funding))
                     validator = ModelValidator(fr)
                     if not validator.validate():
                         raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                    fr.save()
 
+                    related = []
                     for external_id in set(
                         tuple(r["external_id"].items())
                         for r in records
                         if r["external_id"]["type"] and r["external_id"]["value"]
                     ):
-                        ei = ExternalId(record=fr, **dict(external_id))
-                        ei.save()
+                        related.append(ExternalId(record=fr, **dict(external_id)))
 
                     for invitee in set(
                         tuple(r["invitee"].items()) for r in records if r["invitee"]["email"]
                     ):
                         rec = FundingInvitee(record=fr, **dict(invitee))
                         validator = ModelValidator(rec)
-                        if not validator.validate():
+                        # the record gets linked when it's inserted:
+                        if not validator.validate(exclude=["record"]):
                             raise ModelExceptionError(
                                 f"Invalid invitee record: {validator.errors}"
                             )
-                        rec.save()
+                        related.append(rec)
+
+                    inserter.add(fr, *related)
+                inserter.flush()
                 if is_enqueue:
                     from .utils import enqueue_task_records
 
@@ -2745,8 +3106,45 @@ class PeerReviewRecord(RecordModel):
             return "review-identifiers"
         return name
 
+    _csv_header_map = HeaderMap(
+        r"review\s*group\s*id(entifier)?$",
+        r"(reviewer)?\s*role$",
+        r"review\s*url$",
+        r"review\s*type$",
+        r"(review\s*completion)?.*date",
+        r"subject\s+external\s*id(entifier)?\s+type$",
+        r"subject\s+external\s*id(entifier)?\s+value$",
+        r"subject\s+external\s*id(entifier)?\s+url$",
+        r"subject\s+external\s*id(entifier)?\s+rel(ationship)?$",
+        r"subject\s+container\s+name$",
+        r"(subject)?\s*type$",
+        r"(subject)?\s*(name)?\s*title$",
+        r"(subject)?\s*(name)?\s*subtitle$",
+        r"(subject)?\s*(name)?\s*(translated)?\s*(title)?\s*lang(uage)?.*(code)?",
+        r"(subject)?\s*(name)?\s*translated\s*title$",
+        r"(subject)?\s*url$",
+        r"(convening)?\s*org(ani[zs]ation)?\s*name$",
+        r"(convening)?\s*org(ani[zs]ation)?\s*city",
+        r"(convening)?\s*org(ani[zs]ation)?\s*region$",
+        r"(convening)?\s*org(ani[zs]ation)?\s*country$",
+        r"(convening)?\s*(org(ani[zs]ation)?)?\s*disambiguated\s*id(entifier)?",
+        r"(convening)?\s*(org(ani[zs]ation)?)?\s*disambiguation\s*source$",
+        "email",
+        r"orcid\s*(id)?$",
+        "local.*|identifier",
+        r"first\s*(name)?",
+        r"(last|sur)\s*(name)?",
+        "put.*code",
+        r"(is)?\s*visib(ility|le)?",
+        r"(external)?\s*id(entifier)?\s+type$",
+        r"((external)?\s*id(entifier)?\s+value|peer\s*review.*id)$",
+        r"(external)?\s*id(entifier)?\s*url",
+        r"(external)?\s*id(entifier)?\s*rel(ationship)?",
+        r"(is)?\s*active$",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None):
         """Load data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source, newline="")
@@ -2763,177 +3161,117 @@ class PeerReviewRecord(RecordModel):
         if len(header) < 2:
             raise ModelExceptionError("Expected CSV or TSV format file.")
 
-        header_rexs = [
-            re.compile(ex, re.I)
-            for ex in [
-                r"review\s*group\s*id(entifier)?$",
-                r"(reviewer)?\s*role$",
-                r"review\s*url$",
-                r"review\s*type$",
-                r"(review\s*completion)?.*date",
-                r"subject\s+external\s*id(entifier)?\s+type$",
-                r"subject\s+external\s*id(entifier)?\s+value$",
-                r"subject\s+external\s*id(entifier)?\s+url$",
-                r"subject\s+external\s*id(entifier)?\s+rel(ationship)?$",
-                r"subject\s+container\s+name$",
-                r"(subject)?\s*type$",
-                r"(subject)?\s*(name)?\s*title$",
-                r"(subject)?\s*(name)?\s*subtitle$",
-                r"(subject)?\s*(name)?\s*(translated)?\s*(title)?\s*lang(uage)?.*(code)?",
-                r"(subject)?\s*(name)?\s*translated\s*title$",
-                r"(subject)?\s*url$",
-                r"(convening)?\s*org(ani[zs]ation)?\s*name$",
-                r"(convening)?\s*org(ani[zs]ation)?\s*city",
-                r"(convening)?\s*org(ani[zs]ation)?\s*region$",
-                r"(convening)?\s*org(ani[zs]ation)?\s*country$",
-                r"(convening)?\s*(org(ani[zs]ation)?)?\s*disambiguated\s*id(entifier)?",
-                r"(convening)?\s*(org(ani[zs]ation)?)?\s*disambiguation\s*source$",
-                "email",
-                r"orcid\s*(id)?$",
-                "local.*|identifier",
-                r"first\s*(name)?",
-                r"(last|sur)\s*(name)?",
-                "put.*code",
-                r"(is)?\s*visib(ility|le)?",
-                r"(external)?\s*id(entifier)?\s+type$",
-                r"((external)?\s*id(entifier)?\s+value|peer\s*review.*id)$",
-                r"(external)?\s*id(entifier)?\s*url",
-                r"(external)?\s*id(entifier)?\s*rel(ationship)?",
-                r"(is)?\s*active$",
-            ]
-        ]
-
-        def index(rex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if rex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        idxs = [index(rex) for rex in header_rexs]
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if len(idxs) <= i or idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-            return default if v == "" else v
-
-        rows = []
-        cached_row = []
         is_enqueue = False
-        for row_no, row in enumerate(reader):
-            # skip empty lines:
-            if len([item for item in row if item and item.strip()]) == 0:
-                continue
-            if len(row) == 1 and row[0].strip() == "":
-                continue
-
-            orcid, email = val(row, 23), normalize_email(val(row, 22, ""))
-            orcid = validate_orcid_id(orcid)
-            if email and not validators.email(email):
-                raise ValueError(f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
-
-            visibility = val(row, 28)
-            if visibility:
-                visibility = visibility.replace("_", "-").lower()
-
-            invitee = dict(
-                email=email,
-                orcid=orcid,
-                identifier=val(row, 24),
-                first_name=val(row, 25),
-                last_name=val(row, 26),
-                put_code=val(row, 27),
-                visibility=visibility,
-            )
 
-            review_group_id = val(row, 0)
-            if not review_group_id:
-                raise ModelExceptionError(
-                    f"Review Group ID is mandatory, #{row_no+2}: {row}. Header: {header}"
+        def parse_rows():
+            """Parse and validate the rows and yield them one by one."""
+            nonlocal is_enqueue
+            cached_row = []
+            for row_no, row in enumerate(reader):
+                # skip empty lines:
+                if len([item for item in row if item and item.strip()]) == 0:
+                    continue
+                if len(row) == 1 and row[0].strip() == "":
+                    continue
+
+                orcid, email = val(row, 23), normalize_email(val(row, 22, ""))
+                orcid = validate_orcid_id(orcid)
+                if email and not validators.email(email):
+                    raise ValueError(f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
+
+                visibility = normalize_code(val(row, 28))
+
+                invitee = dict(
+                    email=email,
+                    orcid=orcid,
+                    identifier=val(row, 24),
+                    first_name=val(row, 25),
+                    last_name=val(row, 26),
+                    put_code=val(row, 27),
+                    visibility=visibility,
                 )
 
-            external_id_type = val(row, 29, "").lower()
-            external_id_value = val(row, 30)
-            external_id_relationship = val(row, 32)
-
-            if external_id_relationship:
-                external_id_relationship = external_id_relationship.replace("_", "-").lower()
-
-                if external_id_relationship not in RELATIONSHIPS:
+                review_group_id = val(row, 0)
+                if not review_group_id:
                     raise ModelExceptionError(
-                        f"Invalid External Id Relationship '{external_id_relationship}' as it is not one of the "
-                        f"{RELATIONSHIPS}, #{row_no+2}: {row}."
+                        f"Review Group ID is mandatory, #{row_no+2}: {row}. Header: {header}"
                     )
 
-            if external_id_type not in EXTERNAL_ID_TYPES:
-                raise ModelExceptionError(
-                    f"Invalid External Id Type: '{external_id_type}', Use 'doi', 'issn' "
-                    f"or one of the accepted types found here: https://pub.orcid.org/v3.0/identifiers"
-                )
+                external_id_type = val(row, 29, "").lower()
+                external_id_value = val(row, 30)
+                external_id_relationship = val(row, 32)
 
-            if not external_id_value:
-                raise ModelExceptionError(
-                    f"Invalid External Id Value or Peer Review Id: {external_id_value}, #{row_no+2}: {row}."
-                )
+                if external_id_relationship:
+                    external_id_relationship = external_id_relationship.replace("_", "-").lower()
 
-            if (
-                cached_row
-                and review_group_id.lower() == val(cached_row, 0).lower()
-                and external_id_type.lower() == val(cached_row, 29).lower()
-                and external_id_value.lower() == val(cached_row, 30).lower()
-                and external_id_relationship.lower() == val(cached_row, 32).lower()
-            ):
-                row = cached_row
-            else:
-                cached_row = row
+                    if external_id_relationship not in RELATIONSHIPS:
+                        raise ModelExceptionError(
+                            f"Invalid External Id Relationship '{external_id_relationship}' as it is not one of the "
+                            f"{RELATIONSHIPS}, #{row_no+2}: {row}."
+                        )
 
-            is_active = val(row, 33, "").lower() in ["y", "yes", "1", "true"]
-            if is_active:
-                is_enqueue = is_active
+                if external_id_type not in EXTERNAL_ID_TYPES:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Type: '{external_id_type}', Use 'doi', 'issn' "
+                        f"or one of the accepted types found here: https://pub.orcid.org/v3.0/identifiers"
+                    )
 
-            convening_org_name = val(row, 16)
-            convening_org_city = val(row, 17)
-            convening_org_country = val(row, 19)
+                if not external_id_value:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Value or Peer Review Id: {external_id_value}, #{row_no+2}: {row}."
+                    )
 
-            if not (convening_org_name and convening_org_city and convening_org_country):
-                raise ModelExceptionError(
-                    f"Information about Convening Organisation (Name, City and Country) is mandatory, "
-                    f"#{row_no+2}: {row}. Header: {header}"
-                )
+                if (
+                    cached_row
+                    and review_group_id.lower() == val(cached_row, 0).lower()
+                    and external_id_type.lower() == val(cached_row, 29).lower()
+                    and external_id_value.lower() == val(cached_row, 30).lower()
+                    and external_id_relationship.lower() == val(cached_row, 32).lower()
+                ):
+                    row = cached_row
+                else:
+                    cached_row = row
+
+                is_active = is_yes(val(row, 33))
+                if is_active:
+                    is_enqueue = is_active
 
-            # The uploaded country must be from ISO 3166-1 alpha-2
-            if convening_org_country:
-                try:
-                    convening_org_country = countries.lookup(convening_org_country).alpha_2
-                except Exception:
+                convening_org_name = val(row, 16)
+                convening_org_city = val(row, 17)
+                convening_org_country = val(row, 19)
+
+                if not (convening_org_name and convening_org_city and convening_org_country):
                     raise ModelExceptionError(
-                        f" (Convening Org Country must be 2 character from ISO 3166-1 alpha-2) in the row "
+                        f"Information about Convening Organisation (Name, City and Country) is mandatory, "
                         f"#{row_no+2}: {row}. Header: {header}"
                     )
 
-            reviewer_role = val(row, 1, "").replace("_", "-").lower() or None
-            review_type = val(row, 3, "").replace("_", "-").lower() or None
-            subject_type = val(row, 10, "").replace("_", "-").lower() or None
-            subject_external_id_relationship = val(row, 8, "").replace("_", "-").lower() or None
-            convening_org_disambiguation_source = val(row, 21, "").upper() or None
-            subject_external_id_type = val(row, 5, "").lower() or None
-            review_completion_date = val(row, 4) or None
-
-            if review_completion_date:
-                review_completion_date = PartialDate.create(review_completion_date)
-            rows.append(
-                dict(
+                # The uploaded country must be from ISO 3166-1 alpha-2
+                if convening_org_country:
+                    try:
+                        convening_org_country = country_code(convening_org_country)
+                    except Exception:
+                        raise ModelExceptionError(
+                            f" (Convening Org Country must be 2 character from ISO 3166-1 alpha-2) in the row "
+                            f"#{row_no+2}: {row}. Header: {header}"
+                        )
+
+                reviewer_role = normalize_code(val(row, 1))
+                review_type = normalize_code(val(row, 3))
+                subject_type = normalize_code(val(row, 10))
+                subject_external_id_relationship = normalize_code(val(row, 8))
+                convening_org_disambiguation_source = val(row, 21, "").upper() or None
+                subject_external_id_type = val(row, 5, "").lower() or None
+                review_completion_date = val(row, 4) or None
+
+                if review_completion_date:
+                    review_completion_date = PartialDate.create(review_completion_date)
+                yield dict(
                     peer_review=dict(
                         review_group_id=review_group_id,
                         reviewer_role=reviewer_role,
@@ -2967,13 +3305,14 @@ class PeerReviewRecord(RecordModel):
                         relationship=external_id_relationship,
                     ),
                 )
-            )
 
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.PEER_REVIEW)
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.PEER_REVIEW)
+                inserter = BulkInserter()
                 for peer_review, records in groupby(
-                    rows, key=lambda row: row["peer_review"].items()
+                    parse_rows(), key=lambda row: row["peer_review"].items()
                 ):
                     records = list(records)
 
@@ -2981,26 +3320,29 @@ class PeerReviewRecord(RecordModel):
                     validator = ModelValidator(prr)
                     if not validator.validate():
                         raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                    prr.save()
 
+                    related = []
                     for external_id in set(
                         tuple(r["external_id"].items())
                         for r in records
                         if r["external_id"]["type"] and r["external_id"]["value"]
                     ):
-                        ei = PeerReviewExternalId(record=prr, **dict(external_id))
-                        ei.save()
+                        related.append(PeerReviewExternalId(record=prr, **dict(external_id)))
 
                     for invitee in set(
                         tuple(r["invitee"].items()) for r in records if r["invitee"]["email"]
                     ):
                         rec = PeerReviewInvitee(record=prr, **dict(invitee))
                         validator = ModelValidator(rec)
-                        if not validator.validate():
+                        # the record gets linked when it's inserted:
+                        if not validator.validate(exclude=["record"]):
                             raise ModelExceptionError(
                                 f"Invalid invitee record: {validator.errors}"
                             )
-                        rec.save()
+                        related.append(rec)
+
+                    inserter.add(prr, *related)
+                inserter.flush()
                 if is_enqueue:
                     from .utils import enqueue_task_records
 
@@ -3282,7 +3624,7 @@ class PeerReviewRecord(RecordModel):
         table_alias = "pr"
 
 
-class PropertyRecord(RecordModel):
+class PropertyRecord(RecordModel, ClaimableModel):
     """Researcher Url record loaded from Json file for batch processing."""
 
     task = ForeignKeyField(Task, backref="property_records", on_delete="CASCADE")
@@ -3308,8 +3650,22 @@ class PropertyRecord(RecordModel):
     processed_at = DateTimeField(null=True)
     status = TextField(null=True, help_text="Record processing status.")
 
+    _csv_header_map = HeaderMap(
+        r"(url)?.*name",
+        r".*value|.*content|.*country",
+        r"(display)?.*index",
+        "email",
+        r"first\s*(name)?",
+        r"(last|sur)\s*(name)?",
+        "orcid.*",
+        r"put|code",
+        r"(is)?\s*visib(bility|le)?",
+        "(propery)?.*type",
+        r"(is)?\s*active$",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None, file_property_type=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None, file_property_type=None):
         """Load data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source, newline="")
@@ -3336,52 +3692,17 @@ class PropertyRecord(RecordModel):
                 f"and property type. Read header: {header}"
             )
 
-        header_rexs = [
-            re.compile(ex, re.I)
-            for ex in [
-                r"(url)?.*name",
-                r".*value|.*content|.*country",
-                r"(display)?.*index",
-                "email",
-                r"first\s*(name)?",
-                r"(last|sur)\s*(name)?",
-                "orcid.*",
-                r"put|code",
-                r"(is)?\s*visib(bility|le)?",
-                "(propery)?.*type",
-                r"(is)?\s*active$",
-            ]
-        ]
-
-        def index(rex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if rex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        idxs = [index(rex) for rex in header_rexs]
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if len(idxs) <= i or idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-            return default if v == "" else v
-
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.PROPERTY)
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.PROPERTY)
                 is_enqueue = False
+                inserter = BulkInserter()
                 for row_no, row in enumerate(reader):
                     # skip empty lines:
                     if len([item for item in row if item and item.strip()]) == 0:
@@ -3407,7 +3728,7 @@ class PropertyRecord(RecordModel):
                     first_name = val(row, 4)
                     last_name = val(row, 5)
                     property_type = val(row, 9) or file_property_type
-                    is_active = val(row, 10, "").lower() in ["y", "yes", "1", "true"]
+                    is_active = is_yes(val(row, 10))
                     if is_active:
                         is_enqueue = is_active
 
@@ -3430,7 +3751,7 @@ class PropertyRecord(RecordModel):
                         # The uploaded country must be from ISO 3166-1 alpha-2
                         if value:
                             try:
-                                value = countries.lookup(value).alpha_2
+                                value = country_code(value)
                             except Exception:
                                 raise ModelExceptionError(
                                     f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
@@ -3443,9 +3764,7 @@ class PropertyRecord(RecordModel):
                             f"email address or another unique identifier): {row}"
                         )
 
-                    visibility = val(row, 8)
-                    if visibility:
-                        visibility = visibility.replace("_", "-").lower()
+                    visibility = normalize_code(val(row, 8))
                     rr = cls(
                         task=task,
                         type=property_type,
@@ -3463,7 +3782,8 @@ class PropertyRecord(RecordModel):
                     validator = ModelValidator(rr)
                     if not validator.validate():
                         raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                    rr.save()
+                    inserter.add(rr)
+                inserter.flush()
                 if is_enqueue:
                     from .utils import enqueue_task_records
 
@@ -3558,7 +3878,7 @@ class PropertyRecord(RecordModel):
                         # The uploaded country must be from ISO 3166-1 alpha-2
                         if value:
                             try:
-                                value = countries.lookup(value).alpha_2
+                                value = country_code(value)
                             except Exception:
                                 raise ModelExceptionError(
                                     f"(Country {value} must be 2 character from ISO 3166-1 alpha-2): {r}."
@@ -3627,8 +3947,37 @@ class WorkRecord(RecordModel):
     processed_at = DateTimeField(null=True)
     status = TextField(null=True, help_text="Record processing status.")
 
+    _csv_header_map = HeaderMap(
+        "title$",
+        r"sub.*(title)?$",
+        r"translated\s+(title)?",
+        r"translat(ed)?(ion)?\s+(title)?\s*lang(uage)?.*(code)?",
+        r"journal",
+        "type$",
+        r"(short\s*|description\s*)+$",
+        r"citat(ion)?.*type",
+        r"citat(ion)?.*value",
+        r"(publication)?.*date",
+        r"(publ(ication?))?.*media.*(type)?",
+        r"url",
+        r"lang(uage)?.*(code)?",
+        r"country",
+        r"(is)?\s*active$",
+        r"orcid\s*(id)?$",
+        "email",
+        r"(external)?\s*id(entifier)?\s+type$",
+        r"((external)?\s*id(entifier)?\s+value|work.*id)$",
+        r"(external)?\s*id(entifier)?\s*url",
+        r"(external)?\s*id(entifier)?\s*rel(ationship)?",
+        "put.*code",
+        r"(is)?\s*visib(bility|le)?",
+        r"first\s*(name)?",
+        r"(last|sur)\s*(name)?",
+        "local.*|.*identifier",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None):
         """Load data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source, newline="")
@@ -3645,161 +3994,107 @@ class WorkRecord(RecordModel):
         if len(header) < 2:
             raise ModelExceptionError("Expected CSV or TSV format file.")
 
-        header_rexs = [
-            re.compile(ex, re.I)
-            for ex in [
-                "title$",
-                r"sub.*(title)?$",
-                r"translated\s+(title)?",
-                r"translat(ed)?(ion)?\s+(title)?\s*lang(uage)?.*(code)?",
-                r"journal",
-                "type$",
-                r"(short\s*|description\s*)+$",
-                r"citat(ion)?.*type",
-                r"citat(ion)?.*value",
-                r"(publication)?.*date",
-                r"(publ(ication?))?.*media.*(type)?",
-                r"url",
-                r"lang(uage)?.*(code)?",
-                r"country",
-                r"(is)?\s*active$",
-                r"orcid\s*(id)?$",
-                "email",
-                r"(external)?\s*id(entifier)?\s+type$",
-                r"((external)?\s*id(entifier)?\s+value|work.*id)$",
-                r"(external)?\s*id(entifier)?\s*url",
-                r"(external)?\s*id(entifier)?\s*rel(ationship)?",
-                "put.*code",
-                r"(is)?\s*visib(bility|le)?",
-                r"first\s*(name)?",
-                r"(last|sur)\s*(name)?",
-                "local.*|.*identifier",
-            ]
-        ]
-
-        def index(rex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if rex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        idxs = [index(rex) for rex in header_rexs]
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if len(idxs) <= i or idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-            return default if v == "" else v
-
-        rows = []
-        cached_row = []
         is_enqueue = False
-        for row_no, row in enumerate(reader):
-            # skip empty lines:
-            if len([item for item in row if item and item.strip()]) == 0:
-                continue
-            if len(row) == 1 and row[0].strip() == "":
-                continue
-
-            orcid, email = val(row, 15), normalize_email(val(row, 16))
-            if orcid:
-                orcid = validate_orcid_id(orcid)
-            if email and not validators.email(email):
-                raise ValueError(f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
-
-            visibility = val(row, 22)
-            if visibility:
-                visibility = visibility.replace("_", "-").lower()
-
-            invitee = dict(
-                identifier=val(row, 25),
-                email=email,
-                first_name=val(row, 23),
-                last_name=val(row, 24),
-                orcid=orcid,
-                put_code=val(row, 21),
-                visibility=visibility,
-            )
 
-            title = val(row, 0)
-            external_id_type = val(row, 17, "").lower()
-            external_id_value = val(row, 18)
-            external_id_relationship = val(row, 20, "").replace("_", "-").lower()
-
-            if external_id_type not in EXTERNAL_ID_TYPES:
-                raise ModelExceptionError(
-                    f"Invalid External Id Type: '{external_id_type}', Use 'doi', 'issn' "
-                    f"or one of the accepted types found here: https://pub.orcid.org/v3.0/identifiers"
+        def parse_rows():
+            """Parse and validate the rows and yield them one by one."""
+            nonlocal is_enqueue
+            cached_row = []
+            for row_no, row in enumerate(reader):
+                # skip empty lines:
+                if len([item for item in row if item and item.strip()]) == 0:
+                    continue
+                if len(row) == 1 and row[0].strip() == "":
+                    continue
+
+                orcid, email = val(row, 15), normalize_email(val(row, 16))
+                if orcid:
+                    orcid = validate_orcid_id(orcid)
+                if email and not validators.email(email):
+                    raise ValueError(f"Invalid email address '{email}'  in the row #{row_no+2}: {row}")
+
+                visibility = normalize_code(val(row, 22))
+
+                invitee = dict(
+                    identifier=val(row, 25),
+                    email=email,
+                    first_name=val(row, 23),
+                    last_name=val(row, 24),
+                    orcid=orcid,
+                    put_code=val(row, 21),
+                    visibility=visibility,
                 )
 
-            if not external_id_value:
-                raise ModelExceptionError(
-                    f"Invalid External Id Value or Work Id: {external_id_value}, #{row_no+2}: {row}."
-                )
+                title = val(row, 0)
+                external_id_type = val(row, 17, "").lower()
+                external_id_value = val(row, 18)
+                external_id_relationship = normalize_code(val(row, 20, ""))
 
-            if not title:
-                raise ModelExceptionError(
-                    f"Title is mandatory, #{row_no+2}: {row}. Header: {header}"
-                )
+                if external_id_type not in EXTERNAL_ID_TYPES:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Type: '{external_id_type}', Use 'doi', 'issn' "
+                        f"or one of the accepted types found here: https://pub.orcid.org/v3.0/identifiers"
+                    )
 
-            if external_id_relationship not in RELATIONSHIPS:
-                raise ModelExceptionError(
-                    f"Invalid External Id Relationship '{external_id_relationship}' as it is not one of the "
-                    f"{RELATIONSHIPS}, #{row_no+2}: {row}."
-                )
+                if not external_id_value:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Value or Work Id: {external_id_value}, #{row_no+2}: {row}."
+                    )
 
-            if (
-                cached_row
-                and title.lower() == val(cached_row, 0).lower()
-                and external_id_type.lower() == val(cached_row, 17).lower()
-                and external_id_value.lower() == val(cached_row, 18).lower()
-                and external_id_relationship.lower() == val(cached_row, 20).lower()
-            ):
-                row = cached_row
-            else:
-                cached_row = row
+                if not title:
+                    raise ModelExceptionError(
+                        f"Title is mandatory, #{row_no+2}: {row}. Header: {header}"
+                    )
 
-            is_active = val(row, 14, "").lower() in ["y", "yes", "1", "true"]
-            if is_active:
-                is_enqueue = is_active
+                if external_id_relationship not in RELATIONSHIPS:
+                    raise ModelExceptionError(
+                        f"Invalid External Id Relationship '{external_id_relationship}' as it is not one of the "
+                        f"{RELATIONSHIPS}, #{row_no+2}: {row}."
+                    )
 
-            work_type = val(row, 5, "").replace("_", "-").lower()
-            if not work_type:
-                raise ModelExceptionError(
-                    f"Work type is mandatory, #{row_no+2}: {row}. Header: {header}"
-                )
+                if (
+                    cached_row
+                    and title.lower() == val(cached_row, 0).lower()
+                    and external_id_type.lower() == val(cached_row, 17).lower()
+                    and external_id_value.lower() == val(cached_row, 18).lower()
+                    and external_id_relationship.lower() == val(cached_row, 20).lower()
+                ):
+                    row = cached_row
+                else:
+                    cached_row = row
+
+                is_active = is_yes(val(row, 14))
+                if is_active:
+                    is_enqueue = is_active
 
-            # The uploaded country must be from ISO 3166-1 alpha-2
-            country = val(row, 13)
-            if country:
-                try:
-                    country = countries.lookup(country).alpha_2
-                except Exception:
+                work_type = normalize_code(val(row, 5, ""))
+                if not work_type:
                     raise ModelExceptionError(
-                        f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
-                        f"#{row_no+2}: {row}. Header: {header}"
+                        f"Work type is mandatory, #{row_no+2}: {row}. Header: {header}"
                     )
 
-            publication_date = val(row, 9)
-            citation_type = val(row, 7)
-            if citation_type:
-                citation_type = citation_type.replace("_", "-").lower()
+                # The uploaded country must be from ISO 3166-1 alpha-2
+                country = val(row, 13)
+                if country:
+                    try:
+                        country = country_code(country)
+                    except Exception:
+                        raise ModelExceptionError(
+                            f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
+                            f"#{row_no+2}: {row}. Header: {header}"
+                        )
+
+                publication_date = val(row, 9)
+                citation_type = normalize_code(val(row, 7))
 
-            if publication_date:
-                publication_date = PartialDate.create(publication_date)
-            rows.append(
-                dict(
+                if publication_date:
+                    publication_date = PartialDate.create(publication_date)
+                yield dict(
                     work=dict(
                         title=title,
                         subtitle=val(row, 1),
@@ -3824,38 +4119,42 @@ class WorkRecord(RecordModel):
                         relationship=external_id_relationship,
                     ),
                 )
-            )
 
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.WORK)
-                for work, records in groupby(rows, key=lambda row: row["work"].items()):
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.WORK)
+                inserter = BulkInserter()
+                for work, records in groupby(parse_rows(), key=lambda row: row["work"].items()):
                     records = list(records)
 
                     wr = cls(task=task, **dict(work))
                     validator = ModelValidator(wr)
                     if not validator.validate():
                         raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                    wr.save()
 
+                    related = []
                     for external_id in set(
                         tuple(r["external_id"].items())
                         for r in records
                         if r["external_id"]["type"] and r["external_id"]["value"]
                     ):
-                        ei = WorkExternalId(record=wr, **dict(external_id))
-                        ei.save()
+                        related.append(WorkExternalId(record=wr, **dict(external_id)))
 
                     for invitee in set(
                         tuple(r["invitee"].items()) for r in records if r["invitee"]["email"]
                     ):
                         rec = WorkInvitee(record=wr, **dict(invitee))
                         validator = ModelValidator(rec)
-                        if not validator.validate():
+                        # the record gets linked when it's inserted:
+                        if not validator.validate(exclude=["record"]):
                             raise ModelExceptionError(
                                 f"Invalid invitee record: {validator.errors}"
                             )
-                        rec.save()
+                        related.append(rec)
+
+                    inserter.add(wr, *related)
+                inserter.flush()
                 if is_enqueue:
                     from .utils import enqueue_task_records
 
@@ -4145,7 +4444,7 @@ class Invitee(BaseModel):
         table_alias = "i"
 
 
-class PeerReviewInvitee(Invitee):
+class PeerReviewInvitee(Invitee, ClaimableModel):
     """Researcher or Invitee - related to peer review."""
 
     record = ForeignKeyField(PeerReviewRecord, backref="invitees", on_delete="CASCADE")
@@ -4154,7 +4453,7 @@ class PeerReviewInvitee(Invitee):
         table_alias = "pi"
 
 
-class WorkInvitee(Invitee):
+class WorkInvitee(Invitee, ClaimableModel):
     """Researcher or Invitee - related to work."""
 
     record = ForeignKeyField(WorkRecord, backref="invitees", on_delete="CASCADE")
@@ -4163,7 +4462,7 @@ class WorkInvitee(Invitee):
         table_alias = "wi"
 
 
-class FundingInvitee(Invitee):
+class FundingInvitee(Invitee, ClaimableModel):
     """Researcher or Invitee - related to funding."""
 
     record = ForeignKeyField(FundingRecord, backref="invitees", on_delete="CASCADE")
@@ -4257,7 +4556,7 @@ class AffiliationExternalId(ExternalIdModel):
         table_alias = "aei"
 
 
-class OtherIdRecord(ExternalIdModel):
+class OtherIdRecord(ExternalIdModel, ClaimableModel):
     """Other ID record loaded from json/csv file for batch processing."""
 
     task = ForeignKeyField(Task, backref="other_id_records", on_delete="CASCADE")
@@ -4274,8 +4573,23 @@ class OtherIdRecord(ExternalIdModel):
     processed_at = DateTimeField(null=True)
     status = TextField(null=True, help_text="Record processing status.")
 
+    _csv_header_map = HeaderMap(
+        r"(display)?.*index",
+        r"((external)?\s*id(entifier)?\s+type|.*type)$",
+        r"((external)?\s*id(entifier)?\s+value|.*value)$",
+        r"((external)?\s*id(entifier)?\s*url|.*url)$",
+        r"((external)?\s*id(entifier)?\s*rel(ationship)?|.*relationship)$",
+        "email",
+        r"first\s*(name)?",
+        r"(last|sur)\s*(name)?",
+        "orcid.*",
+        r"put|code",
+        r"(is)?\s*visib(bility|le)?",
+        r"(is)?\s*active$",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None):
         """Load data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source)
@@ -4302,53 +4616,17 @@ class OtherIdRecord(ExternalIdModel):
                 f"External ID Relationship). Read header: {header}"
             )
 
-        header_rexs = [
-            re.compile(ex, re.I)
-            for ex in (
-                r"(display)?.*index",
-                r"((external)?\s*id(entifier)?\s+type|.*type)$",
-                r"((external)?\s*id(entifier)?\s+value|.*value)$",
-                r"((external)?\s*id(entifier)?\s*url|.*url)$",
-                r"((external)?\s*id(entifier)?\s*rel(ationship)?|.*relationship)$",
-                "email",
-                r"first\s*(name)?",
-                r"(last|sur)\s*(name)?",
-                "orcid.*",
-                r"put|code",
-                r"(is)?\s*visib(bility|le)?",
-                r"(is)?\s*active$",
-            )
-        ]
-
-        def index(rex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if rex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        idxs = [index(rex) for rex in header_rexs]
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, i, default=None):
-            if len(idxs) <= i or idxs[i] is None or idxs[i] >= len(row):
-                return default
-            else:
-                v = row[idxs[i]].strip()
-            return default if v == "" else v
-
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.OTHER_ID)
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.OTHER_ID)
                 is_enqueue = False
+                inserter = BulkInserter()
                 for row_no, row in enumerate(reader):
                     # skip empty lines:
                     if len([item for item in row if item and item.strip()]) == 0:
@@ -4373,12 +4651,10 @@ class OtherIdRecord(ExternalIdModel):
                     rec_type = val(row, 1, "").lower()
                     value = val(row, 2)
                     url = val(row, 3)
-                    relationship = val(row, 4)
-                    if relationship:
-                        relationship = relationship.replace("_", "-").lower()
+                    relationship = normalize_code(val(row, 4))
                     first_name = val(row, 6)
                     last_name = val(row, 7)
-                    is_active = val(row, 11, "").lower() in ["y", "yes", "1", "true"]
+                    is_active = is_yes(val(row, 11))
                     if is_active:
                         is_enqueue = is_active
 
@@ -4393,9 +4669,7 @@ class OtherIdRecord(ExternalIdModel):
                             f"Missing External Id Value: {value}, #{row_no+2}: {row}."
                         )
 
-                    visibility = val(row, 10)
-                    if visibility:
-                        visibility = visibility.replace("_", "-").lower()
+                    visibility = normalize_code(val(row, 10))
                     rr = cls(
                         task=task,
                         type=rec_type,
@@ -4414,7 +4688,8 @@ class OtherIdRecord(ExternalIdModel):
                     validator = ModelValidator(rr)
                     if not validator.validate():
                         raise ModelExceptionError(f"Invalid record: {validator.errors}")
-                    rr.save()
+                    inserter.add(rr)
+                inserter.flush()
                 if is_enqueue:
                     from .utils import enqueue_task_records
 
@@ -4520,7 +4795,7 @@ class OrgRecord(RecordModel):
         table_alias = "or"
 
 
-class ResourceRecord(RecordModel, Invitee):
+class ResourceRecord(RecordModel, Invitee, ClaimableModel):
     """Research resource record."""
 
     display_index = IntegerField(null=True)
@@ -4646,8 +4921,44 @@ class ResourceRecord(RecordModel, Invitee):
     class Meta:  # noqa: D101,D106
         table_alias = "rr"
 
+    _csv_header_map = HeaderMap(
+        identifier=r"local.*|.*identifier",
+        email=r"email",
+        orcid=r"orcid\s*id",
+        first_name=r"first\s*name",
+        last_name=r"last\s*name",
+        put_code=r"put\s*code",
+        visibility=r"visibility",
+        proposal_title=r"proposal\s*title",
+        proposal_start_date=r"proposal\s*start\s*date",
+        proposal_end_date=r"proposal\s*end\s*date",
+        proposal_url=r"proposal\s*url",
+        proposal_external_id_type=r"proposal\s*external\s*id\s*type",
+        proposal_external_id_value=r"proposal\s*external\s*id\s*value",
+        proposal_external_id_url=r"proposal\s*external\s*id\s*url",
+        proposal_external_id_relationship=r"proposal\s*external\s*id\s*relationship",
+        proposal_host_name=r"proposal\s*host\s*name",
+        proposal_host_city=r"proposal\s*host\s*city",
+        proposal_host_region=r"proposal\s*host\s*region",
+        proposal_host_country=r"proposal\s*host\s*country",
+        proposal_host_disambiguated_id=r"proposal\s*host\s*disambiguat.*id",
+        proposal_host_disambiguation_source=r"proposal\s*host\s*disambiguat.*source",
+        name=r"resource\s*name",
+        type=r"resource\s*type",
+        external_id_type=r"(resource\s*)?external\s*id\s*type",
+        external_id_value=r"(resource\s*)?external\s*id\s*value",
+        external_id_url=r"(resource\s*)?external\s*id\s*url",
+        external_id_relationship=r"(resource\s*)?external\s*id\s*relationship",
+        host_name=r"(resource\s*)?host\s*name",
+        host_city=r"(resource\s*)?host\s*city",
+        host_region=r"(resource\s*)?host\s*region",
+        host_country=r"(resource\s*)?host\s*country",
+        host_disambiguated_id=r"(resource\s*)?host\s*disambiguat.*id",
+        host_disambiguation_source=r"(resource\s*)?host\s*disambiguat.*source",
+    )
+
     @classmethod
-    def load_from_csv(cls, source, filename=None, org=None):
+    def load_from_csv(cls, source, filename=None, org=None, task=None):
         """Load data from CSV/TSV file or a string."""
         if isinstance(source, str):
             source = StringIO(source, newline="")
@@ -4666,85 +4977,16 @@ class ResourceRecord(RecordModel, Invitee):
         if len(header) < 2:
             raise ModelExceptionError("Expected CSV or TSV format file.")
 
-        header_rexs = [
-            (re.compile(ex, re.I), c)
-            for (ex, c) in [
-                (r"local.*|.*identifier", "identifier"),
-                (r"email", "email"),
-                (r"orcid\s*id", "orcid"),
-                (r"first\s*name", "first_name"),
-                (r"last\s*name", "last_name"),
-                (r"put\s*code", "put_code"),
-                (r"visibility", "visibility"),
-                (r"proposal\s*title", "proposal_title"),
-                (r"proposal\s*start\s*date", "proposal_start_date"),
-                (r"proposal\s*end\s*date", "proposal_end_date"),
-                (r"proposal\s*url", "proposal_url"),
-                (r"proposal\s*external\s*id\s*type", "proposal_external_id_type"),
-                (r"proposal\s*external\s*id\s*value", "proposal_external_id_value"),
-                (r"proposal\s*external\s*id\s*url", "proposal_external_id_url"),
-                (r"proposal\s*external\s*id\s*relationship", "proposal_external_id_relationship"),
-                (r"proposal\s*host\s*name", "proposal_host_name"),
-                (r"proposal\s*host\s*city", "proposal_host_city"),
-                (r"proposal\s*host\s*region", "proposal_host_region"),
-                (r"proposal\s*host\s*country", "proposal_host_country"),
-                (r"proposal\s*host\s*disambiguat.*id", "proposal_host_disambiguated_id"),
-                (r"proposal\s*host\s*disambiguat.*source", "proposal_host_disambiguation_source"),
-                (r"resource\s*name", "name"),
-                (r"resource\s*type", "type"),
-                (r"(resource\s*)?external\s*id\s*type", "external_id_type"),
-                (r"(resource\s*)?external\s*id\s*value", "external_id_value"),
-                (r"(resource\s*)?external\s*id\s*url", "external_id_url"),
-                (r"(resource\s*)?external\s*id\s*relationship", "external_id_relationship"),
-                (r"(resource\s*)?host\s*name", "host_name"),
-                (r"(resource\s*)?host\s*city", "host_city"),
-                (r"(resource\s*)?host\s*region", "host_region"),
-                (r"(resource\s*)?host\s*country", "host_country"),
-                (r"(resource\s*)?host\s*disambiguat.*id", "host_disambiguated_id"),
-                (r"(resource\s*)?host\s*disambiguat.*source", "host_disambiguation_source"),
-            ]
-        ]
-
-        def index(ex):
-            """Return first header column index matching the given regex."""
-            for i, column in enumerate(header):
-                if ex.match(column.strip()):
-                    return i
-            else:
-                return None
-
-        # model column -> file column map:
-        idxs = {column: index(ex) for ex, column in header_rexs}
-
-        if all(idx is None for idx in idxs):
-            raise ModelExceptionError(
-                f"Failed to map fields based on the header of the file: {header}"
-            )
+        val = cls._csv_header_map.reader(header)
 
         if org is None:
             org = current_user.organisation if current_user else None
 
-        def val(row, column, default=None):
-            idx = idxs.get(column)
-            if idx is None or idx < 0 or idx >= len(row):
-                return default
-            return row[idx].strip() or default
-
-        def country_code(row, column):
-            country = val(row, column)
-            if country:
-                try:
-                    country = countries.lookup(country).alpha_2
-                except Exception:
-                    raise ModelExceptionError(
-                        f" (Country must be 2 character from ISO 3166-1 alpha-2) in the row "
-                        f"#{row_no+2}: {row}. Header: {header}"
-                    )
-            return country
-
         with db.atomic() as transaction:
             try:
-                task = Task.create(org=org, filename=filename, task_type=TaskType.RESOURCE)
+                if task is None:
+                    task = Task.create(org=org, filename=filename, task_type=TaskType.RESOURCE)
+                inserter = BulkInserter()
                 for row_no, row in enumerate(reader):
                     # skip empty lines:
                     if len([item for item in row if item and item.strip()]) == 0:
@@ -4760,11 +5002,9 @@ class ResourceRecord(RecordModel, Invitee):
                             f"Invalid email address '{email}'  in the row #{row_no+2}: {row}"
                         )
 
-                    visibility = val(row, "visibility")
-                    if visibility:
-                        visibility = visibility.lower()
+                    visibility = normalize_code(val(row, "visibility"))
 
-                    rec = cls.create(
+                    rec = cls(
                         task=task,
                         visibility=visibility,
                         email=email,
@@ -4773,7 +5013,7 @@ class ResourceRecord(RecordModel, Invitee):
                             c: v
                             for c, v in (
                                 (c, val(row, c))
-                                for c in idxs
+                                for c in cls._csv_header_map.names
                                 if c not in ["email", "orcid", "visibility"]
                             )
                             if v
@@ -4788,7 +5028,9 @@ class ResourceRecord(RecordModel, Invitee):
                         raise ValueError(
                             f"Invalid data in the row #{row_no+2}: {validator.errors}"
                         )
+                    inserter.add(rec)
 
+                inserter.flush()
                 transaction.commit()
                 return task
 
@@ -4941,13 +5183,18 @@ class MessageRecord(RecordModel):
         #     jsonschema.validate(data, schemas.affiliation_task)
         if not task and task_id:
             task = Task.select().where(Task.id == task_id).first()
-        if not task and "id" in data and override and task_type:
+        if (
+            (not task or task.loading_state == "LOADING")
+            and "id" in data
+            and override
+            and task_type
+        ):
             task_id = int(data["id"])
             task = (
                 Task.select()
                 .where(Task.id == task_id, Task.task_type == task_type, Task.is_raw)
                 .first()
-            )
+            ) or task
         if not filename:
             if isinstance(data, dict):
                 filename = data.get("filename")
@@ -4969,6 +5216,10 @@ class MessageRecord(RecordModel):
                     task = Task.create(
                         org=org, filename=filename, task_type=task_type, is_raw=True
                     )
+                elif not task.is_raw:
+                    # the task created for a stored upload before its content was known:
+                    task.is_raw = True
+                    task.save()
                 elif override:
                     task.record_model.delete().where(task.record_model.task == task).execute()
 
@@ -5155,6 +5406,12 @@ class Client(AuditedModel):
     def __str__(self):  # noqa: D102
         return self.name or self.homepage_url or self.description
 
+    def delete_instance(self, *args, **kwargs):  # noqa: D102
+        # NB! the client tokens get deleted by the cascade:
+        res = super().delete_instance(*args, **kwargs)
+        purge_token_cache()
+        return res
+
 
 class Grant(BaseModel):
     """Grant Token / Authorization Code.
@@ -5225,6 +5482,25 @@ class Token(BaseModel):
     def expires_at(self):  # noqa: D102
         return self.expires
 
+    def save(self, *args, **kwargs):  # noqa: D102
+        is_new = self.id is None
+        res = super().save(*args, **kwargs)
+        if not is_new:
+            purge_token_cache()
+        return res
+
+    def delete_instance(self, *args, **kwargs):  # noqa: D102
+        res = super().delete_instance(*args, **kwargs)
+        purge_token_cache()
+        return res
+
+
+def purge_token_cache():
+    """Discard the cached access tokens after a token update or revocation."""
+    from .queuing import token_cache
+
+    token_cache.purge()
+
 
 class AsyncOrcidResponse(BaseModel):
     """Asynchronouly invoked ORCID API calls."""
@@ -5237,6 +5513,27 @@ class AsyncOrcidResponse(BaseModel):
     status_code = SmallIntegerField(null=True)
     headers = TextField(null=True)
     body = TextField(null=True)
+    # ALTER TABLE async_orcid_response ADD COLUMN "batch_id" UUID NULL;
+    # ALTER TABLE async_orcid_response ADD COLUMN "seq" INTEGER NULL;
+    # CREATE INDEX async_orcid_response_batch_id_seq ON async_orcid_response (batch_id, seq);
+    batch_id = UUIDField(null=True, help_text="The batch of the calls executed by a single job.")
+    seq = IntegerField(null=True, help_text="The sequence number of the call within the batch.")
+
+    def to_result(self):
+        """Get the call outcome for the API response."""
+        return {
+            "seq": self.seq,
+            "job-id": str(self.job_id),
+            "method": self.method,
+            "url": self.url,
+            "status": self.status_code,
+            "executed-at": self.executed_at.isoformat() if self.executed_at else None,
+            "headers": json.loads(self.headers) if self.headers else None,
+            "body": self.body,
+        }
+
+    class Meta:  # noqa: D101,D106
+        indexes = ((("batch_id", "seq"), False),)
 
 
 class MailLog(BaseModel):
@@ -5255,18 +5552,106 @@ class MailLog(BaseModel):
 DeferredForeignKey.resolve(User)
 
 
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def detect_encoding(sample):
+    """Detect the encoding of a file based on the sample of its beginning.
+
+    BOM takes precedence, then UTF-8 (the sample may end with a truncated character),
+    and only if the sample is not a valid UTF-8, the encoding gets detected with chardet.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    return chardet.detect(sample).get("encoding") or "latin-1"
+
+
+class UploadStream(io.RawIOBase):
+    """Raw binary stream adapter of a file object with *read* and *seek* only.
+
+    For example, SpooledTemporaryFile used for the uploaded files.
+    """
+
+    def __init__(self, file):
+        """Wrap the file object (it doesn't get closed when the stream is closed)."""
+        self.file = file
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def seekable(self):  # noqa: D102
+        return True
+
+    def readinto(self, b):  # noqa: D102
+        data = self.file.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):  # noqa: D102
+        return self.file.seek(offset, whence)
+
+    def tell(self):  # noqa: D102
+        return self.file.tell()
+
+
+def open_upload(input_file, sample_size=None):
+    """Open the binary (uploaded) file as a text stream decoded incrementally.
+
+    The encoding gets detected based on the sample of the beginning of the file.
+    If the sample is a valid UTF-8 (e.g., plain ASCII), the rest of the file gets
+    verified chunk by chunk, and if it isn't a valid UTF-8, the encoding gets detected
+    incrementally starting with the first invalid chunk.
+    """
+    stream = getattr(input_file, "stream", input_file)
+    sample_size = sample_size or app.config.get("UPLOAD_ENCODING_SAMPLE_SIZE") or 65536
+    sample = stream.read(sample_size)
+    encoding = detect_encoding(sample)
+    if encoding == "utf-8" and len(sample) == sample_size:
+        decoder, chunk = codecs.getincrementaldecoder("utf-8")(), sample
+        try:
+            while chunk:
+                decoder.decode(chunk, final=False)
+                chunk = stream.read(sample_size)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            detector = chardet.UniversalDetector()
+            while chunk and not detector.done:
+                detector.feed(chunk)
+                chunk = stream.read(sample_size)
+            detector.close()
+            encoding = detector.result.get("encoding")
+            if not encoding or encoding.lower() in ["ascii", "utf-8"]:
+                encoding = "latin-1"
+    stream.seek(0)
+    return io.TextIOWrapper(
+        io.BufferedReader(UploadStream(stream)), encoding=encoding, newline=""
+    )
+
+
 def readup_file(input_file):
     """Read up the whole content and decode it and return the whole content."""
     raw = input_file.read()
-    detected_encoding = chardet.detect(raw).get("encoding")
-    encoding_list = ["utf-8", "utf-8-sig", "utf-16", "utf-16-le", "utf-16-be", "latin-1"]
-    if detected_encoding:
-        encoding_list.insert(0, detected_encoding)
-
+    encoding_list = [
+        detect_encoding(raw[: app.config.get("UPLOAD_ENCODING_SAMPLE_SIZE") or 65536]),
+        "utf-8",
+        "latin-1",
+    ]
     for encoding in encoding_list:
         try:
             return raw.decode(encoding)
-        except UnicodeDecodeError:
+        except (UnicodeDecodeError, LookupError):
             continue
 
 
@@ -5345,6 +5730,24 @@ def create_audit_tables():
             db.commit()
 
 
+def partition_tables():
+    """Partition ORCID API call log table by month (PostgreSQL only)."""
+    try:
+        db.connect()
+    except OperationalError:
+        pass
+
+    if isinstance(db, PostgresqlDatabase):
+        with open(
+            os.path.join(os.path.dirname(__file__), "sql", "partitioning.sql"), "br"
+        ) as input_file:
+            sql = readup_file(input_file)
+            db.commit()
+            with db.cursor() as cr:
+                cr.execute(sql)
+            db.commit()
+
+
 def drop_tables():
     """Drop all model tables."""
     if isinstance(db, SqliteDatabase):
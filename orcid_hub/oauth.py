@@ -4,9 +4,11 @@ from datetime import datetime, timedelta
 
 from flask import render_template, request
 from flask_login import current_user, login_required
+from peewee import JOIN
 
 from . import app, oauth
-from .models import Client, Grant, Token
+from .models import Client, Grant, Token, User
+from .queuing import token_cache
 
 
 @oauth.clientgetter
@@ -37,12 +39,34 @@ def save_grant(client_id, code, request, *args, **kwargs):  # noqa: D103 pragma:
         expires=expires)
 
 
+def fetch_token(access_token=None, refresh_token=None):
+    """Fetch the token with its client and user and return the field values of them."""
+    token = Token.select(Token, Client, User).join(Client).switch(Token).join(
+        User, JOIN.LEFT_OUTER).where(
+            Token.expires >= datetime.now(),
+            (Token.access_token == access_token) if access_token is not None else
+            (Token.refresh_token == refresh_token)).first()
+    if token:
+        return (dict(token.__data__), dict(token.client.__data__),
+                token.user and dict(token.user.__data__))
+
+
 @oauth.tokengetter
 def load_token(access_token=None, refresh_token=None):  # noqa: D103
-    return Token.select().where(
-        Token.expires >= datetime.now(),
-        (Token.access_token == access_token) if access_token is not None else
-        (Token.refresh_token == refresh_token)).first()
+    key = ("access_token", access_token) if access_token is not None else (
+        "refresh_token", refresh_token)
+    data = token_cache.get(key, lambda: fetch_token(access_token, refresh_token))
+    if not data:
+        return None
+    token_data, client_data, user_data = data
+    if token_data["expires"] and token_data["expires"] < datetime.now():
+        return None
+    token = Token.from_data(token_data)
+    token.client = Client.from_data(client_data)
+    if user_data:
+        token.user = User.from_data(user_data)
+    token._dirty.clear()
+    return token
 
 
 @oauth.tokensetter
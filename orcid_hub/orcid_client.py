@@ -23,10 +23,25 @@ from .models import (
 from orcid_api import configuration, rest, api_client, MemberAPIV20Api, SourceClientId, Source
 import orcid_api_v3 as v3
 from orcid_api.rest import ApiException
-from time import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import partial
+from hashlib import sha1
+from peewee import chunked
+from threading import Event, Lock, Thread
+from time import sleep, time
 from urllib.parse import urlparse
 from . import app
+from .queuing import proxy_cache, rate_limiter, rq
+from redis.exceptions import RedisError
+import atexit
 import json
+import os
+import queue
+import random
+import re
+import urllib3
 
 url = urlparse(ORCID_API_BASE)
 host = url.scheme + "://" + url.hostname
@@ -39,10 +54,494 @@ READ_LIMITED = "/read-limited"
 AUTHENTICATE = "/authenticate"
 PERSON_UPDATE = "/person/update"
 
+# ORCID API responses of throttling or (temporary) unavailability:
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+def is_retryable(ex):
+    """Test if the failed ORCID API call is worth retrying later.
+
+    The calls rejected by ORCID API throttling or failed because of the API (temporary)
+    unavailability, or because of the network failures, are retryable.
+    """
+    if isinstance(ex, (ApiException, v3.rest.ApiException)):
+        return ex.status in RETRYABLE_STATUSES
+    return isinstance(ex, urllib3.exceptions.HTTPError)
+
+
+def retry_delay(ex, attempt=0):
+    """Get the delay (sec) before the next attempt to make the failed call.
+
+    The delay grows exponentially with the number of the attempts (with "full jitter")
+    and it's at least as long as the server asked with "Retry-After" header.
+    """
+    delay = random.uniform(
+        0,
+        min(
+            app.config.get("ORCID_API_RETRY_MAX_DELAY") or 3600,
+            (app.config.get("ORCID_API_RETRY_BACKOFF") or 60) * 2 ** attempt,
+        ),
+    )
+    retry_after = getattr(ex, "headers", None) and ex.headers.get("Retry-After")
+    if retry_after and str(retry_after).isdigit():
+        delay = max(delay, float(retry_after))
+    return delay
+
+
+class AdaptiveConcurrency:
+    """Additive increase/multiplicative decrease (AIMD) control of the ORCID API call concurrency.
+
+    The limit gets halved on a retryable failure or when the calls take longer than
+    the latency target (at most once per *cooldown* seconds) and it grows back slowly,
+    up to *max_limit*, while the calls succeed.
+    """
+
+    def __init__(self, max_limit=1, latency_target=None, cooldown=1.0):
+        """Set up the controller with the maximum limit and the latency target (sec)."""
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.latency = None
+        self.error_rate = 0.0
+        self._decreased_at = 0
+        self._lock = Lock()
+
+    def record(self, latency, failed=False):
+        """Feed back the latency (sec) and the outcome of a call."""
+        with self._lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.error_rate = 0.8 * self.error_rate + (0.2 if failed else 0)
+            if failed or (self.latency_target and self.latency > self.latency_target):
+                now = time()
+                if now - self._decreased_at >= self.cooldown:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._decreased_at = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def workers(self, max_workers=None):
+        """Get the current concurrency limit capped by the given maximum number of the workers."""
+        limit = int(self.limit)
+        return max(1, min(limit, max_workers) if max_workers else limit)
+
+
+concurrency = AdaptiveConcurrency(
+    app.config.get("BATCH_WORKERS") or 1, app.config.get("ORCID_API_LATENCY_TARGET")
+)
+
+
+class CircuitOpenError(v3.rest.ApiException):
+    """ORCID API call was rejected because the circuit breaker is open."""
+
+    def __init__(self, retry_in=None):
+        """Set up the exception as 503 Service Unavailable with "Retry-After" header."""
+        super().__init__(status=503, reason="ORCID API circuit breaker is open")
+        self.body = json.dumps({"error": self.reason})
+        self.headers = {"Retry-After": str(round(retry_in))} if retry_in else {}
+
+
+class CircuitBreaker:
+    """Circuit breaker of ORCID API calls shared by all the workers via Redis.
+
+    The circuit is CLOSED while ORCID API is available. After *threshold* consecutive
+    failures indicating ORCID API outage, the circuit opens and the calls get rejected
+    for *reset_timeout* seconds. Then the circuit is HALF-OPEN: a single probe call is let
+    through, and if it succeeds, the circuit gets closed, otherwise it opens again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold=5, reset_timeout=60, key="orcidhub:circuit", connection=None):
+        """Set up the circuit breaker.
+
+        Args:
+            threshold (int): the number of consecutive failures opening the circuit.
+            reset_timeout (int): the time (sec) the circuit stays open before a probe call.
+            key (str): the Redis key (prefix) of the circuit breaker state.
+            connection: Redis connection (default: the RQ connection).
+
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.key = key
+        self._connection = connection
+
+    @property
+    def connection(self):
+        """Get the Redis connection."""
+        return self._connection or rq.connection
+
+    def retry_in(self):
+        """Get the time (sec) the circuit stays open, 0 if it's closed or half-open."""
+        try:
+            opened_at = self.connection.get(f"{self.key}:opened_at")
+        except RedisError:
+            app.logger.exception("Failed to retrieve the circuit breaker state.")
+            return 0
+        return max(0, float(opened_at) + self.reset_timeout - time()) if opened_at else 0
+
+    @property
+    def state(self):
+        """Get the current state of the circuit."""
+        try:
+            opened_at = self.connection.get(f"{self.key}:opened_at")
+        except RedisError:
+            return self.CLOSED
+        if not opened_at:
+            return self.CLOSED
+        return self.OPEN if float(opened_at) + self.reset_timeout > time() else self.HALF_OPEN
+
+    def allow(self):
+        """Test if a call can be made (only a single probe call if the circuit is half-open)."""
+        state = self.state
+        if state == self.HALF_OPEN:
+            try:
+                return bool(
+                    self.connection.set(f"{self.key}:probe", 1, nx=True, ex=self.reset_timeout)
+                )
+            except RedisError:
+                return True
+        return state == self.CLOSED
+
+    def record_success(self):
+        """Close the circuit."""
+        try:
+            self.connection.delete(
+                f"{self.key}:failures", f"{self.key}:opened_at", f"{self.key}:probe"
+            )
+        except RedisError:
+            app.logger.exception("Failed to update the circuit breaker state.")
+
+    def record_failure(self):
+        """Count the failure and open the circuit if the failure threshold is reached."""
+        try:
+            state = self.state
+            failures = self.connection.incr(f"{self.key}:failures")
+            if state == self.HALF_OPEN or (state == self.CLOSED and failures >= self.threshold):
+                with self.connection.pipeline() as pipe:
+                    pipe.set(f"{self.key}:opened_at", time())
+                    pipe.delete(f"{self.key}:probe")
+                    pipe.execute()
+                app.logger.warning("ORCID API circuit breaker is open.")
+        except RedisError:
+            app.logger.exception("Failed to update the circuit breaker state.")
+
+
+def is_outage(ex):
+    """Test if the failed ORCID API call indicates ORCID API outage (unlike throttling)."""
+    if isinstance(ex, (ApiException, v3.rest.ApiException)):
+        return ex.status in RETRYABLE_STATUSES - {429}
+    return isinstance(ex, urllib3.exceptions.HTTPError)
+
+
+circuit_breaker = CircuitBreaker(
+    app.config.get("ORCID_API_CIRCUIT_THRESHOLD") or 5,
+    app.config.get("ORCID_API_CIRCUIT_RESET_TIMEOUT") or 60,
+)
+
+
+class SingleFlight:
+    """Coalesce the concurrent identical calls into a single one sharing its outcome.
+
+    The calls get coalesced within the process and, if *timeout* is set, across
+    the processes with a Redis lock: the lock holder makes the call and publishes
+    the outcome, and the others wait for it up to *timeout* seconds before making
+    the call themselves.
+    """
+
+    def __init__(self, timeout=0, key="orcidhub:singleflight", connection=None):
+        """Set up the single-flight group.
+
+        Args:
+            timeout (float): the time (sec) to wait for the outcome of the call made
+                by another process (0 - no coalescing across the processes).
+            key (str): the Redis key (prefix) of the locks and the outcomes.
+            connection: Redis connection (default: the RQ connection).
+
+        """
+        self.timeout = timeout
+        self.key = key
+        self.poll_interval = 0.05
+        self._connection = connection
+        self._flights = {}
+        self._lock = Lock()
+
+    @property
+    def connection(self):
+        """Get the Redis connection."""
+        return self._connection or rq.connection
+
+    def do(self, key, fn, dump=None, load=None):
+        """Call *fn* unless an identical call (with the same *key*) is already in flight.
+
+        Args:
+            key (str): the call key.
+            fn: the function making the call.
+            dump: the function serializing the outcome to share it with other processes
+                (if it returns None, the outcome doesn't get shared).
+            load: the function deserializing the outcome.
+
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = dict(done=Event(), result=None, error=None)
+        if not is_leader:
+            flight["done"].wait()
+            if flight["error"]:
+                raise flight["error"]
+            return flight["result"]
+
+        try:
+            if self.timeout and dump and load:
+                flight["result"] = self.do_shared(key, fn, dump, load)
+            else:
+                flight["result"] = fn()
+            return flight["result"]
+        except Exception as ex:
+            flight["error"] = ex
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight["done"].set()
+
+    def do_shared(self, key, fn, dump, load):
+        """Call *fn* unless another process is making the identical call."""
+        lock_key, result_key = f"{self.key}:{key}:lock", f"{self.key}:{key}"
+        timeout_ms = round(self.timeout * 1000)
+        try:
+            if not self.connection.set(lock_key, 1, nx=True, px=timeout_ms):
+                deadline = time() + self.timeout
+                while time() < deadline:
+                    is_locked = self.connection.exists(lock_key)
+                    data = self.connection.get(result_key)
+                    if data is not None:
+                        return load(data)
+                    if not is_locked:
+                        break
+                    sleep(self.poll_interval)
+                return fn()
+        except RedisError:
+            app.logger.exception("Failed to coalesce the call, making it independently.")
+            return fn()
+
+        try:
+            result = fn()
+            data = dump(result)
+            if data is not None:
+                self.connection.set(result_key, data, px=timeout_ms)
+            return result
+        finally:
+            try:
+                self.connection.delete(lock_key)
+            except RedisError:
+                app.logger.exception("Failed to release the single-flight lock.")
+
+
+single_flight = SingleFlight(app.config.get("ORCID_API_COALESCING_TIMEOUT") or 0)
+
+
+def dump_response(resp):
+    """Serialize a successful API call response (status, reason, headers and data)."""
+    if not 200 <= resp.status < 300:
+        return None
+    meta = dict(status=resp.status, reason=resp.reason, headers=dict(resp.getheaders()))
+    return json.dumps(meta).encode() + b"\n" + resp.data
+
+
+def load_response(data, preload_content=True):
+    """Deserialize an API call response serialized with :func:`dump_response`."""
+    meta, body = data.split(b"\n", 1)
+    meta = json.loads(meta)
+    resp = urllib3.HTTPResponse(
+        body=body, headers=meta["headers"], status=meta["status"], reason=meta["reason"])
+    return v3.rest.RESTResponse(resp) if preload_content else resp
+
+
+ORCID_IN_PATH_REGEX = re.compile(r"/(\d{4}-\d{4}-\d{4}-\d{3}[\dX])(?:/|$)")
+
+
+class ProfileCache:
+    """Thread-safe cache of the fetched profile records invalidated on the writes."""
+
+    def __init__(self):
+        """Set up an empty cache."""
+        self._records = {}
+        self._lock = Lock()
+
+    def get(self, orcid, key):
+        """Get the cached profile record raw content."""
+        with self._lock:
+            return self._records.get(orcid, {}).get(key)
+
+    def set(self, orcid, key, data):
+        """Store the profile record raw content."""
+        with self._lock:
+            self._records.setdefault(orcid, {})[key] = data
+
+    def invalidate(self, orcid=None):
+        """Remove the cached records of the profile (or all the records if it's not given)."""
+        with self._lock:
+            if orcid:
+                self._records.pop(orcid, None)
+            else:
+                self._records.clear()
+
+
+_profile_cache = ContextVar("profile_cache", default=None)
+
+
+@contextmanager
+def profile_cache():
+    """Cache the profile records fetched within the block (e.g., a batch processing job).
+
+    The profile records get fetched only once within the block unless the profile gets
+    modified with a write call. The nested blocks share the outermost block cache.
+    """
+    cache = _profile_cache.get()
+    if cache is not None:
+        yield cache
+        return
+    token = _profile_cache.set(ProfileCache())
+    try:
+        yield _profile_cache.get()
+    finally:
+        _profile_cache.reset(token)
+
+
+class ApiCallLog:
+    """Bounded in-process buffer of ORCID API call audit entries written in bulk.
+
+    The entries get inserted with :meth:`OrcidApiCall.insert_many` by a background thread
+    every *flush_interval* seconds, at the end of each batch job and at the process exit.
+    If the buffer is full, depending on the *overflow* policy, either the calling thread
+    flushes the buffer ("flush") or the entry gets discarded ("drop").
+    With *size* 0 the entries get written right away, and so they do in the processes forked
+    from the process the flushing thread belongs to (e.g., RQ work-horses, which exit without
+    running the exit handlers), as the thread doesn't exist in the forked process.
+    """
+
+    chunk_size = 50
+
+    def __init__(self, size=1000, flush_interval=5, overflow="flush"):
+        """Set up an empty buffer."""
+        self.size = size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=size)
+        self._flush_lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def is_forked(self):
+        """Test if the current process was forked from the process with the flushing thread."""
+        return self._pid is not None and self._pid != os.getpid()
+
+    def add(self, **entry):
+        """Add a call audit entry to the buffer."""
+        if not self.size or self.is_forked:
+            try:
+                OrcidApiCall.create(**entry)
+            except Exception:
+                app.logger.exception("Failed to create API call log entry.")
+            return
+        if self.flush_interval and not self._thread:
+            self.start()
+        try:
+            self._queue.put_nowait(entry)
+            return
+        except queue.Full:
+            if self.overflow != "drop":
+                self.flush()
+                try:
+                    self._queue.put_nowait(entry)
+                    return
+                except queue.Full:
+                    pass
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            app.logger.warning(
+                f"ORCID API call log buffer is full, {self.dropped} entries were dropped.")
+
+    def flush(self):
+        """Write all the buffered entries into the database."""
+        if self.is_forked:
+            # the entries inherited from the parent process get written by the parent:
+            return 0
+        with self._flush_lock:
+            entries = []
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not entries:
+                return 0
+            try:
+                with OrcidApiCall._meta.database.atomic():
+                    for rows in chunked(entries, self.chunk_size):
+                        OrcidApiCall.insert_many(rows).execute()
+            except Exception:
+                app.logger.exception(f"Failed to write {len(entries)} API call log entries.")
+                return 0
+            return len(entries)
+
+    def start(self):
+        """Start the background flushing thread."""
+        with self._flush_lock:
+            if self._thread:
+                return
+            self._thread = Thread(target=self.run, name="api-call-log", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+        atexit.register(self.stop)
+
+    def run(self):
+        """Flush the buffer periodically until stopped."""
+        db = OrcidApiCall._meta.database
+        while not self._stopped.wait(self.flush_interval):
+            with db.connection_context():
+                self.flush()
+
+    def stop(self):
+        """Stop the background flushing and write the remaining entries."""
+        self._stopped.set()
+        atexit.unregister(self.stop)
+        self.flush()
+
+
+api_call_log = ApiCallLog(
+    app.config.get("ORCID_API_CALL_LOG_BUFFER_SIZE", 1000),
+    app.config.get("ORCID_API_CALL_LOG_FLUSH_INTERVAL", 5),
+    app.config.get("ORCID_API_CALL_LOG_OVERFLOW") or "flush",
+)
+
+
+_pool_managers = {}
+_pool_managers_lock = Lock()
+
 
 class OrcidRESTClientObjectMixing:
     """REST Client with call logging."""
 
+    def __init__(self, *args, **kwargs):
+        """Set up the client reusing the process-wide connection pool of the API host.
+
+        The connection pool manager is thread-safe and keeps the connections alive between
+        the API client instances. The access tokens are part of the instance configuration,
+        and get passed only with the request headers.
+        """
+        kwargs.setdefault("maxsize", app.config.get("ORCID_API_POOL_MAXSIZE") or 10)
+        super().__init__(*args, **kwargs)
+        with _pool_managers_lock:
+            self.pool_manager = _pool_managers.setdefault((type(self), host), self.pool_manager)
+
     def request(
         self,
         method,
@@ -55,51 +554,100 @@ class OrcidRESTClientObjectMixing:
         _request_timeout=None,
         **kwargs,
     ):
-        """Exectue REST API request and logs both request, response and the restponse time."""
-        request_time = time()
-        put_code = body.get("put-code") if body else None
+        """Exectue REST API request and logs both request, response and the restponse time.
+
+        The identical concurrent GET requests share a single upstream call, and only the call
+        actually made gets recorded (the audit entry, the circuit breaker and the concurrency
+        outcome), the requests sharing it get just its response or exception.
+        """
+        call = partial(
+            self.call,
+            method=method,
+            url=url,
+            query_params=query_params,
+            headers=headers,
+            body=body,
+            post_params=post_params,
+            _preload_content=_preload_content,
+            _request_timeout=_request_timeout,
+            **kwargs,
+        )
+        if method == "GET":
+            # the identical concurrent reads share a single upstream call:
+            key = sha1(
+                json.dumps(
+                    [url, query_params, headers, _preload_content], sort_keys=True, default=str
+                ).encode()
+            ).hexdigest()
+            load = partial(load_response, preload_content=_preload_content)
+            return single_flight.do(key, call, dump_response, load)
         try:
-            oac = OrcidApiCall.create(
-                user_id=current_user.id if current_user else None,
-                method=method,
-                url=url,
-                query_params=query_params,
-                body=body,
-                put_code=put_code,
-            )
-        except Exception:
-            app.logger.exception("Failed to create API call log entry.")
-            oac = None
+            return call()
+        finally:
+            m = ORCID_IN_PATH_REGEX.search(urlparse(url).path)
+            cache = _profile_cache.get()
+            if cache:
+                cache.invalidate(m and m.group(1))
+            if m:
+                proxy_cache.invalidate(m.group(1))
+
+    def call(self, method, url, query_params=None, body=None, **kwargs):
+        """Make the upstream call recording its outcome and the call audit entry."""
+        request_time = time()
+        oac = dict(
+            called_at=datetime.utcnow(),
+            user_id=current_user.id if current_user else None,
+            method=method,
+            url=url,
+            query_params=query_params,
+            body=body,
+            put_code=body.get("put-code") if body else None,
+            response=None,
+            response_time_ms=None,
+            status=None,
+        )
         try:
-            res = super().request(
-                method=method,
-                url=url,
-                query_params=query_params,
-                headers=headers,
-                body=body,
-                post_params=post_params,
-                _preload_content=_preload_content,
-                _request_timeout=_request_timeout,
-                **kwargs,
-            )
+            if not circuit_breaker.allow():
+                raise CircuitOpenError(circuit_breaker.retry_in())
+            call_time = time()
+            res = self.send(method=method, url=url, query_params=query_params, body=body, **kwargs)
+        except CircuitOpenError as ex:
+            oac["status"] = ex.status
+            oac["response"] = ex.body
+            raise
+        except urllib3.exceptions.HTTPError:
+            concurrency.record(time() - call_time, failed=True)
+            circuit_breaker.record_failure()
+            raise
         except (ApiException, v3.rest.ApiException) as ex:
-            if oac:
-                oac.status = ex.status
-                oac.response_time_ms = round((time() - request_time) * 1000)
-                if ex.body:
-                    oac.response = ex.body
-                oac.save()
-                raise
+            concurrency.record(time() - call_time, failed=is_retryable(ex))
+            if is_outage(ex):
+                circuit_breaker.record_failure()
+            else:
+                circuit_breaker.record_success()
+            oac["status"] = ex.status
+            if ex.body:
+                oac["response"] = ex.body
+            raise
         else:
-            if res and oac:
-                oac.status = res.status
+            concurrency.record(time() - call_time)
+            circuit_breaker.record_success()
+            if res:
+                oac["status"] = res.status
                 if res.data:
-                    oac.response = res.data
+                    oac["response"] = res.data
         finally:
-            if oac:
-                oac.response_time_ms = round((time() - request_time) * 1000)
-                oac.save()
+            oac["response_time_ms"] = round((time() - request_time) * 1000)
+            api_call_log.add(**oac)
+
+        return res
 
+    def send(self, *args, **kwargs):
+        """Make the API call within the rate limit and read up the whole response."""
+        rate_limiter.acquire(getattr(self, "org_id", None))
+        res = super().request(*args, **kwargs)
+        # NB! the response can be shared among the threads, so it gets read up right away:
+        res.data
         return res
 
 
@@ -150,6 +698,10 @@ class MemberAPIMixin:
             org = user.organisation
         self.org = org
         self.user = user
+        # the organisation the API calls get rate limited for:
+        rest_client = getattr(self.api_client, "rest_client", None)
+        if rest_client:
+            rest_client.org_id = org.id
         if version:
             self.version = version
 
@@ -181,35 +733,46 @@ class MemberAPIMixin:
                 configuration.access_token = access_token
 
     def get_record(self):
-        """Fetch record details. (The generated one is broken)."""
-        resp = self.get()
-        try:
-            resp, code, headers = self.api_client.call_api(
-                f"/{self.version}/{self.user.orcid}",
-                "GET",
-                header_params={"Accept": self.content_type},
-                response_type=None,
-                auth_settings=["orcid_auth"],
-                _preload_content=False,
-            )
-        except (ApiException, v3.rest.ApiException) as ex:
-            if ex.status == 401:
-                orcid_token = self.get_token()
-                if orcid_token:
-                    orcid_token.delete_instance()
+        """Fetch the user profile record.
+
+        Within :func:`profile_cache` block the record gets fetched from ORCID only once
+        (until the profile is modified).
+        """
+        cache = _profile_cache.get()
+        key = (self.version, self.org.id if self.org else None)
+        data = cache.get(self.user.orcid, key) if cache else None
+        if data is None:
+            try:
+                resp, code, headers = self.api_client.call_api(
+                    f"/{self.version}/{self.user.orcid}",
+                    "GET",
+                    header_params={"Accept": self.content_type},
+                    response_type=None,
+                    auth_settings=["orcid_auth"],
+                    _preload_content=False,
+                )
+            except (ApiException, v3.rest.ApiException) as ex:
+                if ex.status == 401:
+                    orcid_token = self.get_token()
+                    if orcid_token:
+                        orcid_token.delete_instance()
+                    else:
+                        app.logger.exception("Exception occurred while retrieving ORCID Token")
                 else:
-                    app.logger.exception("Exception occurred while retrieving ORCID Token")
-                    return None
-            app.logger.error(f"ApiException Occurred: {ex}")
-            return None
+                    app.logger.error(f"ApiException Occurred: {ex}")
+                raise
 
-        if code != 200:
-            app.logger.error(f"Failed to retrieve ORDIC profile. Code: {code}.")
-            app.logger.info(f"Headers: {headers}")
-            app.logger.info(f"Body: {resp.data.decode()}")
-            return None
+            if code != 200:
+                app.logger.error(f"Failed to retrieve ORDIC profile. Code: {code}.")
+                app.logger.info(f"Headers: {headers}")
+                app.logger.info(f"Body: {resp.data.decode()}")
+                return None
+
+            data = resp.data.decode()
+            if cache:
+                cache.set(self.user.orcid, key, data)
 
-        return json.loads(resp.data.decode(), object_pairs_hook=NestedDict)
+        return json.loads(data, object_pairs_hook=NestedDict)
 
     def get_resources(self):
         """Fetch all research resources linked to the user profile."""
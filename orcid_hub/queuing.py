@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-  # noqa
 """Quequeing."""
 
+import json
 import logging
+from hashlib import sha1
+from threading import Lock
 from time import sleep, time
 
 import rq_dashboard
+from redis.exceptions import RedisError
 from flask import abort
 from flask_login import current_user
 from flask_rq2 import RQ
+from rq import worker as rq_worker
 
 from . import app, models
 
@@ -17,37 +22,11 @@ __redis_available = bool(REDIS_URL)
 
 if __redis_available:
     try:
-        from rq import Queue as _Queue
         import redis
 
         with redis.Redis.from_url(REDIS_URL, socket_connect_timeout=1) as r:
             r.ping()
 
-        class ThrottledQueue(_Queue):
-            """Queue with throttled deque."""
-
-            # Default rate limit per sec (20 messages/sec)
-            # NB! the rate should be greater than 1.0
-            DEFAULT_RATE = 20.0
-            rate = DEFAULT_RATE
-            _allowance = rate
-            _last_check = time()
-
-            @classmethod
-            def dequeue_any(cls, *args, **kwargs):
-                """Dequeue the messages with throttling."""
-                current = time()
-                time_passed = current - cls._last_check
-                cls._last_check = time()
-                cls._allowance += time_passed * cls.rate
-                if cls._allowance > cls.rate:
-                    cls._allowance = cls.rate
-                if cls._allowance < 1.0:
-                    # wait...
-                    sleep(1.0 - (cls._allowance / cls.rate))
-                    cls._allowance = cls.rate
-                return _Queue.dequeue_any(*args, **kwargs)
-
         # app.config.from_object(rq_dashboard.default_settings)
     except:
         __redis_available = False
@@ -58,16 +37,379 @@ if not __redis_available:
     ] = "fakeredis.FakeStrictRedis"
     app.config.RQ_ASYNC = app.config["RQ_ASYNC"] = False
 
-    if "RQ_QUEUE_CLASS" in app.config:
-        del app.config["RQ_QUEUE_CLASS"]
     if "REDIS_URL" in app.config:
         del app.config["REDIS_URL"]
     if "RQ_REDIS_URL" in app.config:
         del app.config["RQ_REDIS_URL"]
 
+
+class Worker(rq_worker.Worker):
+    """RQ worker that writes the buffered ORCID API call audit entries at the end of each job.
+
+    The work-horses exit with *os._exit*, so the entries buffered by a job would get lost.
+    """
+
+    def perform_job(self, *args, **kwargs):  # noqa: D102
+        try:
+            return super().perform_job(*args, **kwargs)
+        finally:
+            from .orcid_client import api_call_log
+
+            api_call_log.flush()
+
+
+app.config.setdefault("RQ_WORKER_CLASS", "orcid_hub.queuing.Worker")
 rq = RQ(app)
 
 
+class RateLimiter:
+    """Token bucket rate limiter shared by all the workers and the web app processes.
+
+    The buckets are kept in Redis and updated atomically by a Lua script. A call
+    draws a token from the global bucket and, if the organisation is given and
+    the per-organisation limit is set, from the organisation bucket. The tokens
+    get reserved ahead (the bucket can go negative), so the callers wait for their
+    turn instead of polling Redis. If Redis is not available, the buckets are kept
+    in the process memory.
+    """
+
+    # KEYS: the bucket keys; ARGV: the rate and the burst per key, optionally followed by
+    # the current time. NB! by default the time is taken from the Redis server clock,
+    # so the buckets are not affected by the clock skew of the hosts. The script effects
+    # replication (Redis < 5) is required for the non-deterministic TIME command followed
+    # by the writes.
+    SCRIPT = """
+        local now = tonumber(ARGV[#KEYS * 2 + 1])
+        if not now then
+            if redis.replicate_commands then
+                redis.replicate_commands()
+            end
+            local t = redis.call("TIME")
+            now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        end
+        local delay = 0
+        for i, key in ipairs(KEYS) do
+            local rate = tonumber(ARGV[i * 2 - 1])
+            local burst = tonumber(ARGV[i * 2])
+            local bucket = redis.call("HMGET", key, "tokens", "ts")
+            local tokens = tonumber(bucket[1]) or burst
+            local ts = tonumber(bucket[2]) or now
+            tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+            if tokens < 0 then
+                delay = math.max(delay, -tokens / rate)
+            end
+            redis.call("HMSET", key, "tokens", tokens, "ts", math.max(ts, now))
+            redis.call("PEXPIRE", key, math.ceil((burst - tokens) / rate * 1000) + 1000)
+        end
+        return tostring(delay)
+    """
+
+    def __init__(
+        self,
+        rate=None,
+        burst=None,
+        org_rate=None,
+        org_burst=None,
+        key="orcidhub:ratelimit",
+        connection=None,
+        clock=None,
+    ):
+        """Set up the limiter allowing *rate* calls per second with bursts up to *burst* calls.
+
+        Args:
+            rate (float): the global rate limit (calls/sec), if not set there is no limit.
+            burst (int): the global bucket size.
+            org_rate (float): the rate limit (calls/sec) per organisation.
+            org_burst (int): the bucket size per organisation.
+            key (str): the Redis key (prefix) of the buckets.
+            connection: Redis connection (default: the RQ connection).
+            clock: the function returning the current time (sec) used to update the shared
+                buckets (default: the Redis server clock).
+
+        """
+        self.rate = rate
+        self.burst = burst or rate or 1
+        self.org_rate = org_rate
+        self.org_burst = org_burst or org_rate or 1
+        self.key = key
+        self._connection = connection
+        self.clock = clock
+        self._script = None
+        self._buckets = {}
+        self._lock = Lock()
+
+    @property
+    def connection(self):
+        """Get the Redis connection."""
+        return self._connection or rq.connection
+
+    def buckets(self, org_id=None):
+        """Get the list of (key, rate, burst) of the buckets to draw a token from."""
+        buckets = [(self.key, self.rate, self.burst)] if self.rate else []
+        if org_id and self.org_rate:
+            buckets.append((f"{self.key}:{org_id}", self.org_rate, self.org_burst))
+        return buckets
+
+    def reserve(self, org_id=None):
+        """Take a token from the buckets and return the time (sec) to wait for it."""
+        buckets = self.buckets(org_id)
+        if not buckets:
+            return 0
+        try:
+            if not self._script:
+                self._script = self.connection.register_script(self.SCRIPT)
+            args = [v for _, rate, burst in buckets for v in (rate, burst)]
+            if self.clock:
+                args.append(self.clock())
+            return float(self._script(keys=[k for k, _, _ in buckets], args=args))
+        except RedisError:
+            app.logger.exception("Failed to reserve a token, falling back to the local buckets.")
+
+        now, delay = time(), 0
+        with self._lock:
+            for key, rate, burst in buckets:
+                tokens, ts = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + max(0, now - ts) * rate) - 1
+                if tokens < 0:
+                    delay = max(delay, -tokens / rate)
+                self._buckets[key] = (tokens, max(ts, now))
+        return delay
+
+    def acquire(self, org_id=None):
+        """Take a token waiting until one becomes available."""
+        delay = self.reserve(org_id)
+        if delay > 0:
+            sleep(delay)
+
+
+rate_limiter = RateLimiter(
+    app.config.get("ORCID_API_RATE_LIMIT"),
+    app.config.get("ORCID_API_RATE_BURST"),
+    app.config.get("ORCID_API_ORG_RATE_LIMIT"),
+    app.config.get("ORCID_API_ORG_RATE_BURST"),
+)
+
+
+class ProxyCache:
+    """Shared (Redis) cache of ORCID API proxy GET responses.
+
+    The entries are kept per ORCID iD, so all the cached responses of a profile
+    can be removed when the profile gets modified. A cached response is served
+    without contacting ORCID for *max_age* seconds, after that it gets revalidated
+    with a conditional request (If-None-Match or If-Modified-Since).
+    """
+
+    # KEYS: the entry key; ARGV: the revalidation time and the TTL.
+    # NB! the entry can get invalidated while it is being revalidated, so it gets
+    # updated only if it still exists.
+    TOUCH_SCRIPT = """
+        if redis.call("EXISTS", KEYS[1]) == 1 then
+            redis.call("HSET", KEYS[1], "checked_at", ARGV[1])
+            redis.call("EXPIRE", KEYS[1], ARGV[2])
+            return 1
+        end
+        return 0
+    """
+
+    def __init__(
+        self, ttl=86400, max_age=60, max_size=1048576, key="orcidhub:proxy", connection=None
+    ):
+        """Set up the cache.
+
+        Args:
+            ttl (int): the time (sec) the responses are kept in the cache (0 - no caching).
+            max_age (int): the time (sec) a response is served without the revalidation.
+            max_size (int): the maximum size of the cached responses.
+            key (str): the Redis key (prefix) of the entries.
+            connection: Redis connection (default: the RQ connection).
+
+        """
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_size = max_size
+        self.key = key
+        self._connection = connection
+        self._touch_script = None
+
+    @property
+    def connection(self):
+        """Get the Redis connection."""
+        return self._connection or rq.connection
+
+    def entry_key(self, orcid, *variant):
+        """Get the key of the entry of the request variant (version, path, scopes, etc.)."""
+        return f"{self.key}:{orcid}:" + sha1(repr(variant).encode()).hexdigest()
+
+    def get(self, orcid, *variant):
+        """Get the cached response (status, headers, body, etag, last-modified, checked-at)."""
+        if not self.ttl:
+            return None
+        try:
+            entry = self.connection.hgetall(self.entry_key(orcid, *variant))
+        except RedisError:
+            app.logger.exception("Failed to retrieve a cached response.")
+            return None
+        entry = {k.decode(): v for k, v in entry.items()}
+        if not all(k in entry for k in ["status", "headers", "body", "checked_at"]):
+            # missing or incomplete (e.g., partially removed) entry:
+            return None
+        entry["status"] = int(entry["status"])
+        entry["headers"] = json.loads(entry["headers"])
+        entry["checked_at"] = float(entry["checked_at"])
+        for k in ["etag", "last_modified"]:
+            entry[k] = entry[k].decode() if entry.get(k) else None
+        return entry
+
+    def is_fresh(self, entry):
+        """Test if the cached response can be served without the revalidation."""
+        return time() - entry["checked_at"] < self.max_age
+
+    def set(self, orcid, *variant, status, headers, body, etag=None, last_modified=None):
+        """Store the response."""
+        if not self.ttl or len(body) > self.max_size:
+            return
+        key = self.entry_key(orcid, *variant)
+        try:
+            with self.connection.pipeline() as pipe:
+                pipe.delete(key)
+                pipe.hmset(key, dict(
+                    status=status,
+                    headers=json.dumps(headers),
+                    body=body,
+                    etag=etag or '',
+                    last_modified=last_modified or '',
+                    checked_at=time(),
+                ))
+                pipe.expire(key, self.ttl)
+                pipe.sadd(f"{self.key}:{orcid}", key)
+                pipe.expire(f"{self.key}:{orcid}", self.ttl)
+                pipe.execute()
+        except RedisError:
+            app.logger.exception("Failed to cache a response.")
+
+    def touch(self, orcid, *variant):
+        """Mark the cached response revalidated (unless it was removed in the meantime)."""
+        if not self.ttl:
+            return
+        try:
+            if not self._touch_script:
+                self._touch_script = self.connection.register_script(self.TOUCH_SCRIPT)
+            self._touch_script(keys=[self.entry_key(orcid, *variant)], args=[time(), self.ttl])
+        except RedisError:
+            app.logger.exception("Failed to update a cached response.")
+
+    def invalidate(self, orcid):
+        """Remove all the cached responses of the profile."""
+        if not self.ttl or not orcid:
+            return
+        try:
+            keys = self.connection.smembers(f"{self.key}:{orcid}")
+            self.connection.delete(f"{self.key}:{orcid}", *keys)
+        except RedisError:
+            app.logger.exception(f"Failed to invalidate the cached responses of {orcid}.")
+
+    def count(self, event):
+        """Increment the counter of the cache *event* (hit, miss, revalidated)."""
+        try:
+            self.connection.hincrby(f"{self.key}:stats", event)
+        except RedisError:
+            pass
+
+    def stats(self):
+        """Get the counters of the cache events."""
+        try:
+            return {
+                k.decode(): int(v)
+                for k, v in self.connection.hgetall(f"{self.key}:stats").items()
+            }
+        except RedisError:
+            return {}
+
+
+proxy_cache = ProxyCache(
+    app.config.get("ORCID_PROXY_CACHE_TTL", 86400),
+    app.config.get("ORCID_PROXY_CACHE_MAX_AGE", 60),
+    app.config.get("ORCID_PROXY_CACHE_MAX_SIZE", 1048576),
+)
+
+
+class TokenCache:
+    """Short-lived process local cache of the resolved access tokens.
+
+    The entries are kept in the memory of the process for *ttl* seconds. Any revocation
+    (see :meth:`purge`) bumps the shared (Redis) generation of the cache, so the entries
+    cached by all the processes get discarded on their next lookup.
+    """
+
+    def __init__(self, ttl=30, max_size=10000, key="orcidhub:tokens", connection=None):
+        """Set up the cache.
+
+        Args:
+            ttl (int): the time (sec) the entries are kept in the cache (0 - no caching).
+            max_size (int): the maximum number of the entries.
+            key (str): the Redis key of the cache generation.
+            connection: Redis connection (default: the RQ connection).
+
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.key = key
+        self._connection = connection
+        self._entries = {}
+        self._lock = Lock()
+
+    @property
+    def connection(self):
+        """Get the Redis connection."""
+        return self._connection or rq.connection
+
+    def generation(self):
+        """Get the current generation of the cache (None if it cannot be retrieved)."""
+        try:
+            return int(self.connection.get(f"{self.key}:generation") or 0)
+        except RedisError:
+            app.logger.exception("Failed to retrieve the token cache generation.")
+            return None
+
+    def get(self, key, loader):
+        """Get the cached value or load it with *loader* and cache it if it's not None."""
+        if not self.ttl:
+            return loader()
+        generation = self.generation()
+        if generation is None:
+            return loader()
+        now = time()
+        entry = self._entries.get(key)
+        if entry and entry[0] == generation and entry[1] > now:
+            return entry[2]
+        value = loader()
+        if value is not None:
+            with self._lock:
+                if len(self._entries) >= self.max_size:
+                    self._entries = {k: e for k, e in self._entries.items() if e[1] > now}
+                    if len(self._entries) >= self.max_size:
+                        self._entries.clear()
+                self._entries[key] = (generation, now + self.ttl, value)
+        return value
+
+    def purge(self):
+        """Discard all the cached entries in every process."""
+        with self._lock:
+            self._entries.clear()
+        if not self.ttl:
+            return
+        try:
+            self.connection.incr(f"{self.key}:generation")
+        except RedisError:
+            app.logger.exception("Failed to purge the token cache.")
+
+
+token_cache = TokenCache(
+    app.config.get("TOKEN_CACHE_TTL", 30),
+    app.config.get("TOKEN_CACHE_MAX_SIZE", 10000),
+)
+
+
 @rq_dashboard.blueprint.before_request
 def restrict_rq(*args, **kwargs):
     """Restrict access to RQ-Dashboard."""
@@ -14,3 +14,4 @@ def setup():
     # NB! add result_ttl! Otherwise it won't get rescheduled
     tasks.process_tasks.schedule(datetime.utcnow(), interval=3600, result_ttl=-1, job_id="*PROCESS-TASKS*")
     tasks.send_orcid_update_summary.cron("0 0 1 * *", "*ORCID-UPDATE-SUMMARY*")
+    tasks.maintain_orcid_api_call_log.cron("0 2 * * *", "*ORCID-API-CALL-LOG-MAINTENANCE*")
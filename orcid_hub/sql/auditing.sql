@@ -15,6 +15,7 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- NB! ORCID API call log (orcid_api_call) is append-only and doesn't need an audit trail:
 DROP TABLE IF EXISTS audit.orcid_api_call;
 DROP TABLE IF EXISTS audit.orcid_authorize_call;
 DROP TABLE IF EXISTS audit.task;
@@ -0,0 +1,82 @@
+/* Monthly range partitioning of ORCID API call log (orcid_api_call) on called_at: */
+
+CREATE OR REPLACE FUNCTION orcid_api_call_create_partition(p_month date) RETURNS text AS $$
+DECLARE
+	v_from date := date_trunc('month', p_month);
+	v_name text := 'orcid_api_call_' || to_char(v_from, 'YYYY_MM');
+BEGIN
+	IF to_regclass(v_name) IS NULL THEN
+		-- compress (and move out of the row) the request and the response bodies above 128B:
+		EXECUTE format('CREATE TABLE %I PARTITION OF orcid_api_call
+			FOR VALUES FROM (%L) TO (%L) WITH (toast_tuple_target = 128);',
+			v_name, v_from, v_from + interval '1 month');
+		BEGIN
+			EXECUTE format('ALTER TABLE %I ALTER COLUMN body SET COMPRESSION lz4,
+				ALTER COLUMN response SET COMPRESSION lz4;', v_name);
+		EXCEPTION WHEN feature_not_supported THEN
+			RAISE NOTICE 'LZ4 is not supported, the default compression is used for %', v_name;
+		END;
+		RAISE NOTICE 'Created partition %', v_name;
+	END IF;
+	RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+/* Create the partitions for the upcoming months and drop the ones
+ * older than the given number of months (0 - keep all the entries): */
+CREATE OR REPLACE FUNCTION orcid_api_call_maintain(
+	p_retention integer DEFAULT 0, p_premake integer DEFAULT 2) RETURNS void AS $$
+DECLARE r RECORD; v_cutoff timestamp;
+BEGIN
+	FOR i IN 0..p_premake LOOP
+		PERFORM orcid_api_call_create_partition((now() + make_interval(months => i))::date);
+	END LOOP;
+	IF p_retention > 0 THEN
+		v_cutoff := date_trunc('month', now()) - make_interval(months => p_retention);
+		FOR r IN (SELECT c.relname,
+				substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \(''([^'']+)''\)')::timestamp
+					AS upper_bound
+			FROM pg_inherits AS inh JOIN pg_class AS c ON c.oid = inh.inhrelid
+			WHERE inh.inhparent = 'orcid_api_call'::regclass) LOOP
+			IF r.upper_bound <= v_cutoff THEN
+				EXECUTE format('DROP TABLE %I;', r.relname);
+				RAISE NOTICE 'Dropped partition %', r.relname;
+			END IF;
+		END LOOP;
+	END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+/* Convert the existing table into a partitioned one attaching all the calls logged before
+ * the current month as a single partition (the table gets locked till the check of the rows
+ * is completed). The calls of the current (and any later) month get moved into the monthly
+ * partitions beforehand: */
+DO $$
+DECLARE v_start date := date_trunc('month', now()); r RECORD;
+BEGIN
+	IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('orcid_api_call')) = 'r' THEN
+		ALTER TABLE orcid_api_call RENAME TO orcid_api_call_legacy;
+		CREATE TABLE orcid_api_call (
+			LIKE orcid_api_call_legacy INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMPRESSION,
+			PRIMARY KEY (id, called_at),
+			FOREIGN KEY (user_id) REFERENCES "user"(id) ON DELETE SET NULL
+		) PARTITION BY RANGE (called_at);
+		EXECUTE format('ALTER TABLE orcid_api_call OWNER TO %I;', (SELECT tableowner
+			FROM pg_tables WHERE schemaname = 'public' AND tablename = 'orcid_api_call_legacy'));
+		ALTER SEQUENCE orcid_api_call_id_seq OWNED BY orcid_api_call.id;
+		PERFORM orcid_api_call_create_partition(v_start);
+		FOR r IN (SELECT DISTINCT date_trunc('month', called_at)::date AS month
+			FROM orcid_api_call_legacy WHERE called_at >= v_start) LOOP
+			PERFORM orcid_api_call_create_partition(r.month);
+		END LOOP;
+		INSERT INTO orcid_api_call SELECT * FROM orcid_api_call_legacy WHERE called_at >= v_start;
+		DELETE FROM orcid_api_call_legacy WHERE called_at >= v_start;
+		ALTER TABLE orcid_api_call
+			ATTACH PARTITION orcid_api_call_legacy FOR VALUES FROM (MINVALUE) TO (v_start);
+	END IF;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS orcid_api_call_called_at_idx ON orcid_api_call(called_at DESC);
+CREATE INDEX IF NOT EXISTS orcid_api_call_user_id_idx ON orcid_api_call(user_id);
+SELECT orcid_api_call_maintain();
@@ -6,12 +6,19 @@ import logging
 import os
 import random
 import re
+import socket
 import string
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
 from datetime import date, datetime, timedelta
+from functools import partial
+from io import BytesIO
 from itertools import filterfalse, groupby
 from urllib.parse import quote, urlencode, urlparse
+from uuid import uuid4
 
 import emails
 import flask
@@ -21,24 +28,27 @@ from flask import request, url_for
 from flask_login import current_user
 from html2text import html2text
 from jinja2 import Template
-from peewee import JOIN
+from peewee import JOIN, Case, chunked, fn
 from yaml.dumper import Dumper
 from yaml.representer import SafeRepresenter
 
 from orcid_api_v3.rest import ApiException
+from rq import get_current_job
 
-from . import app, db, orcid_client, rq
+from . import app, db, models, orcid_client, rq
 from .models import (
     AFFILIATION_TYPES,
     Affiliation,
     AffiliationRecord,
     Delegate,
+    File,
     FundingInvitee,
     FundingRecord,
     Invitee,
     Log,
     MailLog,
     MessageRecord,
+    ModelExceptionError,
     NestedDict,
     OrcidApiCall,
     OrcidToken,
@@ -61,8 +71,10 @@ from .models import (
     WorkInvitee,
     WorkRecord,
     get_val,
+    open_upload,
     readup_file,
 )
+from .queuing import rate_limiter, token_cache
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -123,16 +135,130 @@ def is_valid_url(url):
         return False
 
 
-def read_uploaded_file(form):
-    """Read up the whole content and deconde it and return the whole content."""
+def read_uploaded_file(form, stream=False):
+    """Read up the whole content and deconde it and return the whole content.
+
+    If *stream* is True, return the text stream decoding the file incrementally instead.
+    """
     if "file_" not in request.files:
         return
+    if stream:
+        return open_upload(request.files[form.file_.name])
     content = readup_file(request.files[form.file_.name])
     if content:
         return content
     raise ValueError("Unable to decode encoding.")
 
 
+def load_upload(source, filename, loader, task_type, mimetype=None, org=None, **kwargs):
+    """Store the upload and load the task records from it with a background job.
+
+    Args:
+        source: the uploaded file or its content (bytes).
+        filename (str): the name of the uploaded file.
+        loader (str): the record loader, e.g., "FundingRecord.load_from_csv".
+        task_type (TaskType): the type of the task.
+        mimetype (str): the MIME type of the uploaded file.
+        org (Organisation): the organisation of the task (default: the current user organisation).
+        kwargs: extra keyword arguments passed to the loader.
+
+    Returns:
+        Task: the task, that is still being loaded, unless the job was run synchronously.
+
+    Raises:
+        ModelExceptionError: if the job was run synchronously and failed to load the records.
+
+    """
+    data = source if isinstance(source, bytes) else source.read()
+    with db.atomic():
+        upload = File.create(
+            filename=filename[-100:],
+            data=data,
+            mimetype=(mimetype or "application/octet-stream")[:30],
+        )
+        task = Task.create(
+            org=org or current_user.organisation,
+            filename=filename,
+            task_type=task_type,
+            file=upload,
+            loading_state="LOADING",
+        )
+    job = load_task_file.queue(
+        task.id,
+        loader,
+        job_id=task.loading_job_id,
+        timeout=app.config.get("UPLOAD_JOB_TIMEOUT") or 3600,
+        **kwargs,
+    )
+
+    task = Task.get(job.result or task.id)
+    if task.loading_state == "FAILED":
+        task.delete_instance()
+        raise ModelExceptionError(task.loading_error)
+    return task
+
+
+@rq.job(timeout=3600)
+def load_task_file(task_id, loader, **kwargs):
+    """Load the task records from the upload stored with the task.
+
+    Args:
+        task_id (int): the ID of the task created for the upload.
+        loader (str): the record loader, e.g., "FundingRecord.load_from_csv".
+        kwargs: extra keyword arguments passed to the loader.
+
+    Returns:
+        int: the ID of the task the records were loaded into.
+
+    """
+    task = Task.get(task_id)
+    upload = task.file
+    model_name, method = loader.split(".")
+    load = getattr(getattr(models, model_name), method)
+    try:
+        if method == "load_from_csv":
+            source = open_upload(BytesIO(upload.data))
+        else:
+            source = readup_file(BytesIO(upload.data))
+            if source is None:
+                raise ValueError("Unable to decode encoding.")
+        loaded_task = load(source, filename=task.filename, org=task.org, task=task, **kwargs)
+    except Exception as ex:
+        app.logger.exception(f"Failed to load the records of the task {task_id} from the upload.")
+        job = get_current_job()
+        task.loading_state = "FAILED"
+        task.rows_parsed = job.meta.get("rows_parsed", 0) if job else 0
+        task.rows_failed = 1
+        task.loading_error = str(ex)
+    else:
+        if loaded_task.id != task.id:
+            # the records were loaded into the task the upload was exported from:
+            task.file = None
+            task.delete_instance()
+            task = loaded_task
+        task.loading_state = "LOADED"
+        task.rows_parsed = task.record_count
+        task.rows_failed = 0
+    task.file = None
+    task.save()
+    upload.delete_instance()
+    return task.id
+
+
+def get_loading_status(task):
+    """Get the loading state and the progress of the task loaded from an upload."""
+    status = dict(
+        loading_state=task.loading_state,
+        rows_parsed=task.rows_parsed,
+        rows_failed=task.rows_failed,
+        loading_error=task.loading_error,
+    )
+    if task.loading_state == "LOADING":
+        job = rq.get_queue().fetch_job(task.loading_job_id)
+        status["rows_parsed"] = job.meta.get("rows_parsed", 0) if job else 0
+    return status
+
+
 def send_email(
     template,
     recipient,
@@ -358,6 +484,60 @@ def is_org_rec(org, rec):
     return source_client_id and source_client_id.get("path") == client_id
 
 
+_batch_entries = ContextVar("batch_entries", default=None)
+
+
+@contextmanager
+def batch_entries():
+    """Defer the write-back of the batch task entries saved within the block until its end.
+
+    The nested blocks share the outermost block entries.
+    """
+    entries = _batch_entries.get()
+    if entries is not None:
+        yield entries
+        return
+    entries = []
+    token = _batch_entries.set(entries)
+    try:
+        yield entries
+    finally:
+        _batch_entries.reset(token)
+        save_batch_entries(entries)
+
+
+def save_batch_entries(entries):
+    """Write back the modified batch task entries (the records and the invitees) in bulk.
+
+    The entries get written with a single UPDATE statement per model and the tasks
+    of the modified entries get marked as updated. Within :func:`batch_entries` block
+    the entries get written at the end of the block.
+    """
+    deferred = _batch_entries.get()
+    if deferred is not None:
+        deferred.extend(entries)
+        return
+    entries_by_model = defaultdict(dict)
+    for e in entries:
+        if e.is_dirty():
+            entries_by_model[type(e)][e.id] = e
+    if not entries_by_model:
+        return
+    task_ids = set()
+    with db.atomic():
+        for model, rows in entries_by_model.items():
+            rows = list(rows.values())
+            fields = {f.name: f for e in rows for f in e.dirty_fields}
+            model.bulk_update(rows, fields=list(fields.values()))
+            for e in rows:
+                e._dirty.clear()
+            if "task" in model._meta.fields:
+                task_ids.update(e.task_id for e in rows)
+            else:
+                Task.mark_updated(model.task_id_query(model.id.in_([e.id for e in rows])))
+        Task.mark_updated(task_ids)
+
+
 def create_or_update_work(user, org_id, records, *args, **kwargs):
     """Create or update work record of a user."""
     records = list(unique_everseen(records, key=lambda t: t.record.id))
@@ -396,7 +576,6 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
                 ):
                     invitee.put_code = put_code
                     invitee.visibility = r.get("visibility")
-                    invitee.save()
                     taken_put_codes.add(put_code)
                     app.logger.debug(
                         f"put-code {put_code} was asigned to the work record "
@@ -410,6 +589,7 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
             match_put_code(works, wr, wi)
 
         for task_by_user in records:
+            wr = task_by_user.record
             wi = task_by_user.record.invitee
 
             try:
@@ -424,6 +604,8 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
                     wi.visibility = visibility
 
             except Exception as ex:
+                if schedule_retry(task_by_user, wi, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 exception_msg = json.loads(ex.body) if hasattr(ex, "body") else str(ex)
                 wi.add_status_line(f"Exception occured processing the record: {exception_msg}.")
@@ -432,9 +614,9 @@ def create_or_update_work(user, org_id, records, *args, **kwargs):
                 )
 
             finally:
-                wi.processed_at = datetime.utcnow()
-                wr.save()
-                wi.save()
+                if not wi.is_deferred:
+                    wi.processed_at = datetime.utcnow()
+                save_batch_entries([wr, wi])
     else:
         # TODO: Invitation resend in case user revokes organisation permissions
         app.logger.debug("Should resend an invite to the researcher asking for permissions")
@@ -485,7 +667,6 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
                     == record.review_group_id.lower()
                 ):  # noqa: E127
                     invitee.put_code = put_code
-                    invitee.save()
                     taken_put_codes.add(put_code)
                     app.logger.debug(
                         f"put-code {put_code} was asigned to the peer review record "
@@ -521,6 +702,8 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
                     pi.visibility = visibility
 
             except Exception as ex:
+                if schedule_retry(task_by_user, pi, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 exception_msg = json.loads(ex.body) if hasattr(ex, "body") else str(ex)
                 pi.add_status_line(f"Exception occured processing the record: {exception_msg}.")
@@ -529,9 +712,9 @@ def create_or_update_peer_review(user, org_id, records, *args, **kwargs):
                 )
 
             finally:
-                pi.processed_at = datetime.utcnow()
-                pr.save()
-                pi.save()
+                if not pi.is_deferred:
+                    pi.processed_at = datetime.utcnow()
+                save_batch_entries([pr, pi])
     else:
         # TODO: Invitation resend in case user revokes organisation permissions
         app.logger.debug("Should resend an invite to the researcher asking for permissions")
@@ -578,7 +761,6 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
                 ):
                     invitee.put_code = put_code
                     invitee.visibility = r.get("visibility")
-                    invitee.save()
                     taken_put_codes.add(put_code)
                     app.logger.debug(
                         f"put-code {put_code} was asigned to the funding record "
@@ -591,6 +773,7 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
             fi = task_by_user.record.invitee
             match_put_code(fundings, fr, fi)
         for task_by_user in records:
+            fr = task_by_user.record
             fi = task_by_user.record.invitee
 
             try:
@@ -605,6 +788,8 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
                     fi.visibility = visibility
 
             except Exception as ex:
+                if schedule_retry(task_by_user, fi, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 if ex and hasattr(ex, "body"):
                     exception_msg = json.loads(ex.body)
@@ -616,9 +801,9 @@ def create_or_update_funding(user, org_id, records, *args, **kwargs):
                 )
 
             finally:
-                fi.processed_at = datetime.utcnow()
-                fr.save()
-                fi.save()
+                if not fi.is_deferred:
+                    fi.processed_at = datetime.utcnow()
+                save_batch_entries([fr, fi])
     else:
         # TODO: Invitation resend in case user revokes organisation permissions
         app.logger.debug("Should resend an invite to the researcher asking for permissions")
@@ -719,6 +904,8 @@ def create_or_update_resources(user, org_id, records, *args, **kwargs):
                     rr.visibility = visibility
 
             except ApiException as ex:
+                if schedule_retry(t, rr, ex):
+                    continue
                 if ex.status == 404:
                     rr.put_code = None
                 elif ex.status == 401:
@@ -726,12 +913,15 @@ def create_or_update_resources(user, org_id, records, *args, **kwargs):
                 logger.exception(f"Exception occured {ex}")
                 rr.add_status_line(f"ApiException: {ex}")
             except Exception as ex:
+                if schedule_retry(t, rr, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 rr.add_status_line(f"Exception occured processing the record: {ex}.")
 
             finally:
-                rr.processed_at = datetime.utcnow()
-                rr.save()
+                if not rr.is_deferred:
+                    rr.processed_at = datetime.utcnow()
+                save_batch_entries([rr])
     else:
         # TODO: Invitation resend in case user revokes organisation permissions
         app.logger.debug("Should resend an invite to the researcher asking for permissions")
@@ -1037,6 +1227,7 @@ def send_user_invitation(
                 )
                 .execute()
             )
+            Task.mark_updated([task_id])
         elif task_type in [TaskType.FUNDING, TaskType.WORK, TaskType.PEER_REVIEW]:
             task = Task.get(task_id)
             for record in task.records.where(task.record_model.is_active):
@@ -1044,6 +1235,7 @@ def send_user_invitation(
                 invitee_class.update(status=status).where(
                     invitee_class.record == record.id, invitee_class.email == email
                 ).execute()
+            Task.mark_updated([task_id])
         return ui
 
     except Exception as ex:
@@ -1168,7 +1360,8 @@ def create_or_update_properties(user, org_id, records, *args, **kwargs):
                     )
                     break
 
-        for rr in (t.record for t in records):
+        for t in records:
+            rr = t.record
             try:
                 match_put_code(rr)
                 if rr.type == "URL":
@@ -1197,6 +1390,8 @@ def create_or_update_properties(user, org_id, records, *args, **kwargs):
                 if rr.visibility != visibility:
                     rr.visibility = visibility
             except ApiException as ex:
+                if schedule_retry(t, rr, ex):
+                    continue
                 if ex.status == 404:
                     rr.put_code = None
                 elif ex.status == 401:
@@ -1204,12 +1399,15 @@ def create_or_update_properties(user, org_id, records, *args, **kwargs):
                 logger.exception(f"Exception occured {ex}")
                 rr.add_status_line(f"ApiException: {ex}")
             except Exception as ex:
+                if schedule_retry(t, rr, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 rr.add_status_line(f"Exception occured processing the record: {ex}.")
 
             finally:
-                rr.processed_at = datetime.utcnow()
-                rr.save()
+                if not rr.is_deferred:
+                    rr.processed_at = datetime.utcnow()
+                save_batch_entries([rr])
     else:
         # TODO: Invitation resend in case user revokes organisation permissions
         app.logger.debug("Should resend an invite to the researcher asking for permissions")
@@ -1298,6 +1496,8 @@ def create_or_update_other_id(user, org_id, records, *args, **kwargs):
                 if rr.visibility != visibility:
                     rr.visibility = visibility
             except ApiException as ex:
+                if schedule_retry(task_by_user, rr, ex):
+                    continue
                 if ex.status == 404:
                     rr.put_code = None
                 elif ex.status == 401:
@@ -1305,12 +1505,15 @@ def create_or_update_other_id(user, org_id, records, *args, **kwargs):
                 logger.exception(f"Exception occured {ex}")
                 rr.add_status_line(f"ApiException: {ex}")
             except Exception as ex:
+                if schedule_retry(task_by_user, rr, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 rr.add_status_line(f"Exception occured processing the record: {ex}.")
 
             finally:
-                rr.processed_at = datetime.utcnow()
-                rr.save()
+                if not rr.is_deferred:
+                    rr.processed_at = datetime.utcnow()
+                save_batch_entries([rr])
     else:
         # TODO: Invitation resend in case user revokes organisation permissions
         app.logger.debug("Should resend an invite to the researcher asking for permissions")
@@ -1453,9 +1656,9 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
                                 f"There is no record with the given put-code {ar.put_code} in the user {user} profile."
                             )
                     except Exception as ex:
-                        ar.add_status_line(f"Exception occured processing the record: {ex}.")
-                        ar.processed_at = datetime.utcnow()
-                        ar.save()
+                        if not schedule_retry(task_by_user, ar, ex):
+                            ar.add_status_line(f"Exception occured processing the record: {ex}.")
+                            ar.processed_at = datetime.utcnow()
                         continue
 
                 if at in EMP_CODES:
@@ -1478,7 +1681,6 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
                         f"Unsupported affiliation type '{at}' allowed values are: "
                         ", ".join(at for at in AFFILIATION_TYPES)
                     )
-                    ar.save()
                     continue
 
                 no_orcid_call = match_put_code(affiliations.get(str(affiliation).lower()), ar)
@@ -1498,12 +1700,15 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
                         ar.visibility = visibility
 
             except Exception as ex:
+                if schedule_retry(task_by_user, ar, ex):
+                    continue
                 logger.exception(f"For {user} encountered exception")
                 ar.add_status_line(f"Exception occured processing the record: {ex}.")
 
             finally:
-                ar.processed_at = datetime.utcnow()
-                ar.save()
+                if not ar.is_deferred:
+                    ar.processed_at = datetime.utcnow()
+                save_batch_entries([ar])
     else:
         for task_by_user in records:
             user = User.get(email=task_by_user.record.email, organisation=task_by_user.org)
@@ -1547,6 +1752,7 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
 
             status = "Exception occured while accessing user's profile. Hence, The invitation resent at "
             status += datetime.utcnow().isoformat(timespec="seconds")
+            Task.mark_updated(AffiliationRecord.task_id_query(AffiliationRecord.email == user.email))
             AffiliationRecord.update(status=AffiliationRecord.status + "\n" + status).where(
                 AffiliationRecord.status.is_null(False), AffiliationRecord.email == user.email
             ).execute()
@@ -1556,43 +1762,84 @@ def create_or_update_affiliations(user, org_id, records, *args, **kwargs):
             return
 
 
-@rq.job(timeout=300)
-def process_work_records(max_rows=20, record_id=None):
-    """Process uploaded work records."""
-    set_server_name()
-    task_ids = set()
-    work_ids = set()
-    """This query is to retrieve Tasks associated with work records, which are not processed but are active"""
+def batch_query(
+    record_model,
+    invitee_model=None,
+    scope="/activities/update",
+    max_rows=20,
+    record_id=None,
+    match_invitation_by_user_email=False,
+    claimed_by=None,
+):
+    """Build the query for retrieving active and not yet processed batch task record rows.
 
-    tasks = (
-        Task.select(
-            Task,
-            WorkRecord,
-            WorkInvitee,
-            User,
-            UserInvitation.id.alias("invitation_id"),
-            OrcidToken,
-        )
-        .where(
-            WorkRecord.processed_at.is_null(),
-            WorkInvitee.processed_at.is_null(),
-            WorkRecord.is_active,
+    Each row is a task instance with the record attached as *record* (and, for the records with
+    multiple invitees, the invitee attached to the record as *invitee*). The matching user is
+    attached to the entity that holds the researcher email and ORCID iD.
+
+    Args:
+        record_model: the batch task record model.
+        invitee_model: the invitee model for records with multiple invitees.
+        scope (str): the required ORCID access token scope.
+        max_rows (int): the maximum number of the rows to retrieve.
+        record_id: a single record ID or a list of the record IDs to restrict the query to.
+        match_invitation_by_user_email (bool): match the sent invitations also by the user email.
+        claimed_by (str): restrict the query to the entries claimed with the claim token
+            (see :func:`claim_batch`).
+
+    Returns:
+        peewee.SelectQuery. The query of the records ordered for grouping by the user.
+
+    """
+    rm = record_model
+    im = invitee_model
+    researcher = im or rm
+
+    query = Task.select(
+        *([Task, rm, im] if im else [Task, rm]),
+        User,
+        UserInvitation.id.alias("invitation_id"),
+        OrcidToken,
+    )
+    if im:
+        query = query.where(
+            rm.processed_at.is_null(),
+            im.processed_at.is_null(),
+            rm.is_active,
             (
                 OrcidToken.id.is_null(False)
+                | ((im.status.is_null()) | (im.status.contains("sent").__invert__()))
+            ),
+        )
+    else:
+        query = query.where(
+            rm.processed_at.is_null(),
+            rm.is_active,
+            (
+                (User.id.is_null(False) & User.orcid.is_null(False) & OrcidToken.id.is_null(False))
                 | (
-                    (WorkInvitee.status.is_null())
-                    | (WorkInvitee.status.contains("sent").__invert__())
+                    (User.id.is_null() | User.orcid.is_null() | OrcidToken.id.is_null())
+                    & UserInvitation.id.is_null()
+                    & (rm.status.is_null() | rm.status.contains("sent").__invert__())
                 )
             ),
         )
-        .join(WorkRecord, on=(Task.id == WorkRecord.task_id), attr="record")
-        .join(WorkInvitee, on=(WorkRecord.id == WorkInvitee.record_id), attr="invitee")
-        .join(
+
+    query = query.join(rm, on=(Task.id == rm.task_id), attr="record")
+    if im:
+        query = query.join(im, on=(rm.id == im.record_id), attr="invitee")
+
+    invitation_email = UserInvitation.email == researcher.email
+    if match_invitation_by_user_email:
+        invitation_email |= UserInvitation.email == User.email
+
+    query = (
+        query.join(
             User,
             JOIN.LEFT_OUTER,
             on=(
-                (User.email == WorkInvitee.email)
-                | ((User.orcid == WorkInvitee.orcid) & (User.organisation_id == Task.org_id))
+                (User.email == researcher.email)
+                | ((User.orcid == researcher.orcid) & (User.organisation_id == Task.org_id))
             ),
         )
         .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
@@ -1604,7 +1851,7 @@ def process_work_records(max_rows=20, record_id=None):
         .join(
             UserInvitation,
             JOIN.LEFT_OUTER,
-            on=((UserInvitation.email == WorkInvitee.email) & (UserInvitation.task_id == Task.id)),
+            on=(invitation_email & (UserInvitation.task_id == Task.id)),
         )
         .join(
             OrcidToken,
@@ -1612,1080 +1859,720 @@ def process_work_records(max_rows=20, record_id=None):
             on=(
                 (OrcidToken.user_id == User.id)
                 & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/activities/update"))
+                & (OrcidToken.scopes.contains(scope))
             ),
         )
     )
 
     if record_id:
-        tasks = tasks.where(WorkRecord.id == record_id)
+        if isinstance(record_id, (list, tuple, set)):
+            query = query.where(rm.id.in_(list(record_id)))
+        else:
+            query = query.where(rm.id == record_id)
 
-    tasks = tasks.order_by(Task.id, Task.org_id, WorkRecord.id, User.id).limit(max_rows)
-    tasks = list(tasks)
+    if claimed_by:
+        query = query.where(researcher.claimed_by == claimed_by)
 
-    for (task_id, org_id, record_id, user), tasks_by_user in groupby(
-        tasks,
-        lambda t: (
-            t.id,
-            t.org_id,
-            t.record.id,
-            (lambda r: r.user if r.user.id else None)(t.record.invitee),
-        ),
-    ):
-        # If we have the token associated to the user then update the work record,
-        # otherwise send him an invite
-        if (
-            user is None
-            or user.orcid is None
-            or not OrcidToken.select()
-            .where(
-                (OrcidToken.user_id == user.id)
-                & (OrcidToken.org_id == org_id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            )
-            .exists()
-        ):  # noqa: E127, E129
-
-            for k, tasks in groupby(
-                tasks_by_user,
-                lambda t: (
-                    t.created_by,
-                    t.org,
-                    t.record.invitee.email,
-                    t.record.invitee.first_name,
-                    t.record.invitee.last_name,
-                ),
-            ):  # noqa: E501
-                email = k[2]
-                try:
-                    send_user_invitation(*k, task_id=task_id)
-                except Exception as ex:
-                    (
-                        WorkInvitee.update(
-                            processed_at=datetime.utcnow(),
-                            status=f"Failed to send an invitation: {ex}.",
-                        ).where(
-                            WorkInvitee.email == email,
-                            WorkInvitee.record_id == record_id,
-                            WorkInvitee.processed_at.is_null(),
-                        )
-                    ).execute()
-        else:
-            create_or_update_work(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-        work_ids.add(record_id)
+    if im:
+        query = query.order_by(Task.id, Task.org_id, rm.id, User.id)
+    else:
+        query = query.order_by(Task.id, Task.org_id, User.id, rm.email, rm.id)
 
-    for record in WorkRecord.select().where(WorkRecord.id << work_ids):
-        # The Work record is processed for all invitees
-        if not (
-            WorkInvitee.select()
-            .where(WorkInvitee.record_id == record.id, WorkInvitee.processed_at.is_null())
-            .exists()
-        ):
-            record.processed_at = datetime.utcnow()
-            if not record.status or "error" not in record.status:
-                record.add_status_line("Work record is processed.")
-            record.save()
+    if max_rows:
+        query = query.limit(max_rows)
+    return query
 
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (Once all records are processed):
-        if not (
-            WorkRecord.select()
-            .where(WorkRecord.task_id == task.id, WorkRecord.processed_at.is_null())
-            .exists()
-        ):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = (
-                WorkRecord.select()
-                .where(WorkRecord.task_id == task.id, WorkRecord.status ** "%error%")
-                .count()
-            )
-            row_count = task.record_count
 
-            with app.app_context():
-                export_url = flask.url_for(
-                    "workrecord.export",
-                    export_type="json",
-                    _scheme="http" if EXTERNAL_SP else "https",
-                    task_id=task.id,
-                    _external=True,
-                )
-                send_email(
-                    "email/work_task_completed.html",
-                    subject="Work Process Update",
-                    recipient=(task.created_by.name, task.created_by.email),
-                    error_count=error_count,
-                    row_count=row_count,
-                    export_url=export_url,
-                    task_name="Work",
-                    filename=task.filename,
-                )
+@contextmanager
+def claim_batch(record_model, invitee_model=None, max_rows=20, lease=None, **kwargs):
+    """Claim a batch of the task record rows for processing by the current worker.
 
+    The entries (the records or, for the records with multiple invitees, the invitees)
+    get marked with a unique claim token and the lease expiry time, so that several
+    workers can process the same tasks concurrently without picking the same entries.
+    On PostgreSQL the entries are locked with "SELECT ... FOR UPDATE SKIP LOCKED", so
+    the entries being claimed by other workers get skipped rather than waited for.
+    On SQLite, which serializes the writes, a single conditional UPDATE is sufficient.
+    The claim gets released on exit; the claims of the crashed workers expire.
 
-@rq.job(timeout=300)
-def process_peer_review_records(max_rows=20, record_id=None):
-    """Process uploaded peer_review records."""
-    set_server_name()
-    task_ids = set()
-    peer_review_ids = set()
-    """This query is to retrieve Tasks associated with peer review records, which are not processed but are active"""
-    tasks = (
-        Task.select(
-            Task,
-            PeerReviewRecord,
-            PeerReviewInvitee,
-            User,
-            UserInvitation.id.alias("invitation_id"),
-            OrcidToken,
-        )
+    Args:
+        record_model: the batch task record model.
+        invitee_model: the invitee model for records with multiple invitees.
+        max_rows (int): the maximum number of the entries to claim.
+        lease (int): the claim lease time in seconds (default: *BATCH_CLAIM_LEASE*).
+        kwargs: the rest of the arguments passed on to :func:`batch_query`.
+
+    Yields:
+        peewee.SelectQuery. The query of the claimed task record rows (see :func:`batch_query`).
+
+    """
+    model = invitee_model or record_model
+    claimed_by = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+    now = datetime.utcnow()
+    claimed_until = now + timedelta(seconds=lease or app.config.get("BATCH_CLAIM_LEASE") or 600)
+
+    candidates = (
+        batch_query(record_model, invitee_model, max_rows=None, **kwargs)
+        .select(model.id)
+        .order_by()
+    )
+    query = (
+        model.select(model.id)
         .where(
-            PeerReviewRecord.processed_at.is_null(),
-            PeerReviewInvitee.processed_at.is_null(),
-            PeerReviewRecord.is_active,
-            (
-                OrcidToken.id.is_null(False)
-                | (
-                    (PeerReviewInvitee.status.is_null())
-                    | (PeerReviewInvitee.status.contains("sent").__invert__())
-                )
-            ),
-        )
-        .join(PeerReviewRecord, on=(Task.id == PeerReviewRecord.task_id), attr="record")
-        .join(
-            PeerReviewInvitee,
-            on=(PeerReviewRecord.id == PeerReviewInvitee.record_id),
-            attr="invitee",
-        )
-        .join(
-            User,
-            JOIN.LEFT_OUTER,
-            on=(
-                (User.email == PeerReviewInvitee.email)
-                | ((User.orcid == PeerReviewInvitee.orcid) & (User.organisation_id == Task.org_id))
-            ),
+            model.id.in_(candidates),
+            model.claimed_until.is_null() | (model.claimed_until < now),
         )
-        .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-        .join(
-            UserOrg,
-            JOIN.LEFT_OUTER,
-            on=((UserOrg.user_id == User.id) & (UserOrg.org_id == Organisation.id)),
+        .order_by(model.id)
+    )
+    if max_rows:
+        query = query.limit(max_rows)
+
+    claim = model.update(claimed_by=claimed_by, claimed_until=claimed_until)
+    if db.for_update:
+        with db.atomic():
+            ids = [r for (r,) in query.for_update("FOR UPDATE SKIP LOCKED").tuples()]
+            if ids:
+                claim.where(model.id.in_(ids)).execute()
+    else:
+        claim.where(model.id.in_(query)).execute()
+
+    try:
+        yield batch_query(
+            record_model, invitee_model, max_rows=None, claimed_by=claimed_by, **kwargs
         )
-        .join(
-            UserInvitation,
-            JOIN.LEFT_OUTER,
-            on=(
-                (UserInvitation.email == PeerReviewInvitee.email)
-                & (UserInvitation.task_id == Task.id)
-            ),
+    finally:
+        model.update(claimed_by=None, claimed_until=None).where(
+            model.claimed_by == claimed_by
+        ).execute()
+
+
+def schedule_retry(task, entry, ex):
+    """Reschedule the processing of a batch entry after a transient ORCID API call failure.
+
+    The entry processing gets deferred with an exponential backoff and the record processing
+    job gets scheduled to run when the deferral expires.
+
+    Args:
+        task: the task record row (see :func:`batch_query`).
+        entry: the processed entry (the record or the invitee).
+        ex: the exception raised by the ORCID API call.
+
+    Returns:
+        bool. True if the processing got rescheduled, False if the failure is not transient
+        or all the retries are exhausted.
+
+    """
+    if not hasattr(entry, "defer") or not orcid_client.is_retryable(ex):
+        return False
+    retry_count = entry.retry_count or 0
+    if retry_count >= app.config.get("ORCID_API_MAX_RETRIES", 5):
+        return False
+
+    retry_at = datetime.utcnow() + timedelta(seconds=orcid_client.retry_delay(ex, retry_count))
+    entry.defer(retry_at)
+    entry.add_status_line(
+        f"ORCID API is not available ({getattr(ex, 'status', None) or type(ex).__name__}), "
+        f"the processing is rescheduled at {retry_at.isoformat(timespec='seconds')}."
+    )
+    logger.warning(
+        f"The processing of {type(entry).__name__} (ID: {entry.id}) is rescheduled at {retry_at}."
+    )
+    try:
+        func = globals().get(f"process_{task.task_type.name.lower()}_records")
+        func.schedule(
+            retry_at,
+            record_id=task.record.id,
+            job_id=f"retry:{task.record._meta.table_name}:{task.record.id}",
         )
-        .join(
-            OrcidToken,
-            JOIN.LEFT_OUTER,
-            on=(
-                (OrcidToken.user_id == User.id)
-                & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            ),
+    except Exception:
+        logger.exception(f"Failed to schedule the retry of the record {task.record.id}.")
+    return True
+
+
+def requeue_while_circuit_open(job, **kwargs):
+    """Requeue the batch processing job if ORCID API circuit breaker is open.
+
+    The job gets scheduled to run again after the circuit breaker reset timeout
+    (see :data:`orcid_client.circuit_breaker`) instead of walking the records.
+
+    Returns:
+        bool. True if the circuit breaker is open and the job got requeued.
+
+    """
+    retry_in = orcid_client.circuit_breaker.retry_in()
+    if not retry_in:
+        return False
+    retry_in += random.uniform(0, 10)
+    logger.warning(f"ORCID API circuit is open, {job.__name__} is requeued in {retry_in:.0f}s.")
+    job.schedule(timedelta(seconds=retry_in), **kwargs)
+    return True
+
+
+def prefetch_batch(rows, users, scope="/activities/update"):
+    """Prefetch the entities related to a batch of the task record rows.
+
+    The task organisations and creators get attached to the task instances in place,
+    so that grouping the rows and sending the invitations don't cost a query per row.
+
+    Returns:
+        set. The (user ID, organisation ID) pairs that have an access token with the scope.
+
+    """
+    if not rows:
+        return set()
+
+    org_ids = {r.org_id for r in rows}
+    orgs = {o.id: o for o in Organisation.select().where(Organisation.id.in_(list(org_ids)))}
+    creator_ids = {r.created_by_id for r in rows if r.created_by_id}
+    creators = (
+        {u.id: u for u in User.select().where(User.id.in_(list(creator_ids)))}
+        if creator_ids
+        else {}
+    )
+    for r in rows:
+        r.org = orgs.get(r.org_id)
+        if r.created_by_id:
+            r.created_by = creators.get(r.created_by_id)
+
+    user_ids = {u.id for u in users if u}
+    if not user_ids:
+        return set()
+    return set(
+        OrcidToken.select(OrcidToken.user_id, OrcidToken.org_id)
+        .where(
+            OrcidToken.user_id.in_(list(user_ids)),
+            OrcidToken.org_id.in_(list(org_ids)),
+            OrcidToken.scopes.contains(scope),
         )
+        .tuples()
     )
 
-    if record_id:
-        tasks = tasks.where(PeerReviewRecord.id == record_id)
-    tasks = tasks.order_by(Task.id, Task.org_id, PeerReviewRecord.id, User.id).limit(max_rows)
-    tasks = list(tasks)
 
-    for (task_id, org_id, record_id, user), tasks_by_user in groupby(
-        tasks,
-        lambda t: (
-            t.id,
-            t.org_id,
-            t.record.id,
-            (lambda r: r.user if r.user.id else None)(t.record.invitee),
-        ),
-    ):
-        """If we have the token associated to the user then update the peer record, otherwise send him an invite"""
-        if (
-            user is None
-            or user.orcid is None
-            or not OrcidToken.select()
-            .where(
-                (OrcidToken.user_id == user.id)
-                & (OrcidToken.org_id == org_id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            )
-            .exists()
-        ):  # noqa: E127, E129
-
-            for k, tasks in groupby(
-                tasks_by_user,
-                lambda t: (
-                    t.created_by,
-                    t.org,
-                    t.record.invitee.email,
-                    t.record.invitee.first_name,
-                    t.record.invitee.last_name,
-                ),
-            ):  # noqa: E501
-                email = k[2]
-                try:
-                    send_user_invitation(*k, task_id=task_id)
-                except Exception as ex:
-                    (
-                        PeerReviewInvitee.update(
-                            processed_at=datetime.utcnow(),
-                            status=f"Failed to send an invitation: {ex}.",
-                        ).where(
-                            PeerReviewInvitee.email == email,
-                            PeerReviewInvitee.record_id == record_id,
-                            PeerReviewInvitee.processed_at.is_null(),
-                        )
-                    ).execute()
+def process_batch(rows, key, update, invite, scope="/activities/update", workers=None):
+    """Dispatch a batch of the task record rows grouped by the user.
+
+    The groups of the users that have linked their ORCID account and have granted
+    the required scope are passed on to *update*, and all the others to *invite*.
+
+    With more than one worker the groups get updated concurrently by a bounded
+    thread pool (each group within a single transaction on its own DB connection),
+    while the overall ORCID API call rate is capped by :data:`queuing.rate_limiter`.
+    The outcomes of each group get written back in bulk as soon as the group is updated
+    (within the same transaction, see :func:`batch_entries`).
+
+    Args:
+        rows: the task record rows (see :func:`batch_query`).
+        key: the grouping key function returning (task ID, organisation ID, [...,] user).
+        update: the handler creating or updating the ORCID records, called
+            with the user, the organisation ID and the rows of the user.
+        invite: the handler inviting the researchers, called with the group key and the rows.
+        scope (str): the required ORCID access token scope.
+        workers (int): the maximum number of the concurrent update handler invocations
+            (default: *BATCH_WORKERS* configuration value adjusted to the ORCID API
+            error rate and latency, see :data:`orcid_client.concurrency`).
+
+    Returns:
+        (set, set). The processed task IDs and record IDs.
+
+    """
+    groups = [(k, list(g)) for k, g in groupby(rows, key)]
+    tokens = prefetch_batch([r for _, g in groups for r in g], [k[-1] for k, _ in groups], scope)
+    if workers is None:
+        workers = orcid_client.concurrency.workers(app.config.get("BATCH_WORKERS") or 1)
+
+    task_ids, record_ids, updates = set(), set(), []
+    for k, rows_by_user in groups:
+        task_id, org_id, *_, user = k
+        if user is None or not user.orcid or (user.id, org_id) not in tokens:
+            invite(k, rows_by_user)
         else:
-            create_or_update_peer_review(user, org_id, tasks_by_user)
+            updates.append((user, org_id, rows_by_user))
         task_ids.add(task_id)
-        peer_review_ids.add(record_id)
+        record_ids.update(r.record.id for r in rows_by_user)
 
-    for record in PeerReviewRecord.select().where(PeerReviewRecord.id << peer_review_ids):
-        # The Peer Review record is processed for all invitees
-        if not (
-            PeerReviewInvitee.select()
-            .where(
-                PeerReviewInvitee.record_id == record.id, PeerReviewInvitee.processed_at.is_null()
-            )
-            .exists()
-        ):
-            record.processed_at = datetime.utcnow()
-            if not record.status or "error" not in record.status:
-                record.add_status_line("Peer Review record is processed.")
-            record.save()
+    with orcid_client.profile_cache():
+        if workers > 1 and len(updates) > 1:
 
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (Once all records are processed):
-        if not (
-            PeerReviewRecord.select()
-            .where(PeerReviewRecord.task_id == task.id, PeerReviewRecord.processed_at.is_null())
-            .exists()
-        ):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = (
-                PeerReviewRecord.select()
-                .where(PeerReviewRecord.task_id == task.id, PeerReviewRecord.status ** "%error%")
-                .count()
-            )
-            row_count = task.record_count
+            def update_in_transaction(*args):
+                with app.app_context(), db.connection_context(), db.atomic(), batch_entries():
+                    return update(*args)
 
-            with app.app_context():
-                export_url = flask.url_for(
-                    "peerreviewrecord.export",
-                    export_type="json",
-                    _scheme="http" if EXTERNAL_SP else "https",
-                    task_id=task.id,
-                    _external=True,
-                )
-                send_email(
-                    "email/work_task_completed.html",
-                    subject="Peer Review Process Update",
-                    recipient=(task.created_by.name, task.created_by.email),
-                    error_count=error_count,
-                    row_count=row_count,
-                    export_url=export_url,
-                    task_name="Peer Review",
-                    filename=task.filename,
-                )
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for f in [
+                    executor.submit(copy_context().run, update_in_transaction, *args)
+                    for args in updates
+                ]:
+                    f.result()
+        else:
+            for args in updates:
+                with batch_entries():
+                    update(*args)
+    orcid_client.api_call_log.flush()
 
+    return task_ids, record_ids
 
-@rq.job(timeout=300)
-def process_funding_records(max_rows=20, record_id=None):
-    """Process uploaded affiliation records."""
-    set_server_name()
-    task_ids = set()
-    funding_ids = set()
-    """This query is to retrieve Tasks associated with funding records, which are not processed but are active"""
-    tasks = (
-        Task.select(
-            Task,
-            FundingRecord,
-            FundingInvitee,
-            User,
-            UserInvitation.id.alias("invitation_id"),
-            OrcidToken,
+
+def complete_batch_records(record_model, invitee_model, record_ids, message):
+    """Mark the records that have all their invitees processed as processed.
+
+    The retry count of the processed (e.g., deferred earlier and eventually succeeded)
+    invitees gets cleared.
+    """
+    if not record_ids:
+        return
+    if hasattr(invitee_model, "retry_count"):
+        invitee_model.update(retry_count=0).where(
+            invitee_model.record_id.in_(list(record_ids)),
+            invitee_model.processed_at.is_null(False),
+            invitee_model.retry_count > 0,
+        ).execute()
+    pending = {
+        r
+        for (r,) in invitee_model.select(invitee_model.record_id)
+        .distinct()
+        .where(invitee_model.record_id.in_(list(record_ids)), invitee_model.processed_at.is_null())
+        .tuples()
+    }
+    records = list(
+        record_model.select(record_model.id, record_model.task_id, record_model.status).where(
+            record_model.id.in_(list(record_ids - pending))
         )
-        .where(
-            FundingRecord.processed_at.is_null(),
-            FundingInvitee.processed_at.is_null(),
-            FundingRecord.is_active,
+    )
+    if not records:
+        return
+    now = datetime.utcnow()
+    for r in records:
+        r.processed_at = now
+        if not r.status or "error" not in r.status:
+            r.add_status_line(message)
+    with db.atomic():
+        record_model.bulk_update(records, fields=[record_model.processed_at, record_model.status])
+        Task.update(updated_at=now).where(Task.id.in_(list({r.task_id for r in records}))).execute()
+
+
+def complete_batch_tasks(record_model, task_ids, notify):
+    """Mark the tasks that have all their records processed as completed and notify the owners.
+
+    Args:
+        record_model: the batch task record model.
+        task_ids: the IDs of the tasks the processed records belong to.
+        notify: the function sending the notification, called with the task and the error count.
+
+    """
+    if not task_ids:
+        return
+    pending = {
+        t
+        for (t,) in record_model.select(record_model.task_id)
+        .distinct()
+        .where(record_model.task_id.in_(list(task_ids)), record_model.processed_at.is_null())
+        .tuples()
+    }
+    completed_ids = list(task_ids - pending)
+    if not completed_ids:
+        return
+    error_counts = dict(
+        record_model.select(record_model.task_id, fn.COUNT(record_model.id))
+        .where(record_model.task_id.in_(completed_ids), record_model.status ** "%error%")
+        .group_by(record_model.task_id)
+        .tuples()
+    )
+    for task in Task.select().where(Task.id.in_(completed_ids)):
+        task.completed_at = datetime.utcnow()
+        task.save()
+        notify(task, error_counts.get(task.id, 0))
+
+
+def notify_task_completion(
+    task,
+    error_count,
+    subject,
+    template="email/task_completed.html",
+    export_type="json",
+    **kwargs,
+):
+    """Send the batch task completion notification message to the task owner."""
+    with app.app_context():
+        export_url = flask.url_for(
+            task.record_model._meta.name + ".export",
+            export_type=export_type,
+            _scheme="http" if EXTERNAL_SP else "https",
+            task_id=task.id,
+            _external=True,
+        )
+        try:
+            send_email(
+                template,
+                subject=subject,
+                recipient=(task.created_by.name, task.created_by.email),
+                error_count=error_count,
+                row_count=task.record_count,
+                export_url=export_url,
+                filename=task.filename,
+                **kwargs,
+            )
+        except Exception:
+            logger.exception("Failed to send batch process completion notification message.")
+
+
+def invite_invitees(invitee_model, key, rows):
+    """Send invitations to the invitees of a record who haven't granted the access."""
+    task_id, _, record_id, _ = key
+    for k, _ in groupby(
+        rows,
+        lambda t: (
+            t.created_by,
+            t.org,
+            t.record.invitee.email,
+            t.record.invitee.first_name,
+            t.record.invitee.last_name,
+        ),
+    ):
+        email = k[2]
+        try:
+            send_user_invitation(*k, task_id=task_id)
+        except Exception as ex:
             (
-                OrcidToken.id.is_null(False)
-                | (
-                    (FundingInvitee.status.is_null())
-                    | (FundingInvitee.status.contains("sent").__invert__())
+                invitee_model.update(
+                    processed_at=datetime.utcnow(), status=f"Failed to send an invitation: {ex}."
+                ).where(
+                    invitee_model.email == email,
+                    invitee_model.record_id == record_id,
+                    invitee_model.processed_at.is_null(),
                 )
-            ),
-        )
-        .join(FundingRecord, on=(Task.id == FundingRecord.task_id), attr="record")
-        .join(FundingInvitee, on=(FundingRecord.id == FundingInvitee.record_id), attr="invitee")
-        .join(
-            User,
-            JOIN.LEFT_OUTER,
-            on=(
-                (User.email == FundingInvitee.email)
-                | ((User.orcid == FundingInvitee.orcid) & (User.organisation_id == Task.org_id))
-            ),
-        )
-        .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-        .join(
-            UserOrg,
-            JOIN.LEFT_OUTER,
-            on=((UserOrg.user_id == User.id) & (UserOrg.org_id == Organisation.id)),
-        )
-        .join(
-            UserInvitation,
-            JOIN.LEFT_OUTER,
-            on=(
-                (UserInvitation.email == FundingInvitee.email)
-                & (UserInvitation.task_id == Task.id)
-            ),
-        )
-        .join(
-            OrcidToken,
-            JOIN.LEFT_OUTER,
-            on=(
-                (OrcidToken.user_id == User.id)
-                & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            ),
-        )
-        .limit(max_rows)
-    )
-    if record_id:
-        tasks = tasks.where(FundingRecord.id == record_id)
+            ).execute()
+            Task.mark_updated([task_id])
+
 
-    for (task_id, org_id, record_id, user), tasks_by_user in groupby(
-        tasks,
+def invite_researchers(key, rows):
+    """Send invitations to the researchers of the property and resource records."""
+    task_id, _, user = key
+    for k, records in groupby(
+        rows,
         lambda t: (
-            t.id,
-            t.org_id,
-            t.record.id,
-            (lambda r: r.user if r.user.id else None)(t.record.invitee),
+            t.created_by,
+            t.org,
+            t.record.email,
+            t.record.first_name,
+            t.record.last_name,
+            user,
         ),
     ):
-        """If we have the token associated to the user then update the funding record, otherwise send him an invite"""
-        if (
-            user is None
-            or user.orcid is None
-            or not OrcidToken.select()
-            .where(
-                (OrcidToken.user_id == user.id)
-                & (OrcidToken.org_id == org_id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            )
-            .exists()
-        ):  # noqa: E127, E129
-
-            for k, tasks in groupby(
-                tasks_by_user,
-                lambda t: (
-                    t.created_by,
-                    t.org,
-                    t.record.invitee.email,
-                    t.record.invitee.first_name,
-                    t.record.invitee.last_name,
-                ),
-            ):  # noqa: E501
-                email = k[2]
-                try:
-                    send_user_invitation(*k, task_id=task_id)
-                except Exception as ex:
-                    (
-                        FundingInvitee.update(
-                            processed_at=datetime.utcnow(),
-                            status=f"Failed to send an invitation: {ex}.",
-                        ).where(
-                            FundingInvitee.email == email,
-                            FundingInvitee.record_id == record_id,
-                            FundingInvitee.processed_at.is_null(),
-                        )
-                    ).execute()
-        else:
-            create_or_update_funding(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-        funding_ids.add(record_id)
+        records = list(records)
+        try:
+            send_user_invitation(*k, task_id=task_id)
+            status = "The invitation sent at " + datetime.utcnow().isoformat(timespec="seconds")
+            for r in records:
+                r.record.add_status_line(status)
+                r.record.save()
+        except Exception as ex:
+            for r in records:
+                r.record.add_status_line(f"Failed to send an invitation: {ex}.")
+                r.record.save()
 
-    for record in FundingRecord.select().where(FundingRecord.id << funding_ids):
-        # The funding record is processed for all invitees
-        if not (
-            FundingInvitee.select()
-            .where(FundingInvitee.record_id == record.id, FundingInvitee.processed_at.is_null())
-            .exists()
-        ):
-            record.processed_at = datetime.utcnow()
-            if not record.status or "error" not in record.status:
-                record.add_status_line("Funding record is processed.")
-            record.save()
 
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (Once all records are processed):
-        if not (
-            FundingRecord.select()
-            .where(FundingRecord.task_id == task.id, FundingRecord.processed_at.is_null())
-            .exists()
-        ):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = (
-                FundingRecord.select()
-                .where(FundingRecord.task_id == task.id, FundingRecord.status ** "%error%")
-                .count()
-            )
-            row_count = task.record_count
+def user_record_key(t):
+    """Group the record rows by the task and the user."""
+    return (t.id, t.org_id, t.record.user if t.record.user.id else None)
 
-            with app.app_context():
-                export_url = flask.url_for(
-                    "fundingrecord.export",
-                    export_type="json",
-                    _scheme="http" if EXTERNAL_SP else "https",
-                    task_id=task.id,
-                    _external=True,
-                )
-                send_email(
-                    "email/funding_task_completed.html",
-                    subject="Funding Process Update",
-                    recipient=(task.created_by.name, task.created_by.email),
-                    error_count=error_count,
-                    row_count=row_count,
-                    export_url=export_url,
-                    filename=task.filename,
-                )
+
+def user_invitee_key(t):
+    """Group the record invitee rows by the task, the record and the user."""
+    return (t.id, t.org_id, t.record.id, t.record.invitee.user if t.record.invitee.user.id else None)
 
 
 @rq.job(timeout=300)
-def process_affiliation_records(max_rows=20, record_id=None):
-    """Process uploaded affiliation records."""
+def process_work_records(max_rows=20, record_id=None):
+    """Process uploaded work records."""
+    if requeue_while_circuit_open(process_work_records, max_rows=max_rows, record_id=record_id):
+        return
     set_server_name()
-    # TODO: optimize removing redundant fields
-    # TODO: perhaps it should be broken into 2 queries
-    task_ids = set()
-    tasks = (
-        Task.select(
-            Task, AffiliationRecord, User, UserInvitation.id.alias("invitation_id"), OrcidToken
-        )
-        .where(
-            AffiliationRecord.processed_at.is_null(),
-            AffiliationRecord.is_active,
-            (
-                (User.id.is_null(False) & User.orcid.is_null(False) & OrcidToken.id.is_null(False))
-                | (
-                    (User.id.is_null() | User.orcid.is_null() | OrcidToken.id.is_null())
-                    & UserInvitation.id.is_null()
-                    & (
-                        AffiliationRecord.status.is_null()
-                        | AffiliationRecord.status.contains("sent").__invert__()
-                    )
-                )
-            ),
+    with claim_batch(WorkRecord, WorkInvitee, max_rows=max_rows, record_id=record_id) as tasks:
+        task_ids, record_ids = process_batch(
+            tasks,
+            user_invitee_key,
+            create_or_update_work,
+            partial(invite_invitees, WorkInvitee),
         )
-        .join(AffiliationRecord, on=(Task.id == AffiliationRecord.task_id), attr="record")
-        .join(
-            User,
-            JOIN.LEFT_OUTER,
-            on=(
-                (User.email == AffiliationRecord.email)
-                | ((User.orcid == AffiliationRecord.orcid) & (User.organisation_id == Task.org_id))
-            ),
-        )
-        .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-        .join(
-            UserOrg,
-            JOIN.LEFT_OUTER,
-            on=((UserOrg.user_id == User.id) & (UserOrg.org_id == Organisation.id)),
-        )
-        .join(
-            UserInvitation,
-            JOIN.LEFT_OUTER,
-            on=(
-                (UserInvitation.email == AffiliationRecord.email)
-                & (UserInvitation.task_id == Task.id)
-            ),
-        )
-        .join(
-            OrcidToken,
-            JOIN.LEFT_OUTER,
-            on=(
-                (OrcidToken.user_id == User.id)
-                & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            ),
-        )
-        .limit(max_rows)
+    complete_batch_records(WorkRecord, WorkInvitee, record_ids, "Work record is processed.")
+    complete_batch_tasks(
+        WorkRecord,
+        task_ids,
+        partial(
+            notify_task_completion,
+            subject="Work Process Update",
+            template="email/work_task_completed.html",
+            task_name="Work",
+        ),
     )
-    if record_id:
-        if isinstance(record_id, list):
-            tasks = tasks.where(AffiliationRecord.id.in_(record_id))
-        else:
-            tasks = tasks.where(AffiliationRecord.id == record_id)
-    for (task_id, org_id, user), tasks_by_user in groupby(
-        tasks, lambda t: (t.id, t.org_id, (lambda r: r.user if r.user.id else None)(t.record))
-    ):
-        if (
-            user is None
-            or user.orcid is None
-            or not OrcidToken.select()
-            .where(
-                (OrcidToken.user_id == user.id)
-                & (OrcidToken.org_id == org_id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            )
-            .exists()
-        ):  # noqa: E127, E129
-            # maps invitation attributes to affiliation type set:
-            # - the user who uploaded the task;
-            # - the user organisation;
-            # - the invitee email;
-            # - the invitee first_name;
-            # - the invitee last_name
-            invitation_dict = {
-                k: set(t.record.affiliation_type.lower() for t in tasks)
-                for k, tasks in groupby(
-                    tasks_by_user,
-                    lambda t: (
-                        t.created_by,
-                        t.org,
-                        t.record.email,
-                        t.record.first_name,
-                        t.record.last_name,
-                    ),  # noqa: E501
-                )  # noqa: E501
-            }
-            for invitation, affiliations in invitation_dict.items():
-                email = invitation[2]
-                try:
-                    send_user_invitation(
-                        *invitation, affiliation_types=affiliations, task_id=task_id
-                    )
-                except Exception as ex:
-                    (
-                        AffiliationRecord.update(
-                            processed_at=datetime.utcnow(),
-                            status=f"Failed to send an invitation: {ex}.",
-                        ).where(
-                            AffiliationRecord.task_id == task_id,
-                            AffiliationRecord.email == email,
-                            AffiliationRecord.processed_at.is_null(),
-                        )
-                    ).execute()
-        else:  # user exits and we have tokens
-            create_or_update_affiliations(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (all recores are processed):
-        if not (
-            AffiliationRecord.select()
-            .where(AffiliationRecord.task_id == task.id, AffiliationRecord.processed_at.is_null())
-            .exists()
-        ):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = (
-                AffiliationRecord.select()
-                .where(AffiliationRecord.task_id == task.id, AffiliationRecord.status ** "%error%")
-                .count()
-            )
-            row_count = task.record_count
-            orcid_rec_count = (
-                task.affiliation_records.select(AffiliationRecord.orcid).distinct().count()
-            )
-
-            if task.filename and "INTEGRATION" not in task.filename:
-                with app.app_context():
-                    export_url = flask.url_for(
-                        "affiliationrecord.export",
-                        export_type="csv",
-                        _scheme="http" if EXTERNAL_SP else "https",
-                        task_id=task.id,
-                        _external=True,
-                    )
-                    try:
-                        send_email(
-                            "email/task_completed.html",
-                            subject="Affiliation Process Update",
-                            recipient=(task.created_by.name, task.created_by.email),
-                            error_count=error_count,
-                            row_count=row_count,
-                            orcid_rec_count=orcid_rec_count,
-                            export_url=export_url,
-                            filename=task.filename,
-                        )
-                    except Exception:
-                        logger.exception(
-                            "Failed to send batch process comletion notification message."
-                        )
 
 
 @rq.job(timeout=300)
-def process_property_records(max_rows=20, record_id=None):
-    """Process uploaded property records."""
+def process_peer_review_records(max_rows=20, record_id=None):
+    """Process uploaded peer_review records."""
+    if requeue_while_circuit_open(
+        process_peer_review_records, max_rows=max_rows, record_id=record_id
+    ):
+        return
     set_server_name()
-    # TODO: optimize removing redundant fields
-    # TODO: perhaps it should be broken into 2 queries
-    task_ids = set()
-    tasks = (
-        Task.select(
-            Task, PropertyRecord, User, UserInvitation.id.alias("invitation_id"), OrcidToken
-        )
-        .where(
-            PropertyRecord.processed_at.is_null(),
-            PropertyRecord.is_active,
-            (
-                (User.id.is_null(False) & User.orcid.is_null(False) & OrcidToken.id.is_null(False))
-                | (
-                    (User.id.is_null() | User.orcid.is_null() | OrcidToken.id.is_null())
-                    & UserInvitation.id.is_null()
-                    & (
-                        PropertyRecord.status.is_null()
-                        | PropertyRecord.status.contains("sent").__invert__()
-                    )
-                )
-            ),
-        )
-        .join(PropertyRecord, on=(Task.id == PropertyRecord.task_id), attr="record")
-        .join(
-            User,
-            JOIN.LEFT_OUTER,
-            on=(
-                (User.email == PropertyRecord.email)
-                | ((User.orcid == PropertyRecord.orcid) & (User.organisation_id == Task.org_id))
-            ),
-        )
-        .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-        .join(
-            UserOrg,
-            JOIN.LEFT_OUTER,
-            on=((UserOrg.user_id == User.id) & (UserOrg.org_id == Organisation.id)),
-        )
-        .join(
-            UserInvitation,
-            JOIN.LEFT_OUTER,
-            on=(
-                (
-                    (UserInvitation.email == PropertyRecord.email)
-                    | (UserInvitation.email == User.email)
-                )
-                & (UserInvitation.task_id == Task.id)
-            ),
-        )
-        .join(
-            OrcidToken,
-            JOIN.LEFT_OUTER,
-            on=(
-                (OrcidToken.user_id == User.id)
-                & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/person/update"))
-            ),
+    with claim_batch(
+        PeerReviewRecord, PeerReviewInvitee, max_rows=max_rows, record_id=record_id
+    ) as tasks:
+        task_ids, record_ids = process_batch(
+            tasks,
+            user_invitee_key,
+            create_or_update_peer_review,
+            partial(invite_invitees, PeerReviewInvitee),
         )
+    complete_batch_records(
+        PeerReviewRecord, PeerReviewInvitee, record_ids, "Peer Review record is processed."
+    )
+    complete_batch_tasks(
+        PeerReviewRecord,
+        task_ids,
+        partial(
+            notify_task_completion,
+            subject="Peer Review Process Update",
+            template="email/work_task_completed.html",
+            task_name="Peer Review",
+        ),
     )
-    if max_rows:
-        tasks = tasks.limit(max_rows)
-    if record_id:
-        if isinstance(record_id, list):
-            tasks = tasks.where(PropertyRecord.id.in_(record_id))
-        else:
-            tasks = tasks.where(PropertyRecord.id == record_id)
-    for (task_id, org_id, user), tasks_by_user in groupby(
-        tasks, lambda t: (t.id, t.org_id, (lambda r: r.user if r.user.id else None)(t.record))
-    ):
-        if (
-            not user
-            or not user.orcid
-            or not OrcidToken.select()
-            .where(
-                OrcidToken.user_id == user.id,
-                OrcidToken.org_id == org_id,
-                OrcidToken.scopes.contains("/person/update"),
-            )
-            .exists()
-        ):  # noqa: E127, E129
-            for k, tasks in groupby(
-                tasks_by_user,
-                lambda t: (
-                    t.created_by,
-                    t.org,
-                    t.record.email,
-                    t.record.first_name,
-                    t.record.last_name,
-                    user,
-                ),
-            ):  # noqa: E501
-                try:
-                    send_user_invitation(*k, task_id=task_id)
-                    status = "The invitation sent at " + datetime.utcnow().isoformat(
-                        timespec="seconds"
-                    )
-                    for r in tasks:
-                        r.record.add_status_line(status)
-                        r.record.save()
-                except Exception as ex:
-                    for r in tasks:
-                        r.record.add_status_line(f"Failed to send an invitation: {ex}.")
-                        r.record.save()
-        else:
-            create_or_update_properties(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (all recores are processed):
-        if not (
-            PropertyRecord.select()
-            .where(PropertyRecord.task_id == task.id, PropertyRecord.processed_at.is_null())
-            .exists()
-        ):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = (
-                PropertyRecord.select()
-                .where(PropertyRecord.task_id == task.id, PropertyRecord.status ** "%error%")
-                .count()
-            )
-            row_count = task.record_count
-
-            with app.app_context():
-                export_url = flask.url_for(
-                    "propertyrecord.export",
-                    export_type="json",
-                    _scheme="http" if EXTERNAL_SP else "https",
-                    task_id=task.id,
-                    _external=True,
-                )
-                try:
-                    send_email(
-                        "email/task_completed.html",
-                        subject="Researcher Property Record Process Update",
-                        recipient=(task.created_by.name, task.created_by.email),
-                        error_count=error_count,
-                        row_count=row_count,
-                        export_url=export_url,
-                        task_name="Researcher Property",
-                        filename=task.filename,
-                    )
-                except Exception:
-                    logger.exception(
-                        "Failed to send batch process completion notification message."
-                    )
 
 
 @rq.job(timeout=300)
-def process_other_id_records(max_rows=20, record_id=None):
-    """Process uploaded Other ID records."""
+def process_funding_records(max_rows=20, record_id=None):
+    """Process uploaded funding records."""
+    if requeue_while_circuit_open(process_funding_records, max_rows=max_rows, record_id=record_id):
+        return
     set_server_name()
-    # TODO: optimize
-    task_ids = set()
-    tasks = (
-        Task.select(
-            Task, OtherIdRecord, User, UserInvitation.id.alias("invitation_id"), OrcidToken
+    with claim_batch(
+        FundingRecord, FundingInvitee, max_rows=max_rows, record_id=record_id
+    ) as tasks:
+        task_ids, record_ids = process_batch(
+            tasks,
+            user_invitee_key,
+            create_or_update_funding,
+            partial(invite_invitees, FundingInvitee),
         )
-        .where(
-            OtherIdRecord.processed_at.is_null(),
-            OtherIdRecord.is_active,
-            (
-                (User.id.is_null(False) & User.orcid.is_null(False) & OrcidToken.id.is_null(False))
-                | (
-                    (User.id.is_null() | User.orcid.is_null() | OrcidToken.id.is_null())
-                    & UserInvitation.id.is_null()
-                    & (
-                        OtherIdRecord.status.is_null()
-                        | OtherIdRecord.status.contains("sent").__invert__()
-                    )
-                )
-            ),
-        )
-        .join(OtherIdRecord, on=(Task.id == OtherIdRecord.task_id), attr="record")
-        .join(
-            User,
-            JOIN.LEFT_OUTER,
-            on=(
-                (User.email == OtherIdRecord.email)
-                | ((User.orcid == OtherIdRecord.orcid) & (User.organisation_id == Task.org_id))
+    complete_batch_records(
+        FundingRecord, FundingInvitee, record_ids, "Funding record is processed."
+    )
+    complete_batch_tasks(
+        FundingRecord,
+        task_ids,
+        partial(
+            notify_task_completion,
+            subject="Funding Process Update",
+            template="email/funding_task_completed.html",
+        ),
+    )
+
+
+def invite_affiliation_researchers(key, rows):
+    """Send invitations to the researchers of the affiliation records."""
+    task_id = key[0]
+    # maps invitation attributes to affiliation type set:
+    # - the user who uploaded the task;
+    # - the user organisation;
+    # - the invitee email;
+    # - the invitee first_name;
+    # - the invitee last_name
+    invitation_dict = {
+        k: set(t.record.affiliation_type.lower() for t in tasks)
+        for k, tasks in groupby(
+            rows,
+            lambda t: (
+                t.created_by,
+                t.org,
+                t.record.email,
+                t.record.first_name,
+                t.record.last_name,
             ),
         )
-        .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-        .join(
-            UserOrg,
-            JOIN.LEFT_OUTER,
-            on=((UserOrg.user_id == User.id) & (UserOrg.org_id == Organisation.id)),
+    }
+    for invitation, affiliations in invitation_dict.items():
+        email = invitation[2]
+        try:
+            send_user_invitation(*invitation, affiliation_types=affiliations, task_id=task_id)
+        except Exception as ex:
+            (
+                AffiliationRecord.update(
+                    processed_at=datetime.utcnow(), status=f"Failed to send an invitation: {ex}."
+                ).where(
+                    AffiliationRecord.task_id == task_id,
+                    AffiliationRecord.email == email,
+                    AffiliationRecord.processed_at.is_null(),
+                )
+            ).execute()
+            Task.mark_updated([task_id])
+
+
+def notify_affiliation_task_completion(task, error_count):
+    """Send the affiliation task completion notification (except for the integration tasks)."""
+    if task.filename and "INTEGRATION" not in task.filename:
+        notify_task_completion(
+            task,
+            error_count,
+            subject="Affiliation Process Update",
+            export_type="csv",
+            orcid_rec_count=task.affiliation_records.select(AffiliationRecord.orcid)
+            .distinct()
+            .count(),
         )
-        .join(
-            UserInvitation,
-            JOIN.LEFT_OUTER,
-            on=(
-                (UserInvitation.email == OtherIdRecord.email) & (UserInvitation.task_id == Task.id)
-            ),
+
+
+@rq.job(timeout=300)
+def process_affiliation_records(max_rows=20, record_id=None):
+    """Process uploaded affiliation records."""
+    if requeue_while_circuit_open(
+        process_affiliation_records, max_rows=max_rows, record_id=record_id
+    ):
+        return
+    set_server_name()
+    with claim_batch(AffiliationRecord, max_rows=max_rows, record_id=record_id) as tasks:
+        task_ids, _ = process_batch(
+            tasks, user_record_key, create_or_update_affiliations, invite_affiliation_researchers
         )
-        .join(
-            OrcidToken,
-            JOIN.LEFT_OUTER,
-            on=(
-                (OrcidToken.user_id == User.id)
-                & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/person/update"))
-            ),
+    complete_batch_tasks(AffiliationRecord, task_ids, notify_affiliation_task_completion)
+
+
+@rq.job(timeout=300)
+def process_property_records(max_rows=20, record_id=None):
+    """Process uploaded property records."""
+    if requeue_while_circuit_open(
+        process_property_records, max_rows=max_rows, record_id=record_id
+    ):
+        return
+    set_server_name()
+    with claim_batch(
+        PropertyRecord,
+        scope="/person/update",
+        max_rows=max_rows,
+        record_id=record_id,
+        match_invitation_by_user_email=True,
+    ) as tasks:
+        task_ids, _ = process_batch(
+            tasks,
+            user_record_key,
+            create_or_update_properties,
+            invite_researchers,
+            scope="/person/update",
         )
-        .limit(max_rows)
+    complete_batch_tasks(
+        PropertyRecord,
+        task_ids,
+        partial(
+            notify_task_completion,
+            subject="Researcher Property Record Process Update",
+            task_name="Researcher Property",
+        ),
     )
-    if record_id:
-        tasks = tasks.where(OtherIdRecord.id == record_id)
-    for (task_id, org_id, user), tasks_by_user in groupby(
-        tasks, lambda t: (t.id, t.org_id, (lambda r: r.user if r.user.id else None)(t.record))
+
+
+def invite_other_id_researchers(key, rows):
+    """Send invitations to the researchers of the other ID records."""
+    task_id = key[0]
+    for k, _ in groupby(
+        rows,
+        lambda t: (t.created_by, t.org, t.record.email, t.record.first_name, t.record.last_name),
     ):
-        if (
-            user is None
-            or user.orcid is None
-            or not OrcidToken.select()
-            .where(
-                (OrcidToken.user_id == user.id)
-                & (OrcidToken.org_id == org_id)
-                & (OrcidToken.scopes.contains("/person/update"))
+        email = k[2]
+        try:
+            send_user_invitation(
+                *k, task_id=task_id, invitation_template="email/property_invitation.html"
             )
-            .exists()
-        ):  # noqa: E127, E129
-            for k, tasks in groupby(
-                tasks_by_user,
-                lambda t: (
-                    t.created_by,
-                    t.org,
-                    t.record.email,
-                    t.record.first_name,
-                    t.record.last_name,
-                ),
-            ):  # noqa: E501
-                try:
-                    email = k[2]
-                    send_user_invitation(
-                        *k, task_id=task_id, invitation_template="email/property_invitation.html"
-                    )
-                    status = "The invitation sent at " + datetime.utcnow().isoformat(
-                        timespec="seconds"
-                    )
-                    (
-                        OtherIdRecord.update(status=OtherIdRecord.status + "\n" + status)
-                        .where(
-                            OtherIdRecord.status.is_null(False),
-                            OtherIdRecord.task_id == task_id,
-                            OtherIdRecord.email == email,
-                        )
-                        .execute()
-                    )
-                    (
-                        OtherIdRecord.update(status=status)
-                        .where(
-                            OtherIdRecord.status.is_null(),
-                            OtherIdRecord.task_id == task_id,
-                            OtherIdRecord.email == email,
-                        )
-                        .execute()
-                    )
-                except Exception as ex:
-                    (
-                        OtherIdRecord.update(
-                            processed_at=datetime.utcnow(),
-                            status=f"Failed to send an invitation: {ex}.",
-                        ).where(
-                            OtherIdRecord.task_id == task_id,
-                            OtherIdRecord.email == email,
-                            OtherIdRecord.processed_at.is_null(),
-                        )
-                    ).execute()
-        else:
-            create_or_update_other_id(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (all recores are processed):
-        if not (
-            OtherIdRecord.select()
-            .where(OtherIdRecord.task_id == task.id, OtherIdRecord.processed_at.is_null())
-            .exists()
-        ):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = (
-                OtherIdRecord.select()
-                .where(OtherIdRecord.task_id == task.id, OtherIdRecord.status ** "%error%")
-                .count()
+            status = "The invitation sent at " + datetime.utcnow().isoformat(timespec="seconds")
+            (
+                OtherIdRecord.update(status=OtherIdRecord.status + "\n" + status)
+                .where(
+                    OtherIdRecord.status.is_null(False),
+                    OtherIdRecord.task_id == task_id,
+                    OtherIdRecord.email == email,
+                )
+                .execute()
             )
-            row_count = task.record_count
-
-            with app.app_context():
-                export_url = flask.url_for(
-                    "otheridrecord.export",
-                    export_type="json",
-                    _scheme="http" if EXTERNAL_SP else "https",
-                    task_id=task.id,
-                    _external=True,
+            (
+                OtherIdRecord.update(status=status)
+                .where(
+                    OtherIdRecord.status.is_null(),
+                    OtherIdRecord.task_id == task_id,
+                    OtherIdRecord.email == email,
                 )
-                try:
-                    send_email(
-                        "email/task_completed.html",
-                        subject="Other ID Record Process Update",
-                        recipient=(task.created_by.name, task.created_by.email),
-                        error_count=error_count,
-                        row_count=row_count,
-                        export_url=export_url,
-                        task_name="Other ID",
-                        filename=task.filename,
-                    )
-                except Exception:
-                    logger.exception(
-                        "Failed to send batch process completion notification message."
-                    )
+                .execute()
+            )
+        except Exception as ex:
+            (
+                OtherIdRecord.update(
+                    processed_at=datetime.utcnow(), status=f"Failed to send an invitation: {ex}."
+                ).where(
+                    OtherIdRecord.task_id == task_id,
+                    OtherIdRecord.email == email,
+                    OtherIdRecord.processed_at.is_null(),
+                )
+            ).execute()
+        Task.mark_updated([task_id])
 
 
 @rq.job(timeout=300)
-def process_resource_records(max_rows=20, record_id=None):
-    """Process uploaded resoucre records."""
+def process_other_id_records(max_rows=20, record_id=None):
+    """Process uploaded Other ID records."""
+    if requeue_while_circuit_open(
+        process_other_id_records, max_rows=max_rows, record_id=record_id
+    ):
+        return
     set_server_name()
-    # TODO: optimize removing redundant fields
-    # TODO: perhaps it should be broken into 2 queries
-    task_ids = set()
-    tasks = (
-        Task.select(
-            Task, ResourceRecord, User, UserInvitation.id.alias("invitation_id"), OrcidToken
-        )
-        .where(
-            ResourceRecord.processed_at.is_null(),
-            ResourceRecord.is_active,
-            (
-                (User.id.is_null(False) & User.orcid.is_null(False) & OrcidToken.id.is_null(False))
-                | (
-                    (User.id.is_null() | User.orcid.is_null() | OrcidToken.id.is_null())
-                    & UserInvitation.id.is_null()
-                    & (
-                        ResourceRecord.status.is_null()
-                        | ResourceRecord.status.contains("sent").__invert__()
-                    )
-                )
-            ),
-        )
-        .join(ResourceRecord, on=(Task.id == ResourceRecord.task_id), attr="record")
-        .join(
-            User,
-            JOIN.LEFT_OUTER,
-            on=(
-                (User.email == ResourceRecord.email)
-                | ((User.orcid == ResourceRecord.orcid) & (User.organisation_id == Task.org_id))
-            ),
-        )
-        .join(Organisation, JOIN.LEFT_OUTER, on=(Organisation.id == Task.org_id))
-        .join(
-            UserOrg,
-            JOIN.LEFT_OUTER,
-            on=((UserOrg.user_id == User.id) & (UserOrg.org_id == Organisation.id)),
-        )
-        .join(
-            UserInvitation,
-            JOIN.LEFT_OUTER,
-            on=(
-                (
-                    (UserInvitation.email == ResourceRecord.email)
-                    | (UserInvitation.email == User.email)
-                )
-                & (UserInvitation.task_id == Task.id)
-            ),
-        )
-        .join(
-            OrcidToken,
-            JOIN.LEFT_OUTER,
-            on=(
-                (OrcidToken.user_id == User.id)
-                & (OrcidToken.org_id == Organisation.id)
-                & (OrcidToken.scopes.contains("/activities/update"))
-            ),
+    with claim_batch(
+        OtherIdRecord, scope="/person/update", max_rows=max_rows, record_id=record_id
+    ) as tasks:
+        task_ids, _ = process_batch(
+            tasks,
+            user_record_key,
+            create_or_update_other_id,
+            invite_other_id_researchers,
+            scope="/person/update",
         )
+    complete_batch_tasks(
+        OtherIdRecord,
+        task_ids,
+        partial(
+            notify_task_completion, subject="Other ID Record Process Update", task_name="Other ID"
+        ),
     )
-    if max_rows:
-        tasks = tasks.limit(max_rows)
-    if record_id:
-        if isinstance(record_id, list):
-            tasks = tasks.where(ResourceRecord.id.in_(record_id))
-        else:
-            tasks = tasks.where(ResourceRecord.id == record_id)
 
-    for (task_id, org_id, user), tasks_by_user in groupby(
-        tasks, lambda t: (t.id, t.org_id, (lambda r: r.user if r.user.id else None)(t.record))
-    ):
-        if (
-            not user
-            or not user.orcid
-            or not OrcidToken.select()
-            .where(
-                OrcidToken.user_id == user.id,
-                OrcidToken.org_id == org_id,
-                OrcidToken.scopes.contains("/activities/update"),
-            )
-            .exists()
-        ):  # noqa: E127, E129
-            for k, tasks in groupby(
-                tasks_by_user,
-                lambda t: (
-                    t.created_by,
-                    t.org,
-                    t.record.email,
-                    t.record.first_name,
-                    t.record.last_name,
-                    user,
-                ),
-            ):  # noqa: E501
-                try:
-                    send_user_invitation(*k, task_id=task_id)
-                    status = "The invitation sent at " + datetime.utcnow().isoformat(
-                        timespec="seconds"
-                    )
-                    for r in tasks:
-                        r.record.add_status_line(status)
-                        r.record.save()
-                except Exception as ex:
-                    for r in tasks:
-                        r.record.add_status_line(f"Failed to send an invitation: {ex}.")
-                        r.record.save()
-        else:
-            create_or_update_resources(user, org_id, tasks_by_user)
-        task_ids.add(task_id)
 
-    for task in Task.select().where(Task.id << task_ids):
-        # The task is completed (all recores are processed):
-        rm = task.record_model
-        if not (rm.select().where(rm.task_id == task.id, rm.processed_at.is_null()).exists()):
-            task.completed_at = datetime.utcnow()
-            task.save()
-            error_count = rm.select().where(rm.task_id == task.id, rm.status ** "%error%").count()
-            row_count = task.record_count
+def notify_resource_task_completion(task, error_count):
+    """Send the research resource task completion notification message."""
+    notify_task_completion(
+        task,
+        error_count,
+        subject="Research Rresource Record Process Update",
+        export_type="json" if task.is_raw else "csv",
+        task_name="Research Resource",
+    )
 
-            with app.app_context():
-                export_url = flask.url_for(
-                    "resourcerecord.export",
-                    export_type="json" if task.is_raw else "csv",
-                    _scheme="http" if EXTERNAL_SP else "https",
-                    task_id=task.id,
-                    _external=True,
-                )
-                try:
-                    send_email(
-                        "email/task_completed.html",
-                        subject="Research Rresource Record Process Update",
-                        recipient=(task.created_by.name, task.created_by.email),
-                        error_count=error_count,
-                        row_count=row_count,
-                        export_url=export_url,
-                        task_name="Research Resource",
-                        filename=task.filename,
-                    )
-                except Exception:
-                    logger.exception(
-                        "Failed to send batch process completion notification message."
-                    )
+
+@rq.job(timeout=300)
+def process_resource_records(max_rows=20, record_id=None):
+    """Process uploaded resoucre records."""
+    if requeue_while_circuit_open(
+        process_resource_records, max_rows=max_rows, record_id=record_id
+    ):
+        return
+    set_server_name()
+    with claim_batch(
+        ResourceRecord, max_rows=max_rows, record_id=record_id, match_invitation_by_user_email=True
+    ) as tasks:
+        task_ids, _ = process_batch(
+            tasks, user_record_key, create_or_update_resources, invite_researchers
+        )
+    complete_batch_tasks(ResourceRecord, task_ids, notify_resource_task_completion)
 
 
 @rq.job(timeout=300)
 def process_message_records(max_rows=20, record_id=None):
     """Process uploaded ORCID message records."""
+    if requeue_while_circuit_open(process_message_records, max_rows=max_rows, record_id=record_id):
+        return
     RecordInvitee = MessageRecord.invitees.get_through_model()  # noqa: N806
 
     set_server_name()
@@ -2895,7 +2782,8 @@ def get_client_credentials_token(org, scopes="/webhook"):
             grant_type="client_credentials",
         ),
     )
-    OrcidToken.delete().where(OrcidToken.org == org, OrcidToken.scopes == scopes).execute()
+    if OrcidToken.delete().where(OrcidToken.org == org, OrcidToken.scopes == scopes).execute():
+        token_cache.purge()
     data = resp.json()
     token = OrcidToken.create(
         org=org,
@@ -2947,6 +2835,7 @@ def register_orcid_webhook(user, callback_url=None, delete=False):
         "Content-Length": "0",
     }
     call = OrcidApiCall(method="DELETE" if delete else "PUT", url=url, query_params=headers)
+    rate_limiter.acquire(user.organisation_id)
     resp = requests.delete(url, headers=headers) if delete else requests.put(url, headers=headers)
     if resp.status_code not in [200, 201, 204]:
         call.response = resp.text
@@ -3077,17 +2966,107 @@ def disable_org_webhook(org):
             register_orcid_webhook.queue(u, delete=True)
 
 
-def process_records(n):
-    """Process first n records and run other batch tasks."""
-    process_affiliation_records(n)
-    process_funding_records(n)
-    process_work_records(n)
-    process_peer_review_records(n)
-    process_property_records(n)
-    process_other_id_records(n)
+def drain_records(
+    record_model, process, page_size=20, time_budget=None, resume=True, max_pages=None
+):
+    """Drain the backlog of the active and not yet processed records.
+
+    The backlog gets walked in the record ID order with keyset pagination (*id > last_id*)
+    until it is exhausted, the time budget has run out, or ORCID API circuit breaker opens.
+    The last processed record ID is checkpointed in Redis after each page, so the next run
+    resumes from there. Once the end of the backlog is reached, the checkpoint is cleared.
+
+    Args:
+        record_model: the batch task record model.
+        process: the record processing function (e.g., :func:`process_work_records`).
+        page_size (int): the number of the records processed in one go.
+        time_budget (float): the time (in seconds) after which no more pages are started.
+        resume (bool): start from the last checkpoint.
+        max_pages (int): the maximum number of the pages processed in one go.
+
+    Returns:
+        int. The number of the processed records.
+
+    """
+    key = f"orcidhub:drain:{record_model._meta.table_name}"
+    redis = rq.connection
+    last_id = int(redis.get(key) or 0) if resume else 0
+    started_at = time.time()
+    count = pages = 0
+    while True:
+        if orcid_client.circuit_breaker.retry_in():
+            break
+        ids = [
+            r.id
+            for r in record_model.select(record_model.id)
+            .where(
+                record_model.id > last_id,
+                record_model.processed_at.is_null(),
+                record_model.is_active,
+            )
+            .order_by(record_model.id)
+            .limit(page_size)
+        ]
+        if not ids:
+            redis.delete(key)
+            break
+        process(max_rows=None, record_id=ids)
+        count += len(ids)
+        last_id = ids[-1]
+        redis.set(key, last_id)
+        pages += 1
+        if max_pages and pages >= max_pages:
+            break
+        if time_budget and time.time() - started_at >= time_budget:
+            break
+    return count
+
+
+def process_records(n, drain=False, time_budget=None):
+    """Process first n records and run other batch tasks.
+
+    In the drain mode the backlogs of all the record types get processed in pages of
+    n records taking a page of each record type in turn (see :func:`drain_records`),
+    so none of the types starves. The time budget applies to the whole run.
+    """
+    batches = [
+        (AffiliationRecord, process_affiliation_records),
+        (FundingRecord, process_funding_records),
+        (WorkRecord, process_work_records),
+        (PeerReviewRecord, process_peer_review_records),
+        (PropertyRecord, process_property_records),
+        (OtherIdRecord, process_other_id_records),
+    ]
+    if not drain:
+        for _, process in batches:
+            process(n)
+        return
+
+    deadline = time.time() + time_budget if time_budget else None
+    while batches:
+        for batch in list(batches):
+            if deadline and time.time() >= deadline:
+                return
+            record_model, process = batch
+            if not drain_records(record_model, process, page_size=n or 20, max_pages=1):
+                batches.remove(batch)
     # process_tasks(n)
 
 
+@rq.job(timeout=600)
+def drain_backlog(page_size=100, time_budget=480):
+    """Drain the backlog of all the record types within the time budget."""
+    process_records(page_size, drain=True, time_budget=time_budget)
+
+
+@rq.job(timeout=3600)
+def maintain_orcid_api_call_log(retention=None):
+    """Remove the expired ORCID API call log entries and prepare the upcoming partitions."""
+    if retention is None:
+        retention = app.config.get("ORCID_API_CALL_RETENTION") or 0
+    OrcidApiCall.maintain(retention)
+
+
 @rq.job(timeout=300)
 def send_orcid_update_summary(org_id=None):
     """Send organisation researcher ORCID profile update summary report."""
@@ -3187,6 +3166,52 @@ def dump_yaml(data):
     return yaml.dump(data, allow_unicode=True)
 
 
+def stream_task(task_dict, records, export_type="json"):
+    """Serialize the task with its records incrementally, e.g., for a streamed response.
+
+    Args:
+        task_dict (dict): the task representation without the records.
+        records: an iterable of the record representations (e.g., *Task.iter_record_dicts()*).
+        export_type (str): "json", "yaml" (or "yml"), or "ndjson" (the records only, one per line).
+
+    Yields:
+        str: the chunks of the serialized task.
+
+    """
+    if export_type == "ndjson":
+        for r in records:
+            yield flask.json.dumps(r) + "\n"
+    elif export_type in ["yaml", "yml"]:
+        yield dump_yaml(task_dict)
+        records = iter(records)
+        r = next(records, None)
+        if r is None:
+            yield "records: []\n"
+            return
+        yield "records:\n"
+        yield dump_yaml([r])
+        for r in records:
+            yield dump_yaml([r])
+    else:
+        head = flask.json.dumps(task_dict)[:-1]
+        yield head + (', "records": [' if task_dict else '"records": [')
+        for no, r in enumerate(records):
+            yield ", " + flask.json.dumps(r) if no else flask.json.dumps(r)
+        yield "]}"
+
+
+def stream_task_response(task_dict, records, export_type="json"):
+    """Create a response streaming the task with its records (see *stream_task*)."""
+    mimetype = {
+        "ndjson": "application/x-ndjson",
+        "yaml": "text/yaml",
+        "yml": "text/yaml",
+    }.get(export_type, "application/json")
+    return flask.Response(
+        flask.stream_with_context(stream_task(task_dict, records, export_type)), mimetype=mimetype
+    )
+
+
 def enqueue_user_records(user):
     """Enqueue all active and not yet processed record related to the user."""
     for task in list(
@@ -3236,22 +3261,116 @@ def enqueue_user_records(user):
                     func.queue(record_id=record_id)
 
 
-def enqueue_task_records(task):
-    """Enqueue all active and not yet processed record."""
-    records = task.records.where(
-        task.record_model.is_active, task.record_model.processed_at.is_null()
-    )
-    if task.is_raw:
-        return process_message_records.queue(record_id=[r.id for r in records])
+def enqueue_task_records(task, record_ids=None):
+    """Enqueue all active and not yet processed records.
+
+    The records get enqueued in chunks of up to *PROCESS_CHUNK_SIZE* records per job.
+    The affiliation and property records of the same researcher get into the same job.
 
-    func = globals().get(f"process_{task.task_type.name.lower()}_records")
-    if task.task_type in [TaskType.AFFILIATION, TaskType.PROPERTY]:
-        records = records.order_by(task.record_model.email, task.record_model.orcid)
-        for _, chunk in groupby(records, lambda r: (r.email, r.orcid)):
-            func.queue(record_id=[r.id for r in chunk])
+    Args:
+        task: the task of the records.
+        record_ids (list): the IDs of the records to enqueue, default: all records of the task.
+
+    """
+    model = task.record_model
+    records = task.records.where(model.is_active, model.processed_at.is_null())
+    if record_ids is not None:
+        records = records.where(model.id.in_(record_ids))
+    chunk_size = app.config.get("PROCESS_CHUNK_SIZE") or 20
+
+    if task.is_raw:
+        func = process_message_records
     else:
-        for r in records:
-            func.queue(record_id=r.id)
+        func = globals().get(f"process_{task.task_type.name.lower()}_records")
+    if not task.is_raw and task.task_type in [TaskType.AFFILIATION, TaskType.PROPERTY]:
+        records = records.select(model.id, model.email, model.orcid).order_by(model.email, model.orcid)
+        chunks, chunk = [], []
+        for _, group in groupby(records, lambda r: (r.email, r.orcid)):
+            chunk.extend(r.id for r in group)
+            if len(chunk) >= chunk_size:
+                chunks.append(chunk)
+                chunk = []
+        if chunk:
+            chunks.append(chunk)
+    else:
+        chunks = chunked([r.id for r in records.select(model.id).order_by(model.id)], chunk_size)
+    for chunk in chunks:
+        func.queue(record_id=chunk, max_rows=None)
+
+
+def reset_claim_values(model):
+    """Get the values resetting the retries and the (deferral) claims of the model entries."""
+    fields = model._meta.fields
+    values = dict(retry_count=0, claimed_by=None, claimed_until=None)
+    return {k: v for k, v in values.items() if k in fields}
+
+
+def update_task_records(task, values=None, record_ids=None, where=None, reset=False, enqueue=True):
+    """Update the task records with set-based UPDATEs and enqueue them for processing.
+
+    The records (and their invitees) get updated without reading them. If the records get
+    activated or reset, they get enqueued for processing (see :func:`enqueue_task_records`).
+
+    Args:
+        task: the task of the records.
+        values (dict): the new values of the record fields.
+        record_ids (list): the IDs of the records to update, default: all records of the task.
+        where (dict): the values of the record fields the updated records have to match
+            (None matches NULL).
+        reset (bool): reset the processing of the records and their invitees.
+        enqueue (bool): enqueue the activated or reset records for processing.
+
+    Returns:
+        int: the number of the updated records.
+
+    """
+    model = task.record_model
+    conditions = [model.task_id == task.id]
+    if record_ids is not None:
+        conditions.append(model.id.in_(record_ids))
+    for name, value in (where or {}).items():
+        field = model._meta.fields[name]
+        conditions.append(field.is_null() if value is None else field == value)
+
+    values = dict(values or {})
+    ts = datetime.now().isoformat(timespec="seconds")
+    if reset:
+        values.update(processed_at=None, status=f"The record was reset at {ts}")
+        values.update(reset_claim_values(model))
+    elif values.get("is_active"):
+        # only the inactive records get activated (their status and history are kept otherwise):
+        inactive = model.is_active.is_null() | (model.is_active == False)  # noqa: E712
+        status = f"The record was activated at {ts}"
+        if len(values) == 1:
+            conditions.append(inactive)
+            values["status"] = status
+        else:
+            values["status"] = Case(None, [(inactive, status)], model.status)
+    if not values:
+        return model.select().where(*conditions).count()
+
+    with db.atomic():
+        if reset and hasattr(model, "invitees"):
+            # NB! the invitees get reset first as the updated values might no longer match:
+            records = model.select(model.id).where(*conditions)
+            invitee_model = model.invitees.rel_model
+            invitee_values = dict(
+                processed_at=None, status=values["status"], **reset_claim_values(invitee_model))
+            if task.is_raw:
+                through = model.invitees.get_through_model()
+                invitees = invitee_model.id.in_(
+                    through.select(through.invitee).where(through.messagerecord.in_(records)))
+            else:
+                invitees = invitee_model.record.in_(records)
+            invitee_model.update(**invitee_values).where(invitees).execute()
+        count = model.update(**values).where(*conditions).execute()
+        # the bulk updates don't bump the task update time-stamp (and the change token):
+        task.updated_at = datetime.utcnow()
+        task.save()
+
+    if enqueue and (reset or values.get("is_active")):
+        enqueue_task_records(task, record_ids=record_ids)
+    return count
 
 
 def activate_all_records(task):
@@ -3282,42 +3401,11 @@ def activate_all_records(task):
 
 def reset_all_records(task):
     """Batch reset of batch records."""
-    count = 0
     with db.atomic():
         try:
-            status = "The record was reset at " + datetime.now().isoformat(timespec="seconds")
-            tt = task.task_type
-            if tt in [TaskType.AFFILIATION, TaskType.PROPERTY, TaskType.OTHER_ID]:
-                count = (
-                    task.record_model.update(processed_at=None, status=status)
-                    .where(
-                        task.record_model.task_id == task.id,
-                        task.record_model.is_active == True,  # noqa: E712
-                    )
-                    .execute()
-                )  # noqa: E712
-
-            else:
-                for record in task.records.where(
-                    task.record_model.is_active == True  # noqa: E712
-                ):  # noqa: E712
-                    record.processed_at = None
-                    record.status = status
-
-                    if hasattr(record, "invitees"):
-                        invitee_class = record.invitees.model
-                        invitee_class.update(processed_at=None, status=status).where(
-                            (invitee_class.id << [i.id for i in record.invitees])
-                            if task.is_raw
-                            else (invitee_class.record == record.id)
-                        ).execute()
-
-                    record.save()
-                    count = count + 1
-
+            count = update_task_records(task, where={"is_active": True}, reset=True, enqueue=False)
             UserInvitation.delete().where(UserInvitation.task == task).execute()
             enqueue_task_records(task)
-
         except:
             db.rollback()
             app.logger.exception("Failed to reset the selected records")
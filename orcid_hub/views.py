@@ -42,7 +42,6 @@ from urllib.parse import parse_qs, urlparse
 from wtforms import validators
 
 from . import SENTRY_DSN, admin, app, cache, limiter, models, orcid_client, rq, utils
-from .apis import yamlfy
 from .forms import (AddressForm, ApplicationFrom, BitmapMultipleValueField, CredentialForm, EmailTemplateForm,
                     ExternalIdentifierForm, FileUploadForm, FundingForm, GroupIdForm, LogoForm, OrgRegistrationForm,
                     OtherNameKeywordForm, PartialDateField, PeerReviewForm, ProfileSyncForm,
@@ -60,6 +59,7 @@ from .models import (JOIN, Affiliation, AffiliationRecord, AffiliationExternalId
                      db)
 # NB! Should be disabled in production
 from .pyinfo import info
+from .queuing import proxy_cache, token_cache
 from .utils import get_next_url, read_uploaded_file, send_user_invitation
 
 HEADERS = {"Accept": "application/vnd.orcid+json", "Content-type": "application/vnd.orcid+json"}
@@ -149,7 +149,8 @@ def status():
         return jsonify({
             "status": "Connection successful.",
             "db-timestamp": now if isinstance(now, str) else now.isoformat(),
-            "free-storage-percent": free
+            "free-storage-percent": free,
+            "proxy-cache": proxy_cache.stats(),
         }), 200 if free > 10 else 418
     except Exception as ex:
         return jsonify({
@@ -187,6 +188,14 @@ def orcid_link_formatter(view, context, model, name):
     return Markup(f'<a href="{ORCID_BASE_URL}{model.orcid}" target="_blank">{model.orcid}</a>')
 
 
+def task_loading_formatter(view, context, model, name):
+    """Format the loading progress of the task loaded from an upload."""
+    status = utils.get_loading_status(model)
+    if status["loading_state"] == "LOADING":
+        return f"Loading... ({status['rows_parsed']} rows loaded)"
+    return f"Failed to load: {status['loading_error']}"
+
+
 class AppCustomModelConverter(CustomModelConverter):
     """Customized field mapping to revove the extra validator.
 
@@ -593,7 +602,9 @@ class OrcidApiCallAmin(AppModelView):
         "method", "called_at", "url", "query_params", "body", "status", "put_code",
         "response", "response_time_ms"
     ]
-    column_default_sort = ("id", True)
+    # the most recent calls (partitions) first, and no full table row count:
+    column_default_sort = ("called_at", True)
+    simple_list_pager = True
     can_export = True
     can_edit = False
     can_delete = False
@@ -688,6 +699,7 @@ class TaskAdmin(AppModelView):
     column_formatters = dict(
         task_type=lambda v, c, m, p: m.task_type.name.replace('_', ' ').title() if m.task_type else "N/A",
         completed_count=lambda v, c, m, p: (
+            task_loading_formatter(v, c, m, p) if m.loading_state in ["LOADING", "FAILED"] else
             '' if not m.record_count else f"{m.completed_count} / {m.record_count} ({m.completed_percent:.1f}%)"),
     )
 
@@ -731,12 +743,18 @@ class RecordModelView(AppModelView):
     column_exclude_list = (
         "task",
         "organisation",
+        "claimed_by",
+        "claimed_until",
+        "retry_count",
     )
     form_excluded_columns = [
         "task",
         "organisation",
         "processed_at",
         "status",
+        "claimed_by",
+        "claimed_until",
+        "retry_count",
     ]
     column_export_exclude_list = (
         "task",
@@ -841,6 +859,7 @@ class RecordModelView(AppModelView):
             count = self.model.update(is_active=True, status=status).where(
                 ((self.model.is_active.is_null()) | (self.model.is_active == False)),  # noqa: E712
                 self.model.id.in_(ids)).execute()
+            Task.mark_updated(self.model.task_id_query(self.model.id.in_(ids)))
             if self.model == AffiliationRecord:
                 records = self.model.select().where(self.model.id.in_(ids)).order_by(
                     self.model.email, self.model.orcid)
@@ -875,6 +894,7 @@ class RecordModelView(AppModelView):
                 count = self.model.update(
                     processed_at=None, status=status).where(self.model.is_active,
                                                             self.model.id.in_(ids)).execute()
+                Task.mark_updated([task.id])
 
                 if task.is_raw:
                     invitee_ids = [i.id for i in Invitee.select().join(
@@ -994,8 +1014,9 @@ class RecordChildAdmin(AppModelView):
     can_delete = True
     can_view_details = True
 
-    column_exclude_list = ["record"]
-    form_excluded_columns = ["record", "record", "status", "processed_at"]
+    column_exclude_list = ["record", "claimed_by", "claimed_until", "retry_count"]
+    form_excluded_columns = [
+        "record", "record", "status", "processed_at", "claimed_by", "claimed_until", "retry_count"]
     column_details_exclude_list = ["record"]
 
     def is_accessible(self):
@@ -1094,6 +1115,7 @@ class InviteeAdmin(RecordChildAdmin):
                 rec_class.update(
                     processed_at=None, status=status).where(
                     rec_class.is_active, rec_class.id == rec_id).execute()
+                Task.mark_updated(rec_class.task_id_query(rec_class.id == rec_id))
                 getattr(utils, f"process_{rec_class.underscore_name()}s").queue(rec_id)
             except Exception as ex:
                 transaction.rollback()
@@ -1166,7 +1188,7 @@ class CompositeRecordModelView(RecordModelView):
 
         count, data = self._export_data()
 
-        for row in data:
+        for row in self.model.prefetch_related(data):
             vals = self.expected_format(row)
             ds.append(vals)
 
@@ -1639,6 +1661,9 @@ class AffiliationRecordAdmin(CompositeRecordModelView):
     column_exclude_list = (
         "task",
         "organisation",
+        "claimed_by",
+        "claimed_until",
+        "retry_count",
     )
     column_searchable_list = (
         "first_name",
@@ -1709,11 +1734,9 @@ class AffiliationRecordAdmin(CompositeRecordModelView):
             flash("Permission denied.", "danger")
             return redirect(return_url)
 
-        data = Task.get(int(task_id)).to_dict()
-        if export_type == "json":
-            resp = jsonify(data)
-        else:
-            resp = yamlfy(data)
+        task = Task.get(int(task_id))
+        resp = utils.stream_task_response(
+            task.to_dict(recurse=False, include_records=False), task.iter_record_dicts(export=False), export_type)
 
         resp.headers[
             "Content-Disposition"] = f"attachment;filename={secure_filename(self.get_export_name(export_type))}"
@@ -1789,11 +1812,9 @@ class ProfilePropertyRecordAdmin(RecordModelView):
             flash("Permission denied.", "danger")
             return redirect(return_url)
 
-        data = Task.get(int(task_id)).to_dict()
-        if export_type == "json":
-            resp = jsonify(data)
-        else:
-            resp = yamlfy(data)
+        task = Task.get(int(task_id))
+        resp = utils.stream_task_response(
+            task.to_dict(recurse=False, include_records=False), task.iter_record_dicts(export=False), export_type)
 
         resp.headers[
             "Content-Disposition"] = f"attachment;filename={secure_filename(self.get_export_name(export_type))}"
@@ -2190,11 +2211,9 @@ class ResourceRecordAdmin(RecordModelView):
             flash("Permission denied.", "danger")
             return redirect(return_url)
 
-        data = Task.get(int(task_id)).to_export_dict()
-        if export_type == "json":
-            resp = jsonify(data)
-        else:
-            resp = yamlfy(data)
+        task = Task.get(int(task_id))
+        resp = utils.stream_task_response(
+            task.to_export_dict(include_records=False), task.iter_record_dicts(), export_type)
 
         resp.headers[
             "Content-Disposition"] = f"attachment;filename={secure_filename(self.get_export_name(export_type))}"
@@ -2223,11 +2242,9 @@ class MessageRecordAdmin(RecordModelView):
             flash("Permission denied.", "danger")
             return redirect(return_url)
 
-        data = Task.get(int(task_id)).to_export_dict()
-        if export_type == "json":
-            resp = jsonify(data)
-        else:
-            resp = yamlfy(data)
+        task = Task.get(int(task_id))
+        resp = utils.stream_task_response(
+            task.to_export_dict(include_records=False), task.iter_record_dicts(), export_type)
 
         resp.headers[
             "Content-Disposition"] = f"attachment;filename={secure_filename(self.get_export_name(export_type))}"
@@ -2971,7 +2988,7 @@ def load_org():
     """Preload organisation data."""
     form = FileUploadForm()
     if form.validate_on_submit():
-        row_count = OrgInfo.load_from_csv(read_uploaded_file(form))
+        row_count = OrgInfo.load_from_csv(read_uploaded_file(form, stream=True))
 
         flash("Successfully loaded %d rows." % row_count, "success")
         return redirect(url_for("orginfo.index_view"))
@@ -2979,6 +2996,32 @@ def load_org():
     return render_template("fileUpload.html", form=form, title="Organisation")
 
 
+def upload_task(form, record_model, task_type, loader, **kwargs):
+    """Store the uploaded file and load the task records from it with a background job.
+
+    CSV and TSV files are loaded with *load_from_csv*, the rest with the given *loader*.
+    """
+    filename = secure_filename(form.file_.data.filename)
+    content_type = form.file_.data.content_type
+    if content_type in ["text/tab-separated-values", "text/csv"] or (
+            filename and filename.lower().endswith(('.csv', '.tsv'))):
+        loader = "load_from_csv"
+    return utils.load_upload(
+        form.file_.data,
+        filename=filename,
+        loader=f"{record_model.__name__}.{loader}",
+        task_type=task_type,
+        mimetype=content_type,
+        **kwargs)
+
+
+def redirect_to_loading_task():
+    """Redirect to the task list while the uploaded file is being loaded."""
+    flash("The file was uploaded and it is being loaded. "
+          "The task will be ready for processing once the loading is completed.", "info")
+    return redirect(url_for("task.index_view"))
+
+
 @app.route("/load/task/<task_type>", methods=["GET", "POST"])
 @roles_required(Role.ADMIN)
 def load_task(task_type):
@@ -2988,16 +3031,9 @@ def load_task(task_type):
     form = FileUploadForm(extensions=["csv", "tsv", "json", "yaml", "yml"])
     if form.validate_on_submit():
         try:
-            filename = secure_filename(form.file_.data.filename)
-            content_type = form.file_.data.content_type
-            content = read_uploaded_file(form)
-
-            if content_type in ["text/tab-separated-values", "text/csv"] or (
-                    filename and filename.lower().endswith(('.csv', '.tsv'))):
-                task = record_model.load_from_csv(content, filename=filename)
-            else:
-                task = record_model.load(content, filename=filename)
-
+            task = upload_task(form, record_model, task_type, "load")
+            if task.loading_state == "LOADING":
+                return redirect_to_loading_task()
             flash(f"Successfully loaded {task.record_count} rows.")
             task_view = ("message" if task.is_raw else task_type.name.lower()) + "record.index_view"
             return redirect(url_for(task_view, task_id=task.id))
@@ -3019,15 +3055,10 @@ def load_researcher_funding():
     """Preload organisation data."""
     form = FileUploadForm(extensions=["json", "yaml", "csv", "tsv"])
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
-        content_type = form.file_.data.content_type
         try:
-            if content_type in ["text/tab-separated-values", "text/csv"] or (
-                    filename and filename.lower().endswith(('.csv', '.tsv'))):
-                task = FundingRecord.load_from_csv(
-                    read_uploaded_file(form), filename=filename)
-            else:
-                task = FundingRecord.load_from_json(read_uploaded_file(form), filename=filename)
+            task = upload_task(form, FundingRecord, TaskType.FUNDING, "load_from_json")
+            if task.loading_state == "LOADING":
+                return redirect_to_loading_task()
             flash(f"Successfully loaded {task.record_count} rows.")
             return redirect(url_for("fundingrecord.index_view", task_id=task.id))
         except Exception as ex:
@@ -3043,15 +3074,10 @@ def load_researcher_work():
     """Preload researcher's work data."""
     form = FileUploadForm(extensions=["json", "yaml", "csv", "tsv"])
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
-        content_type = form.file_.data.content_type
         try:
-            if content_type in ["text/tab-separated-values", "text/csv"] or (
-                    filename and filename.lower().endswith(('.csv', '.tsv'))):
-                task = WorkRecord.load_from_csv(
-                    read_uploaded_file(form), filename=filename)
-            else:
-                task = WorkRecord.load_from_json(read_uploaded_file(form), filename=filename)
+            task = upload_task(form, WorkRecord, TaskType.WORK, "load_from_json")
+            if task.loading_state == "LOADING":
+                return redirect_to_loading_task()
             flash(f"Successfully loaded {task.record_count} rows.")
             return redirect(url_for("workrecord.index_view", task_id=task.id))
         except Exception as ex:
@@ -3067,15 +3093,10 @@ def load_researcher_peer_review():
     """Preload researcher's peer review data."""
     form = FileUploadForm(extensions=["json", "yaml", "csv", "tsv"])
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
-        content_type = form.file_.data.content_type
         try:
-            if content_type in ["text/tab-separated-values", "text/csv"] or (
-                    filename and filename.lower().endswith(('.csv', '.tsv'))):
-                task = PeerReviewRecord.load_from_csv(
-                    read_uploaded_file(form), filename=filename)
-            else:
-                task = PeerReviewRecord.load_from_json(read_uploaded_file(form), filename=filename)
+            task = upload_task(form, PeerReviewRecord, TaskType.PEER_REVIEW, "load_from_json")
+            if task.loading_state == "LOADING":
+                return redirect_to_loading_task()
             flash(f"Successfully loaded {task.record_count} rows.")
             return redirect(url_for("peerreviewrecord.index_view", task_id=task.id))
         except Exception as ex:
@@ -3092,18 +3113,11 @@ def load_properties(property_type=None):
     """Preload researcher's property data."""
     form = FileUploadForm(extensions=["json", "yaml", "csv", "tsv"])
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
-        content_type = form.file_.data.content_type
         try:
-            if content_type in ["text/tab-separated-values", "text/csv"] or (
-                    filename and filename.lower().endswith(('.csv', '.tsv'))):
-                task = PropertyRecord.load_from_csv(read_uploaded_file(form),
-                                                    filename=filename,
-                                                    file_property_type=property_type)
-            else:
-                task = PropertyRecord.load_from_json(read_uploaded_file(form),
-                                                     filename=filename,
-                                                     file_property_type=property_type)
+            task = upload_task(form, PropertyRecord, TaskType.PROPERTY, "load_from_json",
+                               file_property_type=property_type)
+            if task.loading_state == "LOADING":
+                return redirect_to_loading_task()
             flash(f"Successfully loaded {task.record_count} rows.")
             return redirect(url_for("propertyrecord.index_view", task_id=task.id))
         except Exception as ex:
@@ -3150,15 +3164,10 @@ def load_other_ids():
     """Preload researcher's Other IDs data."""
     form = FileUploadForm(extensions=["json", "yaml", "csv", "tsv"])
     if form.validate_on_submit():
-        filename = secure_filename(form.file_.data.filename)
-        content_type = form.file_.data.content_type
         try:
-            if content_type in ["text/tab-separated-values", "text/csv"] or (
-                    filename and filename.lower().endswith(('.csv', '.tsv'))):
-                task = OtherIdRecord.load_from_csv(
-                    read_uploaded_file(form), filename=filename)
-            else:
-                task = OtherIdRecord.load_from_json(read_uploaded_file(form), filename=filename)
+            task = upload_task(form, OtherIdRecord, TaskType.OTHER_ID, "load_from_json")
+            if task.loading_state == "LOADING":
+                return redirect_to_loading_task()
             flash(f"Successfully loaded {task.record_count} rows.")
             return redirect(url_for("otheridrecord.index_view", task_id=task.id))
         except Exception as ex:
@@ -3608,10 +3617,12 @@ def api_credentials(app_id=None):
     if form.validate_on_submit():
         if form.revoke.data:
             Token.delete().where(Token.client == client).execute()
+            token_cache.purge()
         elif form.reset.data:
             form.client_id.data = client.client_id = secrets.token_hex(10)
             form.client_secret.data = client.client_secret = secrets.token_urlsafe(20)
             client.save()
+            token_cache.purge()
         elif form.update_app.data:
             form.populate_obj(client)
             client.save()
@@ -3619,6 +3630,7 @@ def api_credentials(app_id=None):
             with db.atomic():
                 Token.delete().where(Token.client == client).execute()
                 client.delete_instance(recursive=True)
+            token_cache.purge()
             return redirect(url_for("application"))
 
     return render_template("api_credentials.html", form=form)
@@ -3729,6 +3741,7 @@ def update_webhook(user_id):
 
         user.orcid_updated_at = updated_at
         user.save()
+        proxy_cache.invalidate(user.orcid)
         utils.notify_about_update(user)
 
     except Exception:
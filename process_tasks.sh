@@ -10,4 +10,4 @@ export LANG=en_US.UTF-8
 export DATABASE_URL
 
 
-flask process
+flask process --drain -n 100 -t 240
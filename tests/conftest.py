@@ -15,6 +15,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # flake8: noqa
 DATABASE_URL = os.environ.get("TEST_DATABASE_URL") or "sqlite:///:memory:"
 os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ["ORCID_API_CALL_LOG_BUFFER_SIZE"] = "0"
 
 from orcid_hub import config
 config.DATABASE_URL = DATABASE_URL
@@ -35,6 +36,7 @@ import pytest
 from playhouse import db_url
 
 from orcid_hub import app as _app, models, views, authcontroller, reports
+from orcid_hub.queuing import token_cache
 _app.config["DATABASE_URL"] = DATABASE_URL
 db_params = dict(autorollback=True)
 if "sqlite" in DATABASE_URL:
@@ -386,6 +388,8 @@ def app(testdb):
     _app.config["RQ_CONNECTION_CLASS"] = "fakeredis.FakeStrictRedis"
     _app.config["RQ_ASYNC"] = False
     _app.extensions["rq2"].init_app(_app)
+    # the test DB gets recreated for every test:
+    token_cache.purge()
 
     logger = logging.getLogger("peewee")
     if logger:
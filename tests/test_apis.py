@@ -2,20 +2,26 @@
 """Tests for core functions."""
 
 import copy
+import gzip
 import json
 import yaml
-from datetime import datetime
+from datetime import datetime, timedelta
 from io import BytesIO
 import os
 from uuid import uuid4
 
 from flask_login import current_user
+import fakeredis
 import pytest
+import requests
 
-from orcid_hub.apis import yamlfy
+from orcid_hub.apis import exeute_orcid_batch_async, yamlfy
 from orcid_hub.data_apis import plural
-from orcid_hub.models import (AffiliationRecord, AsyncOrcidResponse, Client, OrcidToken,
-                              Organisation, Task, TaskType, Token, User, UserInvitation)
+from orcid_hub.utils import save_batch_entries, update_task_records
+from orcid_hub.queuing import ProxyCache, TokenCache, proxy_cache, token_cache
+from orcid_hub.models import (AffiliationRecord, AsyncOrcidResponse, Client, FundingInvitee, FundingRecord,
+                              OrcidApiCall, OrcidToken, Organisation, Task, TaskType, Token, User,
+                              UserInvitation)
 from unittest.mock import patch, MagicMock
 from utils import get_profile as get_profile_data, get_resources as get_resources_data, readup_test_data
 
@@ -677,6 +683,165 @@ def test_users_api(client):
     assert data["email"] == "researcher102@test0.edu"
 
 
+def test_users_api_cursor_pagination(client):
+    """Test the keyset (cursor) pagination of the user list API."""
+    headers = dict(authorization="Bearer TEST")
+    resp = client.get("/api/v1/users?page_size=2000", headers=headers)
+    expected = [u["email"] for u in resp.json]
+    assert len(expected) > 5
+
+    emails, url = [], "/api/v1/users?page_size=2&cursor="
+    while url:
+        resp = client.get(url, headers=headers)
+        assert resp.status_code == 200
+        assert "Pagination-Page" not in resp.headers
+        emails.extend(u["email"] for u in resp.json)
+        if len(emails) == 2:
+            # the rows inserted while paging don't shift the following pages:
+            org = User.get(email=emails[0]).organisation
+            User.create(email="new.user@test0.edu", organisation=org)
+            expected.append("new.user@test0.edu")
+        url = next((
+            link.strip()[1:].split(">")[0]
+            for link in resp.headers["Link"].split(",") if link.endswith('rel="next"')), None)
+    assert emails == expected
+
+    resp = client.get("/api/v1/users?cursor=INVALID", headers=headers)
+    assert resp.status_code == 400
+
+
+def test_conditional_requests(client, mocker):
+    """Test the entity tags and the conditional GET/HEAD requests of the task and user APIs."""
+    headers = dict(authorization="Bearer TEST")
+    org = Token.get(access_token="TEST").client.org
+    task = FundingRecord.load_from_csv(
+        "title,type,org name,city,country,email,external identifier type,"
+        "external identifier value,external identifier relationship\n"
+        "TITLE,CONTRACT,ORG,Wellington,NZ,test@test.edu,grant_number,GNS,PART_OF",
+        filename="fundings.csv",
+        org=org)
+    url = f"/api/v1/funds/{task.id}"
+
+    resp = client.get(url, headers=headers)
+    assert resp.status_code == 200
+    etag, last_modified = resp.headers["ETag"], resp.headers["Last-Modified"]
+
+    to_export_dict = mocker.spy(Task, "to_export_dict")
+    for method in [client.get, client.head]:
+        resp = method(url, headers=dict(headers, **{"If-None-Match": etag}))
+        assert resp.status_code == 304 and resp.headers["ETag"] == etag and not resp.data
+        resp = method(url, headers=dict(headers, **{"If-Modified-Since": last_modified}))
+        assert resp.status_code == 304
+    to_export_dict.assert_not_called()
+
+    resp = client.get(url, headers=dict(headers, **{"If-None-Match": '"OTHER"'}))
+    assert resp.status_code == 200 and resp.headers["ETag"] == etag
+    resp = client.get(url + "?format=yaml", headers=dict(headers, **{"If-None-Match": etag}))
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+    # the changes of the records and their invitees, external IDs, etc. bump the change token:
+    record = FundingRecord.get(task=task)
+    invitee, external_id = record.invitees.first(), record.external_ids.first()
+    invitee.first_name, external_id.value = "NEW NAME", "NEW VALUE"
+    processed = FundingInvitee.get(invitee.id)
+    processed.put_code, processed.processed_at = 1234, datetime.utcnow()
+    for change in [
+            invitee.save,
+            external_id.save,
+            lambda: save_batch_entries([processed]),
+            lambda: update_task_records(
+                task, values={"is_active": True}, record_ids=[record.id], enqueue=False),
+            invitee.delete_instance,
+    ]:
+        change()
+        resp = client.get(url, headers=dict(headers, **{"If-None-Match": etag}))
+        assert resp.status_code == 200 and resp.headers["ETag"] != etag
+        etag = resp.headers["ETag"]
+
+    for url in ["/api/v1/tasks", "/api/v1/users"]:
+        resp = client.get(url, headers=headers)
+        assert resp.status_code == 200
+        etag = resp.headers["ETag"]
+        resp = client.get(url, headers=dict(headers, **{"If-None-Match": etag}))
+        assert resp.status_code == 304
+    User.create(email="new.user@test0.edu", organisation=org)
+    resp = client.get(url, headers=dict(headers, **{"If-None-Match": etag}))
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+
+def test_task_records_bulk_update(client, mocker):
+    """Test the bulk update of the task records."""
+    headers = dict(authorization="Bearer TEST")
+    token = Token.get(access_token="TEST")
+    task = FundingRecord.load_from_csv(
+        "title,type,org name,city,country,email,external identifier type,"
+        "external identifier value,external identifier relationship\n"
+        + "\n".join(
+            f"TITLE #{i},CONTRACT,ORG,Wellington,NZ,test{i}@test.edu,grant_number,GNS{i},PART_OF"
+            for i in range(5)),
+        filename="fundings.csv",
+        org=token.client.org)
+    task.created_by = token.user
+    task.save()
+    url = f"/api/v1/tasks/{task.id}/records"
+    ids = [r.id for r in task.records.order_by(FundingRecord.id)]
+    etag = client.get(f"/api/v1/tasks/{task.id}", headers=headers).headers["ETag"]
+
+    queue = mocker.patch("orcid_hub.utils.process_funding_records.queue")
+    mocker.patch.dict(client.application.config, PROCESS_CHUNK_SIZE=2)
+    execute_sql = mocker.spy(FundingRecord._meta.database, "execute_sql")
+    resp = client.patch(url, json={"ids": ids[:2], "set": {"is-active": True}}, headers=headers)
+    assert resp.status_code == 200 and resp.json["count"] == 2
+    assert len([c for c in execute_sql.call_args_list if c[0][0].startswith("UPDATE")]) == 2
+    assert FundingRecord.select().where(FundingRecord.is_active).count() == 2
+    queue.assert_called_once_with(record_id=ids[:2], max_rows=None)
+    assert client.get(f"/api/v1/tasks/{task.id}", headers=headers).headers["ETag"] != etag
+
+    queue.reset_mock()
+    resp = client.patch(
+        url, data="filter:\n  is-active: false\nset:\n  is-active: true\n",
+        content_type="text/yaml", headers=headers)
+    assert resp.json["count"] == 3
+    assert [c[1]["record_id"] for c in queue.call_args_list] == [ids[:2], ids[2:4], ids[4:]]
+
+    # the records that are already active keep their status:
+    FundingRecord.update(status="Error processing record").where(FundingRecord.id == ids[0]).execute()
+    resp = client.patch(url, json={"ids": ids[:3], "set": {"is-active": True}}, headers=headers)
+    assert resp.json["count"] == 0
+    resp = client.patch(
+        url, json={"ids": ids[:1], "set": {"is-active": True, "title": "NEW"}}, headers=headers)
+    assert resp.json["count"] == 1
+    record = FundingRecord.get(ids[0])
+    assert record.title == "NEW" and record.status == "Error processing record"
+
+    FundingRecord.update(processed_at=datetime.utcnow()).execute()
+    FundingInvitee.update(processed_at=datetime.utcnow()).execute()
+    # an invitee deferred after a transient failure:
+    FundingInvitee.update(
+        processed_at=None, retry_count=2, claimed_until=datetime.utcnow() + timedelta(hours=1)
+    ).where(FundingInvitee.record == ids[0]).execute()
+    queue.reset_mock()
+    resp = client.patch(url, json={"filter": {"type": "contract", "url": None}, "reset": True}, headers=headers)
+    assert resp.json["count"] == 5
+    assert not FundingRecord.select().where(FundingRecord.processed_at.is_null(False)).exists()
+    assert not FundingInvitee.select().where(FundingInvitee.processed_at.is_null(False)).exists()
+    invitee = FundingInvitee.get(record=ids[0])
+    assert not invitee.is_deferred and invitee.claimed_until is None and invitee.retry_count == 0
+    assert queue.call_count == 3
+
+    for data in [
+            {"set": {"processed-at": None}},
+            {"set": {"no-such-field": 1}},
+            {"filter": {"task": 1}, "set": {"is-active": False}},
+            {"ids": "ABC", "set": {"is-active": False}},
+            {"ids": ids},
+    ]:
+        resp = client.patch(url, json=data, headers=headers)
+        assert resp.status_code == 422
+    resp = client.patch("/api/v1/tasks/999999/records", json={"reset": True}, headers=headers)
+    assert resp.status_code == 404
+
+
 def test_affiliation_api(client, mocker):
     """Test affiliation API in various formats."""
     exception = mocker.patch.object(client.application.logger, "exception")
@@ -1517,6 +1682,219 @@ def test_proxy_get_profile(client):
     assert resp.status_code == 403
 
 
+def test_proxy_streaming(client, mocker):
+    """Test the proxy streams the response and logs only its beginning."""
+    token = Token.get(user=User.get(email="app123@test0.edu"))
+    orcid_id = "0000-0000-0000-00X3"
+    mocker.patch.dict(client.application.config, {"ORCID_PROXY_LOG_MAX_SIZE": 100})
+    content = json.dumps({"data": ["TEST"] * 1000}).encode()
+    body = gzip.compress(content)
+    chunks = [body[i:i + 100] for i in range(0, len(body), 100)]
+
+    mockresp = MagicMock(status_code=200)
+    mockresp.raw.stream = lambda *args, **kwargs: iter(chunks)
+    mockresp.raw.headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    send = mocker.patch("orcid_hub.apis.requests.Session.send", return_value=mockresp)
+    resp = client.get(
+        f"/orcid/api/v3.0/{orcid_id}", headers=dict(authorization=f"Bearer {token.access_token}"))
+    assert resp.status_code == 200
+    assert resp.data == body
+    assert send.call_args[1]["timeout"] == (5, 60)
+    mockresp.close.assert_called_once()
+    call = OrcidApiCall.select().order_by(OrcidApiCall.id.desc()).first()
+    assert call.status == 200
+    assert call.response == content[:100].decode()
+
+    send.side_effect = requests.exceptions.ConnectTimeout("TIME-OUT")
+    resp = client.get(
+        f"/orcid/api/v3.0/{orcid_id}",
+        headers={"authorization": f"Bearer {token.access_token}", "Cache-Control": "no-cache"})
+    assert resp.status_code == 504
+    assert OrcidApiCall.select().order_by(OrcidApiCall.id.desc()).first().status == 504
+
+
+def test_proxy_cache(client, mocker):
+    """Test the proxy GET responses get cached, revalidated and invalidated."""
+    token = Token.get(user=User.get(email="app123@test0.edu"))
+    orcid_id = "0000-0000-0000-00X3"
+    url = f"/orcid/api/v3.0/{orcid_id}/works"
+    headers = dict(authorization=f"Bearer {token.access_token}")
+    proxy_cache.connection.delete(f"{proxy_cache.key}:stats")
+
+    def upstream_response(status_code, body=b"", **headers):
+        resp = MagicMock(status_code=status_code)
+        resp.raw.stream = lambda *args, **kwargs: iter([body])
+        resp.raw.headers = {"Content-Type": "application/json", **headers}
+        return resp
+
+    send = mocker.patch(
+        "orcid_hub.apis.requests.Session.send",
+        return_value=upstream_response(200, b"""{"data": "TEST"}""", ETag='"V1"'))
+    resp = client.get(url, headers=headers)
+    assert resp.headers["X-Cache"] == "MISS"
+    assert resp.json == {"data": "TEST"}
+
+    resp = client.get(url, headers=headers)
+    assert resp.headers["X-Cache"] == "HIT"
+    assert resp.json == {"data": "TEST"}
+    send.assert_called_once()
+
+    # stale entries get revalidated:
+    send.return_value = upstream_response(304)
+    mocker.patch.object(proxy_cache, "max_age", 0)
+    resp = client.get(url, headers=headers)
+    assert resp.headers["X-Cache"] == "REVALIDATED"
+    assert resp.status_code == 200 and resp.json == {"data": "TEST"}
+    assert send.call_args[0][0].headers["If-None-Match"] == '"V1"'
+
+    # the webhook invalidates the cached responses of the profile:
+    user = User.get(orcid=orcid_id)
+    client.post(f"/services/{user.id}/updated")
+    send.return_value = upstream_response(200, b"""{"data": "NEW"}""")
+    resp = client.get(url, headers=headers)
+    assert resp.headers["X-Cache"] == "MISS"
+    assert resp.json == {"data": "NEW"}
+    assert "If-None-Match" not in send.call_args[0][0].headers
+
+    # so does writing to the profile:
+    assert proxy_cache.connection.smembers(f"{proxy_cache.key}:{orcid_id}")
+    send.return_value = upstream_response(201)
+    client.post(url, headers=headers, data=b"""{"data": "NEW"}""")
+    assert proxy_cache.connection.smembers(f"{proxy_cache.key}:{orcid_id}") == set()
+
+    assert proxy_cache.stats() == {"hit": 1, "miss": 2, "revalidated": 1}
+
+
+def test_proxy_cache_invalidated_while_revalidating():
+    """Test the revalidation doesn't resurrect an entry invalidated in the meantime."""
+    connection = fakeredis.FakeStrictRedis()
+    cache = ProxyCache(ttl=600, connection=connection)
+    orcid_id = "0000-0000-0000-00X3"
+    cache.set(orcid_id, "v3.0", "works", status=200, headers={}, body=b"{}", etag='"V1"')
+    assert cache.get(orcid_id, "v3.0", "works")["etag"] == '"V1"'
+    cache.invalidate(orcid_id)
+    cache.touch(orcid_id, "v3.0", "works")
+    assert not connection.exists(cache.entry_key(orcid_id, "v3.0", "works"))
+    assert cache.get(orcid_id, "v3.0", "works") is None
+
+    # the revalidation extends the life of the entry:
+    cache.set(orcid_id, "v3.0", "works", status=200, headers={}, body=b"{}")
+    key = cache.entry_key(orcid_id, "v3.0", "works")
+    connection.expire(key, 10)
+    cache.touch(orcid_id, "v3.0", "works")
+    assert connection.ttl(key) > 10
+
+    # incomplete entries are treated as misses:
+    connection.hdel(key, "status")
+    assert cache.get(orcid_id, "v3.0", "works") is None
+
+
+def test_orcid_batch(client, mocker):
+    """Test batched ORCID API calls and the retrieval of their outcome."""
+    token = Token.get(user=User.get(email="app123@test0.edu"))
+    orcid_id = "0000-0000-0000-00X3"
+    headers = dict(authorization=f"Bearer {token.access_token}")
+
+    resp = client.post("/orcid/batch", headers=headers, json={"method": "GET"})
+    assert resp.status_code == 400
+    resp = client.post("/orcid/batch", headers=headers, json=[{"path": "v3.0/ABC/works"}])
+    assert resp.status_code == 400
+    mocker.patch.dict(client.application.config, ORCID_PROXY_BATCH_MAX_SIZE=2)
+    resp = client.post("/orcid/batch", headers=headers, json=[{"path": f"v3.0/{orcid_id}"}] * 3)
+    assert resp.status_code == 413
+    mocker.patch.dict(client.application.config, ORCID_PROXY_BATCH_MAX_SIZE=10)
+
+    send = mocker.patch(
+        "orcid_hub.apis.requests.Session.send",
+        return_value=MagicMock(status_code=200,
+                               headers={"Content-Type": "application/json"},
+                               text="""{"data": "TEST"}"""))
+    resp = client.post("/orcid/batch",
+                       headers=headers,
+                       json=[
+                           {"path": f"v3.0/{orcid_id}/works"},
+                           {"method": "POST", "path": f"v3.0/{orcid_id}/work", "body": {"a": 1}},
+                           {"path": "v3.0/0000-0001-8228-7153/works"},
+                       ])
+    assert resp.status_code == 202
+    assert resp.json["size"] == 3
+    response_url = resp.json["response-url"]
+    assert resp.headers["ORCIDHub-AsyncOperation-Response"] == response_url
+    assert send.call_count == 2
+    req = send.call_args_list[1][0][0]
+    assert req.method == "POST" and req.body == '{"a": 1}'
+
+    resp = client.get(response_url, headers=headers)
+    assert resp.json["total"] == 3 and resp.json["completed"] == 3
+    results = resp.json["results"]
+    assert [r["status"] for r in results] == [200, 200, 403]
+    assert results[0]["body"] == """{"data": "TEST"}"""
+
+    resp = client.get(response_url + "?page_size=2", headers=headers)
+    assert len(resp.json["results"]) == 2
+    assert "page=2" in resp.headers["Link"]
+
+    resp = client.get(response_url + "?format=ndjson", headers=headers)
+    assert resp.mimetype == "application/x-ndjson"
+    assert [json.loads(line)["seq"] for line in resp.data.splitlines()] == [0, 1, 2]
+
+    resp = client.get(f"/orcid/batch/{uuid4()}", headers=headers)
+    assert resp.status_code == 404
+
+    # the calls of the profiles the access to which got revoked in the meantime don't get sent:
+    batch_id, url = uuid4(), "https://api.sandbox.orcid.org/v3.0/0000-0001-8228-7153/works"
+    AsyncOrcidResponse.create(job_id=uuid4(), batch_id=batch_id, seq=0, method="GET", url=url)
+    send.reset_mock()
+    exeute_orcid_batch_async(
+        str(batch_id), [(0, "GET", url, "0000-0001-8228-7153", None)],
+        user_id=token.user_id, org_id=token.user.organisation_id)
+    send.assert_not_called()
+    r = AsyncOrcidResponse.get(batch_id=batch_id)
+    assert r.status_code == 403 and r.executed_at
+
+
+def test_token_cache(client, mocker):
+    """Test the resolved access tokens get cached and purged on the revocation."""
+    token = Token.get(user=User.get(email="app123@test0.edu"))
+    orcid_id = "0000-0000-0000-00X3"
+    url = f"/orcid/api/v3.0/{orcid_id}/works"
+    headers = dict(authorization=f"Bearer {token.access_token}", cache_control="no-cache")
+    resp = MagicMock(status_code=200)
+    resp.raw.stream = lambda *args, **kwargs: iter([b"""{"data": "TEST"}"""])
+    resp.raw.headers = {"Content-Type": "application/json"}
+    mocker.patch("orcid_hub.apis.requests.Session.send", return_value=resp)
+    token_select = mocker.spy(Token, "select")
+    orcid_token_select = mocker.spy(OrcidToken, "select")
+
+    for _ in range(3):
+        assert client.get(url, headers=headers).status_code == 200
+    token_select.assert_called_once()
+    orcid_token_select.assert_called_once()
+
+    # other processes discard their entries on the next lookup after the revocation:
+    other_cache = TokenCache(connection=token_cache.connection)
+    other_cache.get("KEY", lambda: "VALUE")
+    assert other_cache.get("KEY", lambda: "NEW VALUE") == "VALUE"
+    OrcidToken.get(user=User.get(orcid=orcid_id), org=token.user.organisation).delete_instance()
+    assert other_cache.get("KEY", lambda: "NEW VALUE") == "NEW VALUE"
+    assert client.get(url, headers=headers).status_code == 403
+
+    # the ORCID iD changes and the cascaded deletions of the tokens purge the cache too:
+    user = User.get(orcid=orcid_id)
+    user.orcid = "0000-0001-8228-7153"
+    user.save()
+    assert other_cache.get("KEY", lambda: "USER UPDATED") == "USER UPDATED"
+    user.name = "NEW NAME"
+    user.save()
+    assert other_cache.get("KEY", lambda: "NEW VALUE") == "USER UPDATED"
+    user.delete_instance()
+    assert other_cache.get("KEY", lambda: "USER DELETED") == "USER DELETED"
+
+    token.expires = datetime.now() - timedelta(seconds=1)
+    token.save()
+    assert client.get(url, headers=headers).status_code == 401
+
+
 def test_property_api(client, mocker):
     """Test property API in various formats."""
     admin = client.data.get("admin")
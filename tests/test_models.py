@@ -1,21 +1,26 @@
 import json
 import os
-from datetime import datetime
-from io import StringIO
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
 from itertools import product
+from tempfile import SpooledTemporaryFile
 
+import chardet
 import pytest
 from peewee import Model, SqliteDatabase
 
 from orcid_hub import JSONEncoder
 from orcid_hub.models import (
     Affiliation, AffiliationRecord, AffiliationExternalId, BaseModel, BooleanField, ExternalId,
-    File, ForeignKeyField, FundingContributor, FundingInvitee, FundingRecord, Log, ModelExceptionError,
+    File, ForeignKeyField, FundingContributor, FundingInvitee, FundingRecord, HeaderMap, Log,
+    ModelExceptionError,
     NestedDict, OrcidToken, Organisation, OrgInfo, OrcidApiCall, PartialDate, PartialDateField,
     PropertyRecord, PeerReviewExternalId, PeerReviewInvitee, PeerReviewRecord, ResourceRecord,
     Role, Task, TaskType, TaskTypeField, TextField, User, UserInvitation, UserOrg,
     UserOrgAffiliation, WorkContributor, WorkExternalId, WorkInvitee, WorkRecord, app,
-    create_tables, drop_tables, load_yaml_json, validate_orcid_id)
+    create_tables, detect_encoding, drop_tables, load_yaml_json, open_upload, partition_tables,
+    readup_file,
+    validate_orcid_id)
 
 from utils import readup_test_data
 
@@ -772,3 +777,139 @@ def test_load_resources_from_csv(models):
     assert task.records.count() == 2
 
 
+
+
+def test_bulk_inserter(testdb, mocker):
+    """Test the task records get loaded in chunks with their related records."""
+    mocker.patch.dict(app.config, BULK_INSERT_CHUNK_SIZE=1)
+    insert_many = mocker.spy(FundingRecord, "insert_many")
+    org = Organisation.get()
+    task = FundingRecord.load_from_csv(
+        """title,type,org name,city,country,email,orcid,external identifier type,external identifier value,external identifier relationship
+TITLE #1,CONTRACT,ORG,Wellington,NZ,test1@test.edu,,grant_number,GNS1,PART_OF
+TITLE #1,CONTRACT,ORG,Wellington,NZ,test2@test.edu,,grant_number,GNS1,PART_OF
+TITLE #1,CONTRACT,ORG,Wellington,NZ,test1@test.edu,,grant_number,GNS2,PART_OF
+TITLE #2,CONTRACT,ORG,Wellington,NZ,test1@test.edu,,grant_number,GNS3,PART_OF
+""",  # noqa: E501
+        filename="fundings.csv",
+        org=org)
+    assert insert_many.call_count == 2
+    assert task.records.count() == 2
+    fr = task.records.where(FundingRecord.title == "TITLE #1").first()
+    assert {i.email for i in fr.invitees} == {"test1@test.edu", "test2@test.edu"}
+    assert {e.value for e in fr.external_ids} == {"GNS1", "GNS2"}
+    fr = task.records.where(FundingRecord.title == "TITLE #2").first()
+    assert [i.email for i in fr.invitees] == ["test1@test.edu"]
+    assert [e.value for e in fr.external_ids] == ["GNS3"]
+
+    with pytest.raises(ModelExceptionError):
+        FundingRecord.load_from_csv(
+            """title,type,org name,city,country,email,external identifier type,external identifier value
+TITLE #1,CONTRACT,ORG,Wellington,NZ,test1@test.edu,grant_number,GNS1
+,CONTRACT,ORG,Wellington,NZ,test1@test.edu,grant_number,GNS1
+""",  # noqa: E501
+            filename="fundings.csv",
+            org=org)
+    assert Task.select().count() == 1
+    assert FundingRecord.select().count() == 2
+
+
+def test_header_map():
+    """Test the mapping of the upload columns to the record fields."""
+    header_map = HeaderMap(
+        r"first\s*(name)?", r"last\s*(name)?", email="e-?mail", orcid=r"orcid\s*(id)?")
+    val = header_map.reader(["Email", "", " First Name ", "Last Name"])
+    row = ["test@test.edu", "", " Jane ", ""]
+    assert val(row, 0) == "Jane"
+    assert val(row, 1) is None and val(row, 1, "N/A") == "N/A"
+    assert val(row, "email") == "test@test.edu"
+    assert val(row, "orcid") is None
+    assert val(row, 42) is None
+    assert val(["test@test.edu"], 0) is None
+
+    header_map.reader(["Email", "", " First Name ", "Last Name"])
+    assert header_map.indexes.cache_info().hits == 1
+
+    with pytest.raises(ModelExceptionError):
+        header_map.reader(["A", "B"])
+
+
+def test_open_upload(mocker):
+    """Test the encoding detection and the incremental decoding of the uploaded files."""
+    content = "Name\tCity\nCafé Zoë\tWellington\nCrème brûlée\tRotorua\n"
+    assert detect_encoding(content.encode("utf-8")) == "utf-8"
+    assert detect_encoding(content.encode("utf-8-sig")) == "utf-8-sig"
+    assert detect_encoding(content.encode("utf-16")) == "utf-16"
+    # a multibyte character truncated at the end of the sample:
+    assert detect_encoding(content.encode("utf-8")[:14]) == "utf-8"
+
+    detect = mocker.spy(chardet, "detect")
+    for encoding in ["utf-8", "utf-8-sig", "utf-16", "cp1252"]:
+        raw = (content * 100).encode(encoding)
+        with SpooledTemporaryFile(max_size=100) as f:
+            f.write(raw)
+            f.seek(0)
+            source = open_upload(f, sample_size=200)
+            assert next(source) == "Name\tCity\n"
+            source.seek(0)
+            assert source.read() == content * 100
+        assert readup_file(BytesIO(raw)) == content * 100
+    assert all(len(c[0][0]) <= 65536 for c in detect.call_args_list)
+
+    # a single-byte encoded file with the beginning (the sample) in plain ASCII:
+    content = "Name\tCity\n" + "John Smith\tWellington\n" * 5000 + "Café Zoë\tRotorua\n"
+    for encoding in ["latin-1", "cp1252"]:
+        with SpooledTemporaryFile(max_size=100) as f:
+            f.write(content.encode(encoding))
+            f.seek(0)
+            source = open_upload(f)
+            assert source.read() == content
+
+
+def test_to_export_dicts(app, mocker):
+    """Test the bulk export serialisation of the composite records."""
+    org = app.data["org"]
+    for no in range(2):
+        task = FundingRecord.load_from_csv(
+            "title,type,org name,city,country,email,external identifier type,"
+            "external identifier value,external identifier relationship\n"
+            + "\n".join(
+                f"TITLE #{i},CONTRACT,ORG,Wellington,NZ,test{i}@test.edu,grant_number,GNS{i},PART_OF"
+                for i in range(3)),
+            filename=f"fundings{no}.csv",
+            org=org)
+        for r in task.records:
+            FundingContributor.create(record=r, name=f"{r.title} Contributor", role="lead")
+
+    expected = [r.to_export_dict() for r in FundingRecord.select().order_by(FundingRecord.id)]
+    assert len(expected) == 6 and all(d["invitees"] and d["contributors"] for d in expected)
+
+    execute_sql = mocker.spy(FundingRecord._meta.database, "execute_sql")
+    assert FundingRecord.to_export_dicts(FundingRecord.select().order_by(FundingRecord.id)) == expected
+    # the records, a query per related model and the tasks:
+    assert execute_sql.call_count == 5
+
+    assert FundingRecord.to_export_dicts([]) == []
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL", "").startswith("postgres"), reason="PostgreSQL only")
+def test_partition_tables(testdb):
+    """Test partitioning of the ORCID API call log holding the calls of the current month."""
+    OrcidApiCall.drop_table(cascade=True)
+    OrcidApiCall.create_table()
+    now = datetime.utcnow()
+    for days in [0, 40, 400]:
+        OrcidApiCall.create(called_at=now - timedelta(days=days), method="GET", url="https://test")
+
+    partition_tables()
+    assert testdb.execute_sql(
+        "SELECT relkind FROM pg_class WHERE oid = 'orcid_api_call'::regclass").fetchone()[0] == "p"
+    assert OrcidApiCall.select().count() == 3
+    assert testdb.execute_sql(
+        f"SELECT count(*) FROM orcid_api_call_{now:%Y_%m}").fetchone()[0] == 1
+    assert testdb.execute_sql("SELECT count(*) FROM orcid_api_call_legacy").fetchone()[0] == 2
+
+    OrcidApiCall.create(method="GET", url="https://test")
+    assert testdb.execute_sql(
+        f"SELECT count(*) FROM orcid_api_call_{now:%Y_%m}").fetchone()[0] == 2
@@ -2,19 +2,28 @@
 """Tests related to ORCID affilation."""
 
 import json
+import os
+import threading
 import time
+from itertools import count
 from unittest.mock import DEFAULT, MagicMock, Mock, call, patch
 from requests.packages.urllib3.response import HTTPHeaderDict
 
+import fakeredis
 import pytest
 import requests_oauthlib
+from peewee import SqliteDatabase
+import urllib3
 from flask import session, url_for
 from flask_login import login_user
 
 from orcid_hub.models import (Affiliation, Log, OrcidApiCall, OrcidToken, Organisation, Role, Task,
                               TaskType, User, UserOrg)  # noqa:E404
-from orcid_hub.orcid_client import (ApiException, MemberAPI, MemberAPIV3, api_client,
-                                    configuration, NestedDict)  # noqa:E404
+from orcid_hub.orcid_client import (AdaptiveConcurrency, ApiCallLog, ApiException, CircuitBreaker,
+                                    MemberAPI, MemberAPIV3, api_call_log, api_client, configuration,
+                                    dump_response, is_retryable, load_response, NestedDict,
+                                    profile_cache, retry_delay, SingleFlight)  # noqa:E404
+from orcid_hub.queuing import RateLimiter, Worker, rq
 import orcid_api_v3 as v3
 
 from utils import get_profile
@@ -219,6 +228,305 @@ def test_is_emp_or_edu_record_present(app, mocker):
             "Failed to verify presence of employment or education record.")
 
 
+def test_rate_limiter(mocker):
+    """Test ORCID API call rate limiting shared via Redis."""
+    server = fakeredis.FakeServer()
+    connection = fakeredis.FakeStrictRedis(server=server)
+    mocker.patch("orcid_hub.queuing.time", return_value=1000.0)
+    sleep = mocker.patch("orcid_hub.queuing.sleep")
+    # the shared buckets get updated using the injected clock instead of the Redis server one:
+    clock = lambda: 1000.0  # noqa: E731
+    limiter = RateLimiter(
+        rate=10, burst=2, org_rate=1, org_burst=1, connection=connection, clock=clock)
+    limiter.acquire()
+    limiter.acquire()
+    sleep.assert_not_called()
+    limiter.acquire()
+    sleep.assert_called_once_with(pytest.approx(0.1))
+
+    # the buckets are shared by all the limiter instances (processes):
+    other = RateLimiter(
+        rate=10, burst=2, org_rate=1, org_burst=1, connection=connection, clock=clock)
+    assert other.reserve() == pytest.approx(0.2)
+    # the organisation budget:
+    assert other.reserve(123) == pytest.approx(0.3)
+    assert other.reserve(123) == pytest.approx(1)
+    assert other.reserve(321) == pytest.approx(0.5)
+    assert connection.exists("orcidhub:ratelimit:123")
+
+    # falls back to the local buckets if Redis is not available:
+    server.connected = False
+    limiter = RateLimiter(rate=10, burst=1, connection=connection)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.1)
+
+    sleep.reset_mock()
+    RateLimiter().acquire()
+    sleep.assert_not_called()
+
+
+def test_retry_backoff(mocker):
+    """Test the classification of the retryable failures and the adaptive concurrency."""
+    assert is_retryable(v3.rest.ApiException(status=429))
+    assert is_retryable(v3.rest.ApiException(status=503))
+    assert not is_retryable(v3.rest.ApiException(status=400))
+    assert not is_retryable(ValueError())
+
+    ex = v3.rest.ApiException(status=429)
+    assert all(0 <= retry_delay(ex, 0) <= 60 for _ in range(10))
+    assert all(0 <= retry_delay(ex, 10) <= 3600 for _ in range(10))
+    ex.headers = {"Retry-After": "120"}
+    assert retry_delay(ex) >= 120
+
+    mocker.patch("orcid_hub.orcid_client.time", side_effect=count(start=100, step=10))
+    concurrency = AdaptiveConcurrency(8, latency_target=2)
+    assert concurrency.workers() == 8
+    concurrency.record(0.5, failed=True)
+    concurrency.record(0.5, failed=True)
+    assert concurrency.workers() == 2
+    assert concurrency.workers(1) == 1
+    concurrency.record(10)
+    assert concurrency.workers() == 1
+    for _ in range(100):
+        concurrency.record(0.1)
+    assert concurrency.workers() == 8
+
+
+def test_circuit_breaker(mocker):
+    """Test ORCID API circuit breaker state transitions."""
+    now = mocker.patch("orcid_hub.orcid_client.time", return_value=1000.0)
+    cb = CircuitBreaker(threshold=2, reset_timeout=60, connection=fakeredis.FakeStrictRedis())
+    assert cb.state == cb.CLOSED and cb.allow()
+    cb.record_failure()
+    assert cb.state == cb.CLOSED
+    cb.record_failure()
+    assert cb.state == cb.OPEN and not cb.allow()
+    assert cb.retry_in() == 60
+
+    # a single probe call is let through after the reset timeout:
+    now.return_value += 61
+    assert cb.state == cb.HALF_OPEN and cb.retry_in() == 0
+    assert cb.allow()
+    assert not cb.allow()
+    cb.record_failure()
+    assert cb.state == cb.OPEN
+
+    now.return_value += 61
+    assert cb.allow()
+    cb.record_success()
+    assert cb.state == cb.CLOSED and cb.allow()
+
+
+def test_profile_cache(app, mocker):
+    """Test the profile gets fetched only once within a job unless it gets modified."""
+    org = app.data["org"]
+    user = User.create(
+        orcid="1001-0001-0001-0042",
+        name="TEST USER 42",
+        email="test42@test.test.net",
+        organisation=org,
+        confirmed=True)
+    OrcidToken.create(access_token="ACCESS42", user=user, org=org,
+                      scopes="/read-limited,/activities/update")
+    api = MemberAPIV3(user=user, org=org)
+    request_mock = mocker.patch.object(
+        api.api_client.rest_client.pool_manager, "request",
+        MagicMock(return_value=Mock(data=b"""{"mock": "data"}""", status=200)))
+
+    api.get_record()
+    api.get_record()
+    assert request_mock.call_count == 2
+
+    request_mock.reset_mock()
+    with profile_cache():
+        assert api.get_record() == {"mock": "data"}
+        with profile_cache():
+            assert api.get_record() == {"mock": "data"}
+        request_mock.assert_called_once()
+
+        api.api_client.rest_client.request(
+            "DELETE", f"https://api.sandbox.orcid.org/v3.0/{user.orcid}/work/123")
+        api.get_record()
+        assert request_mock.call_count == 3
+
+    api.get_record()
+    assert request_mock.call_count == 4
+
+
+def test_shared_pool_manager(app, mocker):
+    """Test ORCID API clients share the connection pool but not the access tokens."""
+    org = app.data["org"]
+    users = [
+        User.create(orcid=f"1001-0001-0001-010{i}", name=f"TEST USER {i}",
+                    email=f"test10{i}@test.test.net", organisation=org, confirmed=True)
+        for i in range(2)
+    ]
+    apis = [MemberAPIV3(user=u, org=org, access_token=f"ACCESS10{i}") for i, u in enumerate(users)]
+    pool_manager = apis[0].api_client.rest_client.pool_manager
+    assert apis[1].api_client.rest_client.pool_manager is pool_manager
+    assert MemberAPIV3(org=org).api_client.rest_client.pool_manager is pool_manager
+    assert pool_manager.connection_pool_kw["maxsize"] == app.config["ORCID_API_POOL_MAXSIZE"]
+
+    request_mock = mocker.patch.object(
+        pool_manager, "request",
+        MagicMock(return_value=Mock(data=b"""{"mock": "data"}""", status=200)))
+    for api in apis:
+        api.get_record()
+    assert [c[1]["headers"]["Authorization"] for c in request_mock.call_args_list] == [
+        "Bearer ACCESS100", "Bearer ACCESS101"]
+
+
+def test_single_flight(app, mocker):
+    """Test the concurrent identical ORCID API reads share a single call."""
+    user = User.select().where(User.orcid.is_null(False)).first()
+    api = MemberAPIV3(org=app.data["org"], user=user, access_token="ACCESS000")
+
+    def slow_request(*args, **kwargs):
+        time.sleep(0.2)
+        return Mock(data=b"""{"mock": "data"}""", status=200)
+
+    request_mock = mocker.patch.object(
+        api.api_client.rest_client.pool_manager, "request", side_effect=slow_request)
+    records = []
+    threads = [threading.Thread(target=lambda: records.append(api.get_record())) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    request_mock.assert_called_once()
+    assert records == [{"mock": "data"}] * 3
+
+    # the outcome of the shared call gets recorded only once:
+    def failing_request(*args, **kwargs):
+        time.sleep(0.2)
+        raise urllib3.exceptions.ProtocolError("Connection aborted.")
+
+    request_mock.side_effect = failing_request
+    request_mock.reset_mock()
+    record_failure = mocker.patch("orcid_hub.orcid_client.circuit_breaker.record_failure")
+    record = mocker.patch("orcid_hub.orcid_client.concurrency.record")
+    add = mocker.patch("orcid_hub.orcid_client.api_call_log.add")
+    errors = []
+
+    def get_record():
+        try:
+            api.get_record()
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=get_record) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    request_mock.assert_called_once()
+    assert len(errors) == 3
+    record_failure.assert_called_once()
+    record.assert_called_once()
+    add.assert_called_once()
+
+    # across the processes:
+    connection = fakeredis.FakeStrictRedis()
+    sf = SingleFlight(timeout=1, connection=connection)
+    call = Mock(return_value="RESULT")
+    assert sf.do("KEY", call, str.encode, bytes.decode) == "RESULT"
+    call.assert_called_once()
+    assert connection.get("orcidhub:singleflight:KEY") == b"RESULT"
+    assert not connection.exists("orcidhub:singleflight:KEY:lock")
+
+    # another process is making the call:
+    connection.delete("orcidhub:singleflight:KEY")
+    connection.set("orcidhub:singleflight:KEY:lock", 1)
+    threading.Timer(0.1, lambda: connection.set("orcidhub:singleflight:KEY", b"SHARED")).start()
+    call.reset_mock()
+    assert sf.do("KEY", call, str.encode, bytes.decode) == "SHARED"
+    call.assert_not_called()
+
+    resp = load_response(dump_response(v3.rest.RESTResponse(urllib3.HTTPResponse(
+        body=b"DATA", headers={"Content-Type": "text/plain"}, status=200, reason="OK"))))
+    assert resp.status == 200 and resp.data == b"DATA"
+    assert resp.getheader("Content-Type") == "text/plain"
+
+
+def test_api_call_log(app, mocker):
+    """Test buffered ORCID API call audit logging."""
+    def entry(i):
+        return dict(method="GET", url=f"https://api.test.orcid.org/v3.0/{i}", status=200)
+
+    log = ApiCallLog(size=3, flush_interval=0, overflow="drop")
+    insert_many = mocker.spy(OrcidApiCall, "insert_many")
+    for i in range(5):
+        log.add(**entry(i))
+    assert log.dropped == 2
+    assert OrcidApiCall.select().count() == 0
+    assert log.flush() == 3
+    insert_many.assert_called_once()
+    assert OrcidApiCall.select().count() == 3
+    assert log.flush() == 0
+
+    log = ApiCallLog(size=3, flush_interval=0)
+    for i in range(5):
+        log.add(**entry(i))
+    assert log.dropped == 0
+    assert OrcidApiCall.select().count() == 6
+    assert log.flush() == 2
+    assert OrcidApiCall.select().count() == 8
+
+    # the entries get written by the background thread:
+    log = ApiCallLog(size=3, flush_interval=0.01)
+    flush = mocker.patch.object(log, "flush")
+    log.add(**entry(0))
+    time.sleep(0.1)
+    log.stop()
+    flush.assert_called()
+
+    # the calls get logged by the buffer:
+    mocker.patch.object(api_call_log, "size", 10)
+    mocker.patch.object(api_call_log, "flush_interval", 0)
+    user = User.select().where(User.orcid.is_null(False)).first()
+    api = MemberAPIV3(org=app.data["org"], user=user)
+    mocker.patch.object(
+        api.api_client.rest_client.pool_manager, "request",
+        MagicMock(return_value=Mock(data=b"""{"mock": "data"}""", status=200)))
+    OrcidApiCall.delete().execute()
+    api.get_record()
+    assert OrcidApiCall.select().count() == 0
+    api_call_log.flush()
+    oac = OrcidApiCall.get()
+    assert oac.status == 200 and oac.response == '{"mock": "data"}'
+
+
+def test_api_call_log_fork(app, mocker, tmp_path):
+    """Test the API call audit entries of the forked processes don't get lost."""
+    def entry(i):
+        return dict(method="GET", url=f"https://api.test.orcid.org/v3.0/{i}", status=200)
+
+    db = SqliteDatabase(str(tmp_path / "audit.db"))
+    with db.bind_ctx([OrcidApiCall]):
+        db.create_tables([OrcidApiCall])
+        log = ApiCallLog(size=10, flush_interval=60)
+        log.add(**entry(0))
+        pid = os.fork()
+        if pid == 0:  # a work-horse like child exiting without running the exit handlers:
+            try:
+                log.add(**entry(1))
+                log.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        assert [r.url[-1] for r in OrcidApiCall.select()] == ["1"]
+        assert log.flush() == 1
+        assert OrcidApiCall.select().count() == 2
+        log.stop()
+
+    # the entries buffered by a job get written at the end of the job:
+    perform_job = mocker.patch("rq.worker.Worker.perform_job", return_value=True)
+    flush = mocker.patch.object(api_call_log, "flush")
+    assert Worker([rq.get_queue()], connection=rq.connection).perform_job("JOB", "QUEUE")
+    perform_job.assert_called_once_with("JOB", "QUEUE")
+    flush.assert_called_once()
+
+
 @patch.object(requests_oauthlib.OAuth2Session, "authorization_url",
               lambda self, *args, **kwargs: ("URL_123", None))
 def test_link(request_ctx):
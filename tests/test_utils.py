@@ -2,22 +2,31 @@
 """Tests for util functions."""
 
 import codecs
+import json
 import logging
+from datetime import datetime, timedelta
 from io import BytesIO
-from itertools import groupby
+from itertools import count, groupby
 import random
 import string
+import threading
+import time
 from unittest.mock import Mock, patch
 
 import pytest
+import yaml
+from flask import json as flask_json
 from flask import make_response
 from peewee import JOIN
 from urllib.parse import quote
 
+import orcid_api_v3 as v3
+
 from orcid_hub import utils
 from orcid_hub.models import (AffiliationRecord, ExternalId, File, FundingContributor,
-                              FundingInvitee, FundingRecord, Log, OrcidToken, Organisation,
-                              OrgInfo, OtherIdRecord, PeerReviewExternalId, PeerReviewInvitee, PeerReviewRecord,
+                              FundingInvitee, FundingRecord, Log, ModelExceptionError, NestedDict, OrcidApiCall,
+                              OrcidToken, Organisation, OrgInfo, OtherIdRecord, PeerReviewExternalId,
+                              PeerReviewInvitee, PeerReviewRecord,
                               PropertyRecord, PartialDate, Role, Task, TaskType, User, UserInvitation, UserOrg,
                               WorkContributor, WorkExternalId, WorkInvitee, WorkRecord)
 
@@ -779,6 +788,299 @@ def test_process_other_id_records(app, mocker):
     assert "12344" == record.orcid
 
 
+def test_process_batch_query_count(app, mocker):
+    """Test that batch processing issues a fixed number of queries regardless of the batch size."""
+    org = app.data["org"]
+    update = mocker.patch("orcid_hub.utils.create_or_update_work")
+    users = User.select().join(
+        OrcidToken, on=((OrcidToken.user_id == User.id) & (OrcidToken.org_id == org.id))).where(
+            User.orcid.is_null(False), OrcidToken.scopes.contains("/activities/update"))
+    user = users.first()
+    task = Task.create(org=org, created_by=user, task_type=TaskType.WORK)
+
+    def add_records(count):
+        for i in range(count):
+            wr = WorkRecord.create(task=task, title=f"TITLE #{i}", type="BOOK", is_active=True)
+            WorkInvitee.create(record=wr, email=user.email, orcid=user.orcid)
+
+    execute_sql = mocker.spy(WorkRecord._meta.database, "execute_sql")
+    add_records(3)
+    execute_sql.reset_mock()
+    utils.process_work_records()
+    small_batch_count = execute_sql.call_count
+    assert update.call_count == 3
+
+    add_records(10)
+    update.reset_mock()
+    execute_sql.reset_mock()
+    utils.process_work_records()
+    assert update.call_count == 13
+    assert execute_sql.call_count == small_batch_count
+
+
+def test_process_batch_concurrently(app, mocker):
+    """Test the concurrent dispatch of the user record groups."""
+    org = app.data["org"]
+    task = Task.create(org=org, task_type=TaskType.WORK)
+    users = list(User.select().where(User.orcid.is_null(False)).limit(6))
+    for u in users:
+        OrcidToken.create(user=u, org=org, scopes="/activities/update", access_token=f"T-{u.id}")
+        wr = WorkRecord.create(task=task, title="TITLE", type="BOOK", is_active=True)
+        WorkInvitee.create(record=wr, email=u.email, orcid=u.orcid)
+
+    threads = set()
+
+    def update(user, org_id, rows):
+        threads.add(threading.get_ident())
+        time.sleep(0.05)
+        return user
+
+    invite = Mock()
+    task_ids, record_ids = utils.process_batch(
+        utils.batch_query(WorkRecord, WorkInvitee, max_rows=None),
+        utils.user_invitee_key,
+        update,
+        invite,
+        workers=3,
+    )
+    invite.assert_not_called()
+    assert task_ids == {task.id}
+    assert len(record_ids) == len(users)
+    assert 1 < len(threads) <= 3
+
+
+def test_claim_batch(app, mocker):
+    """Test that the concurrent workers claim disjoint batches of the records."""
+    org = app.data["org"]
+    user = User.select().join(OrcidToken, on=(OrcidToken.user_id == User.id)).where(
+        OrcidToken.org_id == org.id, OrcidToken.scopes.contains("/activities/update")).first()
+    task = Task.create(org=org, task_type=TaskType.WORK)
+    invitees = []
+    for i in range(4):
+        wr = WorkRecord.create(task=task, title=f"TITLE #{i}", type="BOOK", is_active=True)
+        invitees.append(WorkInvitee.create(record=wr, email=user.email, orcid=user.orcid))
+    now = datetime.utcnow()
+    # the first is being processed by another worker and the claim of the second one has expired:
+    WorkInvitee.update(claimed_by="OTHER", claimed_until=now + timedelta(minutes=10)).where(
+        WorkInvitee.id == invitees[0].id).execute()
+    WorkInvitee.update(claimed_by="CRASHED", claimed_until=now - timedelta(minutes=10)).where(
+        WorkInvitee.id == invitees[1].id).execute()
+
+    with utils.claim_batch(WorkRecord, WorkInvitee, max_rows=2) as rows:
+        assert [r.record.invitee.id for r in rows] == [invitees[1].id, invitees[2].id]
+        with utils.claim_batch(WorkRecord, WorkInvitee, max_rows=2) as other_rows:
+            assert [r.record.invitee.id for r in other_rows] == [invitees[3].id]
+        with utils.claim_batch(WorkRecord, WorkInvitee, max_rows=2) as other_rows:
+            assert [r.record.invitee.id for r in other_rows] == [invitees[3].id]
+    assert [(i.claimed_by, i.claimed_until) for i in WorkInvitee.select().order_by(WorkInvitee.id)][1:] == [
+        (None, None)] * 3
+
+    update = mocker.patch("orcid_hub.utils.create_or_update_work")
+    utils.process_work_records()
+    assert [c[0][2][0].record.id for c in update.call_args_list] == [i.record_id for i in invitees[1:]]
+    assert WorkInvitee.get(invitees[0].id).claimed_by == "OTHER"
+
+
+def test_schedule_retry(app, mocker):
+    """Test rescheduling of the records processing on ORCID API throttling."""
+    org = app.data["org"]
+    user = User.select().join(OrcidToken, on=(OrcidToken.user_id == User.id)).where(
+        OrcidToken.org_id == org.id, OrcidToken.scopes.contains("/activities/update")).first()
+    task = Task.create(org=org, task_type=TaskType.WORK)
+    wr = WorkRecord.create(task=task, title="TITLE", type="BOOK", is_active=True)
+    wi = WorkInvitee.create(record=wr, email=user.email, orcid=user.orcid)
+
+    mocker.patch("orcid_hub.orcid_client.MemberAPIV3.get_record",
+                 return_value={"activities-summary": {"works": {"group": []}}})
+    ex = v3.rest.ApiException(status=429)
+    ex.body = '{"user-message": "Too many requests"}'
+    create_or_update_work = mocker.patch(
+        "orcid_hub.orcid_client.MemberAPIV3.create_or_update_work", side_effect=ex)
+    utils.process_work_records()
+    create_or_update_work.assert_called_once()
+    wi = WorkInvitee.get(wi.id)
+    assert wi.processed_at is None and wi.retry_count == 1 and wi.is_deferred
+    assert "rescheduled" in wi.status
+    assert f"retry:work_record:{wr.id}" in [j.id for j in utils.rq.get_scheduler().get_jobs()]
+
+    # deferred records don't get picked up before the retry time:
+    create_or_update_work.reset_mock()
+    utils.process_work_records()
+    create_or_update_work.assert_not_called()
+
+    # the retry count gets cleared once the deferred entry gets processed:
+    WorkInvitee.update(claimed_until=datetime.utcnow()).execute()
+    create_or_update_work.side_effect = None
+    create_or_update_work.return_value = ("12399", user.orcid, True, "PUBLIC")
+    utils.process_work_records()
+    create_or_update_work.assert_called_once()
+    wi = WorkInvitee.get(wi.id)
+    assert wi.processed_at and wi.retry_count == 0 and not wi.is_deferred
+    create_or_update_work.reset_mock()
+    create_or_update_work.side_effect = ex
+    WorkInvitee.update(processed_at=None, status=None).execute()
+    WorkRecord.update(processed_at=None).execute()
+
+    # and once the retries are exhausted the failure gets recorded:
+    WorkInvitee.update(claimed_until=datetime.utcnow(), retry_count=5).execute()
+    utils.process_work_records()
+    create_or_update_work.assert_called_once()
+    wi = WorkInvitee.get(wi.id)
+    assert wi.processed_at and not wi.is_deferred
+    assert WorkRecord.get(wr.id).processed_at
+
+
+def test_save_batch_entries(app, mocker):
+    """Test that the outcomes of the processed entries get written back in bulk."""
+    org = app.data["org"]
+    user = User.select().join(OrcidToken, on=(OrcidToken.user_id == User.id)).where(
+        OrcidToken.org_id == org.id, OrcidToken.scopes.contains("/activities/update")).first()
+    task = Task.create(org=org, task_type=TaskType.WORK)
+    invitees = [
+        WorkInvitee.create(
+            record=WorkRecord.create(task=task, title=f"TITLE #{i}", type="BOOK", is_active=True),
+            email=user.email, orcid=user.orcid) for i in range(3)
+    ]
+    mocker.patch("orcid_hub.orcid_client.MemberAPIV3.get_record",
+                 return_value={"activities-summary": {"works": {"group": []}}})
+    mocker.patch("orcid_hub.orcid_client.MemberAPIV3.create_or_update_work",
+                 side_effect=[(f"1239{i}", user.orcid, True, "PUBLIC") for i in range(3)])
+    bulk_update = mocker.spy(WorkInvitee, "bulk_update")
+    save = mocker.spy(WorkInvitee, "save")
+    utils.process_work_records()
+    bulk_update.assert_called_once()
+    save.assert_not_called()
+    for i, wi in enumerate(invitees):
+        wi = WorkInvitee.get(wi.id)
+        assert wi.put_code == int(f"1239{i}") and wi.processed_at and "created" in wi.status
+    assert WorkRecord.select().where(WorkRecord.task == task, WorkRecord.processed_at.is_null()).count() == 0
+    assert Task.get(task.id).completed_at
+
+
+def test_process_batch_write_back(app, mocker):
+    """Test that the outcomes of each user group get written back as soon as it's updated."""
+    org = app.data["org"]
+    task = Task.create(org=org, task_type=TaskType.WORK)
+    users = [
+        User.create(email=f"batch{i}@test0.edu", orcid=f"0000-0000-0000-100{i}", organisation=org)
+        for i in range(2)
+    ]
+    rows = [
+        Mock(record=WorkRecord.create(task=task, title=f"TITLE #{i}", is_active=True), user=u)
+        for i, u in enumerate(users)
+    ]
+    mocker.patch("orcid_hub.utils.prefetch_batch", return_value={(u.id, org.id) for u in users})
+    processed = []
+
+    def update(user, org_id, rows):
+        # the outcomes of the earlier groups are already stored:
+        assert WorkRecord.select().where(
+            WorkRecord.task == task, WorkRecord.processed_at.is_null(False)).count() == len(processed)
+        for r in rows:
+            r.record.processed_at = datetime.utcnow()
+            utils.save_batch_entries([r.record])
+        processed.append(user)
+
+    utils.process_batch(rows, lambda r: (task.id, org.id, r.user), update, Mock(), workers=1)
+    assert processed == users
+
+
+def test_save_batch_affiliation_entries(app, mocker):
+    """Test that the outcomes of the processed affiliation records get written back in bulk."""
+    org = app.data["org"]
+    user = User.select().join(OrcidToken, on=(OrcidToken.user_id == User.id)).where(
+        OrcidToken.org_id == org.id, OrcidToken.scopes.contains("/activities/update")).first()
+    task = Task.create(org=org, task_type=TaskType.AFFILIATION)
+    records = [
+        AffiliationRecord.create(
+            task=task, is_active=True, email=user.email, orcid=user.orcid, organisation=org.name,
+            affiliation_type=affiliation_type, role=f"ROLE #{i}", country="NZ")
+        for i, affiliation_type in enumerate(["staff", "student", "UNKNOWN"])
+    ]
+    mocker.patch("orcid_hub.orcid_client.MemberAPIV3.get_record",
+                 return_value=NestedDict({"activities-summary": {}}))
+    mocker.patch("orcid_hub.orcid_client.MemberAPIV3.create_or_update_affiliation",
+                 side_effect=[(f"1239{i}", user.orcid, True, "PUBLIC") for i in range(2)])
+    bulk_update = mocker.spy(AffiliationRecord, "bulk_update")
+    save = mocker.spy(AffiliationRecord, "save")
+    utils.process_affiliation_records()
+    bulk_update.assert_called_once()
+    save.assert_not_called()
+    for i, r in enumerate(records[:2]):
+        r = AffiliationRecord.get(r.id)
+        assert r.put_code == int(f"1239{i}") and r.processed_at and "created" in r.status
+    r = AffiliationRecord.get(records[-1].id)
+    assert r.processed_at and "Unsupported affiliation type" in r.status
+
+
+def test_requeue_while_circuit_open(app, mocker):
+    """Test that the batch processing jobs get requeued while ORCID API is unavailable."""
+    batch_query = mocker.patch("orcid_hub.utils.batch_query")
+    schedule = mocker.patch.object(utils.process_work_records, "schedule")
+    mocker.patch.object(utils.orcid_client.circuit_breaker, "retry_in", return_value=60)
+    utils.process_work_records(record_id=[1, 2])
+    batch_query.assert_not_called()
+    assert 60 <= schedule.call_args[0][0].total_seconds() <= 70
+    assert schedule.call_args[1] == dict(max_rows=20, record_id=[1, 2])
+
+    task = Task.create(org=app.data["org"], task_type=TaskType.WORK)
+    WorkRecord.create(task=task, title="TITLE", is_active=True)
+    process = Mock()
+    assert utils.drain_records(WorkRecord, process) == 0
+    process.assert_not_called()
+
+
+def test_drain_records(app, mocker):
+    """Test backlog draining with keyset pagination and checkpoints."""
+    task = Task.create(org=app.data["org"], task_type=TaskType.WORK)
+    ids = [WorkRecord.create(task=task, title=f"T{i}", is_active=True).id for i in range(5)]
+
+    def process(max_rows=None, record_id=None):
+        WorkRecord.update(processed_at=datetime.utcnow()).where(WorkRecord.id << record_id).execute()
+
+    process = Mock(side_effect=process)
+    mocker.patch("orcid_hub.utils.time").time.side_effect = count(step=100)
+    assert utils.drain_records(WorkRecord, process, page_size=2, time_budget=60) == 2
+    process.assert_called_once_with(max_rows=None, record_id=ids[:2])
+    assert int(utils.rq.connection.get("orcidhub:drain:work_record")) == ids[1]
+
+    # make sure it resumes from the checkpoint even if the earlier records get reset:
+    WorkRecord.update(processed_at=None).where(WorkRecord.id == ids[0]).execute()
+    process.reset_mock()
+    assert utils.drain_records(WorkRecord, process, page_size=2) == 3
+    assert [c[1]["record_id"] for c in process.call_args_list] == [ids[2:4], ids[4:]]
+    assert utils.rq.connection.get("orcidhub:drain:work_record") is None
+
+    process.reset_mock()
+    assert utils.drain_records(WorkRecord, process, page_size=2) == 1
+    process.assert_called_once_with(max_rows=None, record_id=ids[:1])
+
+
+def test_process_records_drain(app, mocker):
+    """Test the record types take turns draining their backlogs within one time budget."""
+    backlogs = {WorkRecord: 3, FundingRecord: 1}
+
+    def drain_records(record_model, process, page_size=20, max_pages=None):
+        if not backlogs.get(record_model):
+            return 0
+        backlogs[record_model] -= 1
+        return page_size
+
+    drain = mocker.patch("orcid_hub.utils.drain_records", side_effect=drain_records)
+    utils.process_records(10, drain=True)
+    assert [c[0][0] for c in drain.call_args_list] == [
+        AffiliationRecord, FundingRecord, WorkRecord, PeerReviewRecord, PropertyRecord,
+        OtherIdRecord, FundingRecord, WorkRecord, WorkRecord, WorkRecord]
+    assert all(c[1] == dict(page_size=10, max_pages=1) for c in drain.call_args_list)
+
+    # no more pages are started once the time budget of the whole run has run out:
+    backlogs = {WorkRecord: 100}
+    drain.reset_mock()
+    mocker.patch("orcid_hub.utils.time").time.side_effect = count(step=10)
+    utils.process_records(10, drain=True, time_budget=60)
+    assert drain.call_count == 5
+
+
 def test_create_or_update_affiliation(app, mocker):
     """Test create or update affiliation."""
     mocker.patch(
@@ -1129,6 +1431,94 @@ def test_process_tasks(app, mocker):
     assert Task.select().count() == task_count // 2
 
 
+def test_load_upload(app, mocker):
+    """Test the uploads get stored and loaded with a background job."""
+    org = app.data["org"]
+    content = b"""title,type,org name,city,country,email,external identifier type,external identifier value,external identifier relationship
+TITLE #1,CONTRACT,ORG,Wellington,NZ,test1@test.edu,grant_number,GNS1,PART_OF
+TITLE #2,CONTRACT,ORG,Wellington,NZ,test2@test.edu,grant_number,GNS2,PART_OF
+"""  # noqa: E501
+    invalid_content = content.replace(b"TITLE #2", b"")
+
+    # the job gets executed synchronously in the tests:
+    task = utils.load_upload(
+        content, "fundings.csv", "FundingRecord.load_from_csv", TaskType.FUNDING, org=org)
+    assert task.loading_state == "LOADED"
+    assert (task.rows_parsed, task.rows_failed) == (2, 0)
+    assert task.records.count() == 2
+    assert task.file is None
+    assert File.select().where(File.filename == "fundings.csv").count() == 0
+
+    with pytest.raises(ModelExceptionError):
+        utils.load_upload(
+            invalid_content, "fundings.csv", "FundingRecord.load_from_csv", TaskType.FUNDING,
+            org=org)
+    assert Task.select().where(Task.filename == "fundings.csv").count() == 1
+
+    # the upload gets stored and the task stays in the loading state until the job is run:
+    mocker.patch.dict(app.config, BULK_INSERT_CHUNK_SIZE=1)
+    queue_job = utils.load_task_file.queue
+    queue = mocker.patch.object(utils.load_task_file, "queue")
+    queue.return_value.result = None
+    for data in [content, invalid_content]:
+        task = utils.load_upload(
+            BytesIO(data), "fundings.csv", "FundingRecord.load_from_csv", TaskType.FUNDING,
+            org=org)
+        assert task.loading_state == "LOADING"
+        assert task.file.data == data
+        assert utils.get_loading_status(task)["rows_parsed"] == 0
+        queue_job(*queue.call_args[0], **queue.call_args[1])
+        assert utils.rq.get_queue().fetch_job(task.loading_job_id).meta.get("rows_parsed") == (
+            2 if data == content else None)
+
+    task = Task.get(task.id)
+    assert task.loading_state == "FAILED"
+    assert task.rows_failed == 1
+    assert "title" in task.loading_error
+    assert task.records.count() == 0
+    assert File.select().count() == 0
+
+
+def test_stream_task(app, mocker):
+    """Test the task export gets streamed reading the records page by page."""
+    mocker.patch.dict(app.config, EXPORT_PAGE_SIZE=2)
+    org = app.data["org"]
+    task = FundingRecord.load_from_csv(
+        "title,type,org name,city,country,email,external identifier type,"
+        "external identifier value,external identifier relationship\n"
+        + "\n".join(
+            f"TITLE #{i},CONTRACT,ORG,Wellington,NZ,test{i}@test.edu,grant_number,GNS{i},PART_OF"
+            for i in range(5)),
+        filename="fundings.csv",
+        org=org)
+    task = Task.get(task.id)
+    expected = task.to_export_dict()
+    assert len(expected["records"]) == 5
+
+    execute_sql = mocker.spy(Task._meta.database, "execute_sql")
+    with app.test_request_context():
+        data = "".join(utils.stream_task(
+            task.to_export_dict(include_records=False), task.iter_record_dicts()))
+        assert json.loads(data) == json.loads(flask_json.dumps(expected))
+        # a query per page of the records and a query per page for each related model:
+        assert execute_sql.call_count <= 3 * 4 + 1
+
+        data = "".join(utils.stream_task(
+            task.to_export_dict(include_records=False), task.iter_record_dicts(), "yaml"))
+        assert yaml.safe_load(data) == yaml.safe_load(utils.dump_yaml(expected))
+
+        data = "".join(utils.stream_task({}, task.iter_record_dicts(), "ndjson"))
+        assert [json.loads(line) for line in data.splitlines()] == json.loads(
+            flask_json.dumps(expected["records"]))
+
+        empty_task = Task.create(org=org, task_type=TaskType.WORK, filename="empty.csv")
+        for export_type in ["json", "yaml"]:
+            data = "".join(utils.stream_task(
+                empty_task.to_export_dict(include_records=False), empty_task.iter_record_dicts(),
+                export_type))
+            assert yaml.safe_load(data)["records"] == []
+
+
 def test_file_upload_with_encodings(client, mocker):
     """Test BOM handling in the uploaded file."""
     client.login_root()
@@ -1218,3 +1608,21 @@ def test_scheduled_tasks(app, mocker):
     send_email = mocker.patch("orcid_hub.utils.send_email")
     utils.send_orcid_update_summary.queue(org_id=org.id)
     send_email.assert_called()
+
+
+def test_maintain_orcid_api_call_log(app):
+    """Test removing the expired ORCID API call log entries."""
+    now = datetime.utcnow()
+    for days in [0, 40, 100, 400]:
+        OrcidApiCall.create(called_at=now - timedelta(days=days), method="GET", url="https://test")
+
+    utils.maintain_orcid_api_call_log.queue()
+    assert OrcidApiCall.select().count() == 4
+
+    utils.maintain_orcid_api_call_log.queue(retention=12)
+    assert OrcidApiCall.select().count() == 3
+
+    utils.maintain_orcid_api_call_log.queue(retention=1)
+    assert OrcidApiCall.select().where(
+        OrcidApiCall.called_at < now.replace(day=1) - timedelta(days=31)).count() == 0
+    assert OrcidApiCall.select().where(OrcidApiCall.called_at >= now - timedelta(days=1)).exists()